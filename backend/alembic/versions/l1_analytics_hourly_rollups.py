@@ -0,0 +1,36 @@
+"""index analytics_events.created_at and add hourly rollup tables
+
+Revision ID: l1_analytics_hourly_rollups
+Revises: k1_add_journal_entry_date_progress
+Create Date: 2025-10-20 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'l1_analytics_hourly_rollups'
+down_revision = 'k1_add_journal_entry_date_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # range scans for the current hour and for rollup compaction
+    op.create_index('ix_analytics_events_created_at', 'analytics_events', ['created_at'])
+    op.create_table(
+        'analytics_hourly_rollups',
+        sa.Column('hour', sa.DateTime(timezone=True), primary_key=True),
+        sa.Column('event_type', sa.String(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'analytics_rollup_state',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('analytics_rollup_state')
+    op.drop_table('analytics_hourly_rollups')
+    op.drop_index('ix_analytics_events_created_at', table_name='analytics_events')
@@ -0,0 +1,57 @@
+"""composite (user_id, created_at, id) indexes for keyset pagination of list endpoints
+
+Revision ID: m1_keyset_pagination_indexes
+Revises: l1_analytics_hourly_rollups
+Create Date: 2025-10-21 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'm1_keyset_pagination_indexes'
+down_revision = 'l1_analytics_hourly_rollups'
+branch_labels = None
+depends_on = None
+
+# (table, timestamp column) for each paginated per-user list
+_INDEXES = [
+    ('mood_entries', 'created_at'),
+    ('journal_entries', 'created_at'),
+    ('symptom_entries', 'created_at'),
+    ('timers', 'created_at'),
+    ('stopwatches', 'started_at'),
+    ('achievements', 'created_at'),
+    ('claimed_rewards', 'created_at'),
+    ('conversations', 'created_at'),
+]
+
+
+def upgrade():
+    # timers / stopwatches were only ever created by create_all; make sure they exist first
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'timers' not in existing:
+        op.create_table(
+            'timers',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('label', sa.String(), nullable=True),
+            sa.Column('target_at', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('fired_at', sa.DateTime(timezone=True), nullable=True),
+        )
+    if 'stopwatches' not in existing:
+        op.create_table(
+            'stopwatches',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('label', sa.String(), nullable=True),
+            sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('stopped_at', sa.DateTime(timezone=True), nullable=True),
+        )
+    for table, ts in _INDEXES:
+        op.create_index(f'ix_{table}_user_id_{ts}_id', table, ['user_id', ts, 'id'])
+
+
+def downgrade():
+    for table, ts in reversed(_INDEXES):
+        op.drop_index(f'ix_{table}_user_id_{ts}_id', table_name=table)
@@ -0,0 +1,36 @@
+"""per-user running mood/symptom stats
+
+Revision ID: n1_user_stats
+Revises: m1_keyset_pagination_indexes
+Create Date: 2025-10-22 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'n1_user_stats'
+down_revision = 'm1_keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # rows are built lazily from the raw tables on first use, so no backfill is needed here
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('mood_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('mood_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_table(
+        'user_symptom_counts',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('symptom', sa.String(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade():
+    op.drop_table('user_symptom_counts')
+    op.drop_table('user_stats')
@@ -0,0 +1,52 @@
+"""per-user daily rollups (mood, journal progress, sleep) bucketed by local day
+
+Revision ID: o1_user_daily_rollups
+Revises: n1_user_stats
+Create Date: 2025-10-23 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'o1_user_daily_rollups'
+down_revision = 'n1_user_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sleep_entries was only ever created by create_all; the rollup rebuild reads it
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'sleep_entries' not in existing:
+        op.create_table(
+            'sleep_entries',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('sleep_start', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('sleep_end', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('quality', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index('ix_sleep_entries_id', 'sleep_entries', ['id'])
+    # rows are built lazily from the raw tables on first use, so no backfill is needed here
+    op.create_table(
+        'user_daily_rollups',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('mood_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('mood_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('progress_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('progress_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sleep_seconds', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sleep_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'user_rollup_state',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('timezone', sa.String(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('user_rollup_state')
+    op.drop_table('user_daily_rollups')
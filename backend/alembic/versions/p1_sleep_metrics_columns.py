@@ -0,0 +1,27 @@
+"""derived duration / bedtime columns and a (user_id, sleep_end) index on sleep_entries
+
+Revision ID: p1_sleep_metrics_columns
+Revises: o1_user_daily_rollups
+Create Date: 2025-10-24 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'p1_sleep_metrics_columns'
+down_revision = 'o1_user_daily_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows are filled in by sleep_metrics.backfill_job (bedtime needs the user's timezone)
+    op.add_column('sleep_entries', sa.Column('duration_seconds', sa.Integer(), nullable=True))
+    op.add_column('sleep_entries', sa.Column('bedtime_minutes', sa.Integer(), nullable=True))
+    op.create_index('ix_sleep_entries_user_id_sleep_end', 'sleep_entries', ['user_id', 'sleep_end'])
+
+
+def downgrade():
+    op.drop_index('ix_sleep_entries_user_id_sleep_end', table_name='sleep_entries')
+    op.drop_column('sleep_entries', 'bedtime_minutes')
+    op.drop_column('sleep_entries', 'duration_seconds')
@@ -0,0 +1,29 @@
+"""client idempotency keys on mood / journal / symptom entries for the batch endpoints
+
+Revision ID: q1_entry_client_ids
+Revises: p1_sleep_metrics_columns
+Create Date: 2025-10-25 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'q1_entry_client_ids'
+down_revision = 'p1_sleep_metrics_columns'
+branch_labels = None
+depends_on = None
+
+_TABLES = ('mood_entries', 'journal_entries', 'symptom_entries')
+
+
+def upgrade():
+    for table in _TABLES:
+        op.add_column(table, sa.Column('client_id', sa.String(), nullable=True))
+        # NULLs are distinct, so entries created through the single-item endpoints are unaffected
+        op.create_index(f'ux_{table}_user_id_client_id', table, ['user_id', 'client_id'], unique=True)
+
+
+def downgrade():
+    for table in reversed(_TABLES):
+        op.drop_index(f'ux_{table}_user_id_client_id', table_name=table)
+        op.drop_column(table, 'client_id')
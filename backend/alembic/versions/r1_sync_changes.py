@@ -0,0 +1,40 @@
+"""per-user change sequence and changes log for the /sync/changes feed
+
+Revision ID: r1_sync_changes
+Revises: q1_entry_client_ids
+Create Date: 2025-10-26 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'r1_sync_changes'
+down_revision = 'q1_entry_client_ids'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # each user's feed is seeded from their existing rows on first use
+    op.create_table(
+        'sync_state',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('seq', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pruned_seq', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'sync_changes',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('entity', sa.String(), primary_key=True),
+        sa.Column('entity_id', sa.Integer(), primary_key=True),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_sync_changes_user_id_seq', 'sync_changes', ['user_id', 'seq'])
+
+
+def downgrade():
+    op.drop_index('ix_sync_changes_user_id_seq', table_name='sync_changes')
+    op.drop_table('sync_changes')
+    op.drop_table('sync_state')
@@ -0,0 +1,28 @@
+"""per-user resource version counters behind the ETags of the polled read endpoints
+
+Revision ID: s1_resource_versions
+Revises: r1_sync_changes
+Create Date: 2025-10-27 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 's1_resource_versions'
+down_revision = 'r1_sync_changes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a missing row reads as version 0; rows are created by the first write to the resource
+    op.create_table(
+        'resource_versions',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('resource', sa.String(), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade():
+    op.drop_table('resource_versions')
@@ -0,0 +1,37 @@
+"""per-user data keys for journal encryption; journal rows reference them by id
+
+Revision ID: t1_user_data_keys
+Revises: s1_resource_versions
+Create Date: 2025-10-28 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 't1_user_data_keys'
+down_revision = 's1_resource_versions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_data_keys',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('epoch', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('kms_key_id', sa.String(), nullable=True),
+        sa.Column('wrapped_key', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_user_data_keys_id', 'user_data_keys', ['id'])
+    op.create_index('ux_user_data_keys_user_id_epoch', 'user_data_keys', ['user_id', 'epoch'], unique=True)
+    # existing rows keep their per-row wrapped key (encryption_key) and stay readable
+    op.add_column('journal_entries', sa.Column('key_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('journal_entries', 'key_id')
+    op.drop_index('ux_user_data_keys_user_id_epoch', table_name='user_data_keys')
+    op.drop_index('ix_user_data_keys_id', table_name='user_data_keys')
+    op.drop_table('user_data_keys')
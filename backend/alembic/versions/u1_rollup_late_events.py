@@ -0,0 +1,23 @@
+"""highest analytics event id counted by the rollup compactor, to pick up late rows
+
+Revision ID: u1_rollup_late_events
+Revises: t1_user_data_keys
+Create Date: 2025-10-29 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'u1_rollup_late_events'
+down_revision = 't1_user_data_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL until the next compaction records it; rows that arrived late before then are not recovered
+    op.add_column('analytics_rollup_state', sa.Column('max_event_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('analytics_rollup_state', 'max_event_id')
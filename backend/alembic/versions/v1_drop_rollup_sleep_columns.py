@@ -0,0 +1,25 @@
+"""drop the unused sleep totals from user_daily_rollups; sleep metrics read sleep_entries' derived columns
+
+Revision ID: v1_drop_rollup_sleep_columns
+Revises: u1_rollup_late_events
+Create Date: 2025-10-30 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'v1_drop_rollup_sleep_columns'
+down_revision = 'u1_rollup_late_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_column('user_daily_rollups', 'sleep_count')
+    op.drop_column('user_daily_rollups', 'sleep_seconds')
+
+
+def downgrade():
+    # restored as zeros; rebuilding the rollups does not fill them back in
+    op.add_column('user_daily_rollups', sa.Column('sleep_seconds', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('user_daily_rollups', sa.Column('sleep_count', sa.Integer(), nullable=False, server_default='0'))
@@ -0,0 +1,91 @@
+"""Optional asyncio database engine for the hot read endpoints.
+
+Enabled with DB_ASYNC_ENABLED. The async engine targets the same database as the sync engine
+in app.main: ASYNC_DATABASE_URL if set, otherwise DATABASE_URL with its driver swapped for the
+asyncio one (sqlite -> aiosqlite, postgresql -> asyncpg). It is created lazily so deployments
+that keep the flag off don't need the async drivers installed.
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+
+_ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+}
+
+_engine = None
+_sessionmaker: Optional[sessionmaker] = None
+
+
+def async_database_url(url: Optional[str] = None) -> str:
+    explicit = getattr(settings, 'ASYNC_DATABASE_URL', None)
+    if url is None and explicit:
+        return explicit
+    url = url or settings.DATABASE_URL
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+        return url
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def _engine_options(url: str) -> dict:
+    opts = {'pool_pre_ping': settings.DB_POOL_PRE_PING}
+    if not url.startswith('sqlite'):
+        # aiosqlite uses a NullPool; only size real connection pools
+        opts.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return opts
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = async_database_url()
+        _engine = create_async_engine(url, **_engine_options(url))
+        _instrument(_engine.sync_engine)
+    return _engine
+
+
+def get_sessionmaker() -> sessionmaker:
+    global _sessionmaker
+    if _sessionmaker is None:
+        from sqlalchemy.ext.asyncio import AsyncSession
+        # expire_on_commit=False: handlers return ORM rows after commit and async sessions
+        # cannot lazily refresh expired attributes during response serialisation
+        _sessionmaker = sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+    return _sessionmaker
+
+
+async def dispose():
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _sessionmaker = None
+
+
+def _instrument(sync_engine):
+    from app.services import metrics
+
+    @event.listens_for(sync_engine, 'checkout')
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        conn_record.info['checked_out_at'] = time.perf_counter()
+        metrics.incr('db.async_pool.checkouts')
+
+    @event.listens_for(sync_engine, 'checkin')
+    def _on_checkin(dbapi_conn, conn_record):
+        started = conn_record.info.pop('checked_out_at', None)
+        if started is not None:
+            metrics.observe('db.async_pool.connection_hold', time.perf_counter() - started)
@@ -60,11 +60,102 @@ class Settings(BaseSettings):
 
     BACKGROUND_TASK_MAX_RETRIES: int = 3
 
+    # Analytics pipeline: record_event enqueues into a bounded buffer that a flusher thread
+    # writes out in batches (file + one multi-row INSERT) every interval or batch size.
+    # When the buffer is full events wait up to ANALYTICS_ENQUEUE_TIMEOUT_MS, then are dropped.
+    ANALYTICS_BUFFERED: bool = True
+    ANALYTICS_QUEUE_MAX: int = 10000
+    ANALYTICS_BATCH_SIZE: int = 200
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 1.0
+    ANALYTICS_ENQUEUE_TIMEOUT_MS: int = 0
+    # Segmented analytics file log (default app/tmp/analytics): the active segment is sealed
+    # and gzipped once it reaches the size or age limit; manifest.json and sealed.jsonl index them.
+    ANALYTICS_LOG_DIR: str | None = None
+    ANALYTICS_SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024
+    ANALYTICS_SEGMENT_MAX_AGE_SECONDS: int = 3600
+    # Incremental export: offset checkpoint (default <ANALYTICS_LOG_DIR>/export.checkpoint.json)
+    # and S3 multipart settings for large export files.
+    ANALYTICS_EXPORT_CHECKPOINT: str | None = None
+    ANALYTICS_MULTIPART_THRESHOLD_MB: int = 16
+    ANALYTICS_MULTIPART_CHUNK_MB: int = 16
+    ANALYTICS_MULTIPART_CONCURRENCY: int = 4
+    # Columnar export format: 'parquet' (needs pyarrow) or 'npz' (needs numpy); default picks
+    # parquet when pyarrow is installed
+    ANALYTICS_EXPORT_FORMAT: str | None = None
+    # Hourly rollups behind /api/analytics/summary: hours older than the grace period are
+    # compacted by the analytics scheduler every ANALYTICS_ROLLUP_INTERVAL_MINUTES, at most
+    # ANALYTICS_ROLLUP_MAX_HOURS_PER_RUN per run while catching up; events that arrive later than
+    # the grace period are added to their hour by the next run
+    ANALYTICS_ROLLUP_GRACE_SECONDS: int = 300
+    ANALYTICS_ROLLUP_INTERVAL_MINUTES: int = 5
+    ANALYTICS_ROLLUP_MAX_HOURS_PER_RUN: int = 168
+    # Sliding window (seconds) of the in-memory counters behind /admin/analytics/stream
+    LIVE_ANALYTICS_WINDOW_SECONDS: int = 60
+    # Keyset pagination of per-user list endpoints (?cursor=&limit=, X-Next-Cursor header)
+    PAGINATION_DEFAULT_LIMIT: int = 50
+    PAGINATION_MAX_LIMIT: int = 200
+    # How often the retention scheduler recomputes per-user mood/symptom stats from raw rows
+    USER_STATS_VERIFY_INTERVAL_MINUTES: int = 24 * 60
+    # How often missing or stale daily rollups (new users, timezone changes made elsewhere) are
+    # rebuilt, and sleep entries missing their derived columns filled in, in the background;
+    # until then reads compute both from the raw rows
+    DAILY_ROLLUP_REBUILD_INTERVAL_MINUTES: int = 15
+    # Mood trends (/moods/trends): EWMA span, what counts as a low day, per-worker result cache
+    MOOD_EWMA_SPAN_DAYS: int = 7
+    MOOD_LOW_DAY_THRESHOLD: float = 4
+    MOOD_TRENDS_CACHE_TTL_SECONDS: int = 600
+    MOOD_TRENDS_CACHE_MAX_ENTRIES: int = 10000
+    # Sleep metrics (/sleep/metrics): nightly target and per-worker summary cache
+    SLEEP_TARGET_HOURS: float = 8.0
+    SLEEP_METRICS_CACHE_TTL_SECONDS: int = 300
+    SLEEP_METRICS_CACHE_MAX_ENTRIES: int = 10000
+    # Offline-sync batch endpoints (/moods/batch, /journals/batch, /symptoms/batch): items per
+    # request, and threads per worker encrypting journal contents (0 encrypts inline)
+    BATCH_MAX_ITEMS: int = 500
+    BATCH_ENCRYPT_WORKERS: int = 4
+    # Changes feed (/sync/changes): changes per response, and how long deletes stay visible as
+    # tombstones (clients whose token is older must resync from 0)
+    SYNC_MAX_CHANGES: int = 500
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 90
+    # ETags on the polled reads (/profile, /points, /streaks, /engagement/summary, /moods):
+    # resource versions are cached per worker; writes in the same worker evict them, the TTL
+    # bounds how long a write handled by another worker can still be answered with a 304.
+    # 0 disables the cache (every conditional request reads the version row).
+    ETAG_VERSION_TTL_SECONDS: int = 5
+    ETAG_VERSION_CACHE_MAX_ENTRIES: int = 50000
+
+    # Segment delivery (/v1/batch). Events are sent once SEGMENT_BATCH_SIZE are waiting or the
+    # oldest is SEGMENT_FLUSH_INTERVAL_SECONDS old; failed batches retry with jittered backoff.
+    SEGMENT_WRITE_KEY: str | None = None
+    SEGMENT_API_URL: str = "https://api.segment.io"
+    SEGMENT_BATCH_SIZE: int = 100
+    SEGMENT_FLUSH_INTERVAL_SECONDS: float = 2.0
+    SEGMENT_QUEUE_MAX: int = 10000
+    SEGMENT_MAX_RETRIES: int = 5
+
     # Optional data encryption key (Fernet urlsafe base64). If provided, sensitive fields
 
     # (e.g., journal content) will be encrypted at rest. If omitted, plaintext is used.
 
     DATA_ENCRYPTION_KEY: str | None = None
+    # AWS KMS key for envelope encryption of journal content (takes precedence over the key
+    # above); credentials default to boto3's own resolution when unset.
+    KMS_KEY_ID: str | None = None
+    AWS_ACCESS_KEY_ID: str | None = None
+    AWS_SECRET_ACCESS_KEY: str | None = None
+    AWS_REGION: str | None = None
+    # Unwrapped KMS data keys cached per worker (keyed by a digest of the wrapped key) so reading
+    # envelope-encrypted rows does not cost a KMS Decrypt each; evicted keys are zeroed.
+    # A TTL of 0 disables the cache.
+    DATA_KEY_CACHE_TTL_SECONDS: int = 300
+    DATA_KEY_CACHE_MAX_ENTRIES: int = 10000
+    # With KMS, journal rows are encrypted with one data key per user (user_data_keys). When
+    # set, a user's key is retired for new writes after this many days (0 = keep one key).
+    DATA_KEY_ROTATION_DAYS: int = 0
+    # Format of newly encrypted values: 1 = AES-256-GCM with a version header byte
+    # (services/ciphertext), 0 = legacy Fernet. Both are always readable by this release; set 1
+    # only once every worker runs it (workers on older releases cannot read format 1).
+    CIPHERTEXT_VERSION: int = 0
 
     # Data retention defaults (days) for automated deletion policies
 
@@ -76,22 +167,51 @@ class Settings(BaseSettings):
     RATELIMIT_TRUSTED_PROXIES: str | None = None
     RATELIMIT_DEFAULT_PER_IP: str = "100/minute"
     RATELIMIT_OTP_REQUEST_PER_IP: str = "20/hour"
-
-        RATELIMIT_OTP_VERIFY_PER_IP: str = "60/hour"
-
-
-
-        # Legal and consent configuration
-        LEGAL_TOS_VERSION: str = "v1"
-        LEGAL_PRIVACY_VERSION: str = "v1"
-        LEGAL_RESEARCH_CONSENT_VERSION: str | None = None
-        LEGAL_PRIVACY_URL: str = "https://example.com/legal/privacy"
-        LEGAL_TERMS_URL: str = "https://example.com/legal/terms"
-        CONSENT_IP_HASH_SALT: str | None = None
-
-        class Config:
-
-            env_file = ".env"
+    RATELIMIT_OTP_VERIFY_PER_IP: str = "60/hour"
+
+    # Database connection pool (ignored for SQLite, which uses SQLAlchemy's default pool).
+    # Each gunicorn worker owns its own pool, so the server-wide connection budget is
+    # GUNICORN_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    # Recycle connections older than this many seconds (guards against server-side idle kills)
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Authenticated-principal cache (per worker). TTL bounds how long a role/is_active change
+    # made in another worker can go unnoticed; 0 disables the cache.
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    # Verified access tokens cached per worker (keyed by token digest, kept until `exp`); 0 disables.
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+    # Per-user Profile.language cache used by the Accept-Language middleware; profile and
+    # language writes refresh it in-process, the TTL bounds staleness across workers.
+    LOCALE_CACHE_TTL_SECONDS: int = 300
+    LOCALE_CACHE_MAX_ENTRIES: int = 10000
+    # Serve the hot read endpoints (/moods, /journals, /points, /streaks, /profile,
+    # /consent/current) from async handlers on an asyncio engine. ASYNC_DATABASE_URL defaults
+    # to DATABASE_URL with the async driver (aiosqlite / asyncpg) substituted.
+    DB_ASYNC_ENABLED: bool = False
+    ASYNC_DATABASE_URL: str | None = None
+    # Password hashing pool (per worker): KDF_POOL_WORKERS threads run pbkdf2, up to
+    # KDF_QUEUE_DEPTH more calls may wait; beyond that auth endpoints answer 503 immediately.
+    # KDF_POOL_WORKERS=0 hashes inline on the request thread.
+    KDF_POOL_WORKERS: int = 2
+    KDF_QUEUE_DEPTH: int = 32
+    KDF_RETRY_AFTER_SECONDS: int = 1
+
+    # Legal and consent configuration
+    LEGAL_TOS_VERSION: str = "v1"
+    LEGAL_PRIVACY_VERSION: str = "v1"
+    LEGAL_RESEARCH_CONSENT_VERSION: str | None = None
+    LEGAL_PRIVACY_URL: str = "https://example.com/legal/privacy"
+    LEGAL_TERMS_URL: str = "https://example.com/legal/terms"
+    CONSENT_IP_HASH_SALT: str | None = None
+
+    class Config:
+
+        env_file = ".env"
 
 
 
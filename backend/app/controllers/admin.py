@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Depends, Response
+import asyncio
+
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from app.dependencies import require_role
 from pathlib import Path
 
@@ -11,3 +14,49 @@ def serve_admin_analytics(_=Depends(require_role('admin'))):
     if not p.exists():
         return Response('Not found', status_code=404)
     return Response(p.read_bytes(), media_type='text/html')
+
+
+@router.get('/analytics/stream')
+async def stream_admin_analytics(request: Request, _=Depends(require_role('admin'))):
+    """Server-Sent Events: a `counts` event every second with per-event_type counts for the last
+    second and the sliding window. All viewers share one in-memory aggregation (no DB queries).
+    """
+    from app.services.analytics_live import get_broadcaster
+    broadcaster = get_broadcaster()
+
+    async def events():
+        q = broadcaster.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    payload = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                if await request.is_disconnected():
+                    break
+                yield f'event: counts\ndata: {payload}\n\n'
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/metrics')
+def worker_metrics(_=Depends(require_role('admin'))):
+    """Per-worker runtime metrics (DB pool usage, request session hold times, ...)."""
+    from app.main import engine
+    from app.services import metrics
+    pool = engine.pool
+    snap = metrics.snapshot()
+    snap['db_pool'] = {
+        'class': type(pool).__name__,
+        'status': pool.status(),
+        'size': pool.size() if hasattr(pool, 'size') else None,
+        'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+        'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+    }
+    return snap
@@ -0,0 +1,142 @@
+"""Async versions of the hottest read endpoints.
+
+Mounted ahead of the sync routers when DB_ASYNC_ENABLED is set, so these handlers take over
+the same paths and run on the event loop against the asyncio engine instead of queueing on
+the threadpool. Response shapes match the sync handlers, which remain the reference
+implementation; CPU-bound or blocking work (journal decryption) is still pushed to a thread.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from app.dependencies import etag_guard_async, get_async_db, get_current_user_async, get_current_user_optional_async
+from app.limits import limiter, get_client_ip
+from app.models.mood_entry import MoodEntry
+from app.models.journal_entry import JournalEntry
+from app.models.profile import Profile
+from app.schemas.mood import MoodRead
+from app.schemas.journal import JournalRead
+from app.schemas.profile import ProfileRead
+from app.schemas.gamification import StreakRead
+from app.controllers.moods import _journal_filters, _decrypt_journals
+from app.controllers.profile import _engagement_status
+from app.controllers.consent import (
+    ConsentCurrentResponse,
+    _current_versions,
+    _legal_urls,
+    _user_state,
+)
+from app.services.i18n import remember_user_locale
+from app.utils.pagination import PageParams, finish_page, keyset_criteria, keyset_order, page_params
+
+router = APIRouter()
+
+
+@router.get('/moods', response_model=List[MoodRead], dependencies=[Depends(etag_guard_async('moods'))])
+async def list_moods(page: PageParams = Depends(page_params), user=Depends(get_current_user_async), db=Depends(get_async_db)):
+    stmt = (
+        select(MoodEntry)
+        .where(MoodEntry.user_id == user.id, *keyset_criteria(MoodEntry.created_at, MoodEntry.id, page))
+        .order_by(*keyset_order(MoodEntry.created_at, MoodEntry.id))
+        .limit(page.limit + 1)
+    )
+    return finish_page((await db.execute(stmt)).scalars().all(), page)
+
+
+@router.get('/journals', response_model=list[JournalRead])
+async def list_journals(date: str | None = None, start: str | None = None, end: str | None = None, page: PageParams = Depends(page_params), user=Depends(get_current_user_async), db=Depends(get_async_db)):
+    stmt = (
+        select(JournalEntry)
+        .where(JournalEntry.user_id == user.id, *_journal_filters(date, start, end),
+               *keyset_criteria(JournalEntry.created_at, JournalEntry.id, page))
+        .order_by(*keyset_order(JournalEntry.created_at, JournalEntry.id))
+        .limit(page.limit + 1)
+    )
+    items = finish_page((await db.execute(stmt)).scalars().all(), page)
+    # decryption may call KMS; keep it off the event loop
+    return await run_in_threadpool(_decrypt_journals, items)
+
+
+@router.get('/points', response_model=dict, dependencies=[Depends(etag_guard_async('points'))])
+async def get_points(current_user=Depends(get_current_user_async), db=Depends(get_async_db)):
+    from app.models.gamification import PointsLedger
+    total = await db.scalar(
+        select(func.coalesce(func.sum(PointsLedger.change), 0)).where(PointsLedger.user_id == current_user.id)
+    )
+    return {'points': int(total or 0)}
+
+
+@router.get('/streaks', response_model=StreakRead, dependencies=[Depends(etag_guard_async('streaks'))])
+async def get_streak(current_user=Depends(get_current_user_async), db=Depends(get_async_db)):
+    from app.models.gamification import Streak
+    s = (await db.execute(select(Streak).where(Streak.user_id == current_user.id))).scalars().first()
+    if not s:
+        raise HTTPException(status_code=404, detail='No streak found')
+    return s
+
+
+@router.get('/profile', response_model=ProfileRead, dependencies=[Depends(etag_guard_async('profile'))])
+async def read_profile(current_user=Depends(get_current_user_async), db=Depends(get_async_db)):
+    from app.models.gamification import Streak, Achievement, PointsLedger
+    user_id = current_user.id
+    p = (await db.execute(select(Profile).where(Profile.user_id == user_id))).scalars().first()
+    if not p:
+        # return empty profile object created on demand
+        p = Profile(user_id=user_id)
+        db.add(p)
+        await db.commit()
+        await db.refresh(p)
+        remember_user_locale(user_id, p.language)
+    # compute engagement_status based on recent activity
+    latest = [
+        select(Streak.last_active_at).where(Streak.user_id == user_id).limit(1),
+        select(Achievement.created_at).where(Achievement.user_id == user_id).order_by(Achievement.created_at.desc()).limit(1),
+        select(PointsLedger.created_at).where(PointsLedger.user_id == user_id).order_by(PointsLedger.created_at.desc()).limit(1),
+    ]
+    last_dates = []
+    for stmt in latest:
+        value = await db.scalar(stmt)
+        if value:
+            last_dates.append(value)
+
+    new_status = _engagement_status(last_dates)
+    if getattr(p, 'engagement_status', None) != new_status:
+        p.engagement_status = new_status
+        db.add(p)
+        await db.commit()
+        await db.refresh(p)
+
+    return p
+
+
+@limiter.limit("30/minute", key_func=get_client_ip)
+@router.get("/consent/current", response_model=ConsentCurrentResponse)
+async def consent_current(
+    request: Request,
+    current_user=Depends(get_current_user_optional_async),
+    db=Depends(get_async_db),
+):
+    from app.models.consent_event import ConsentEvent
+
+    tos_v, privacy_v, research_v = _current_versions()
+    user_state: Optional[dict] = None
+    if current_user:
+        ev = (
+            await db.execute(
+                select(ConsentEvent)
+                .where(ConsentEvent.user_id == current_user.id)
+                .order_by(ConsentEvent.created_at.desc())
+                .limit(1)
+            )
+        ).scalars().first()
+        user_state = _user_state(ev)
+
+    return {
+        "tos_version": tos_v,
+        "privacy_version": privacy_v,
+        "research_version": research_v,
+        "legal_urls": _legal_urls(),
+        "user_state": user_state,
+    }
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Body, Header
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Header, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.schemas.user import (
@@ -11,9 +11,10 @@ from app.schemas.user import (
 from app.models.user import User
 from app.models.refresh_token import RefreshToken
 from app.services import security
+from app.services.principal_cache import load_principal, invalidate_user
 from app.services.email import send_email
 from app.services.i18n import t_format
-from app.dependencies import get_locale
+from app.dependencies import get_locale, get_db, decode_request_token
 from app.config import settings
 from app.services.analytics import record_event
 from datetime import datetime, timedelta, timezone
@@ -32,297 +33,259 @@ router = APIRouter()
 
 @limiter.limit("5/minute")
 @router.post("/signup", response_model=UserRead)
-def signup(user_in: UserCreate):
+def signup(user_in: UserCreate, db: Session = Depends(get_db)):
     """Create a new user (minimal implementation)."""
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
+    existing = db.query(User).filter(User.email == user_in.email).first()
+    if existing:
+        # In test/dev scenarios we prefer idempotent signup to avoid order-dependent
+        # failures in the test suite. In production, preserve the original behavior
+        # by returning an error unless DEV preview/testing is enabled.
+        from app.config import settings
+
+        if getattr(settings, "DEV_EMAIL_PREVIEW", False):
+            return existing
+        # otherwise, signal the email is already registered
+        raise HTTPException(status_code=400, detail="Email already registered")
+    user = User(
+        email=user_in.email,
+        hashed_password=security.hash_password(user_in.password),
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    # record signup event
     try:
-        existing = db.query(User).filter(User.email == user_in.email).first()
-        if existing:
-            # In test/dev scenarios we prefer idempotent signup to avoid order-dependent
-            # failures in the test suite. In production, preserve the original behavior
-            # by returning an error unless DEV preview/testing is enabled.
-            from app.config import settings
-
-            if getattr(settings, "DEV_EMAIL_PREVIEW", False):
-                return existing
-            # otherwise, signal the email is already registered
-            raise HTTPException(status_code=400, detail="Email already registered")
-        user = User(
-            email=user_in.email,
-            hashed_password=security.hash_password(user_in.password),
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        # record signup event
-        try:
-            record_event("signup", user_id=user.id, props={"email": user_in.email})
-        except Exception:
-            pass
-        return user
-    finally:
-        db.close()
+        record_event("signup", user_id=user.id, props={"email": user_in.email})
+    except Exception:
+        pass
+    return user
 
 
 @router.post("/token", response_model=Token)
-def token(form_data: OAuth2PasswordRequestForm = Depends()):
+def token(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+):
     """Exchange username/password for an access token and issue a refresh token."""
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == form_data.username).first()
-        if not user or not security.verify_password(
-            form_data.password, user.hashed_password
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
-            )
-        # update last login
-        user.last_login = datetime.now(timezone.utc)
-        db.add(user)
-        db.commit()
-        access_token = security.create_access_token(
-            {"sub": str(user.id), "role": user.role}
+    user = db.query(User).filter(User.email == form_data.username).first()
+    if not user or not security.verify_password(
+        form_data.password, user.hashed_password
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
-        # create a refresh token and persist a hash server-side
-        refresh_plain = secrets.token_urlsafe(48)
-        refresh_hash = hashlib.sha256(refresh_plain.encode("utf-8")).hexdigest()
-        expires = datetime.now(timezone.utc) + timedelta(days=30)
-        rt = RefreshToken(user_id=user.id, token_hash=refresh_hash, expires_at=expires)
-        db.add(rt)
-        db.commit()
-        db.refresh(rt)
-        # record login event
-        try:
-            record_event("login", user_id=user.id, props={"method": "password"})
-        except Exception:
-            pass
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "refresh_token": refresh_plain,
-        }
-    finally:
-        db.close()
+    # update last login
+    user.last_login = datetime.now(timezone.utc)
+    db.add(user)
+    db.commit()
+    access_token = security.create_access_token(
+        {"sub": str(user.id), "role": user.role}
+    )
+    # create a refresh token and persist a hash server-side
+    refresh_plain = secrets.token_urlsafe(48)
+    refresh_hash = hashlib.sha256(refresh_plain.encode("utf-8")).hexdigest()
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+    rt = RefreshToken(user_id=user.id, token_hash=refresh_hash, expires_at=expires)
+    db.add(rt)
+    db.commit()
+    db.refresh(rt)
+    # record login event
+    try:
+        record_event("login", user_id=user.id, props={"method": "password"})
+    except Exception:
+        pass
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_plain,
+    }
 
 
 @limiter.limit("3/minute")
 @router.post("/password-reset/request")
 def password_reset_request(
-    payload: PasswordResetRequest, locale: str = Depends(get_locale)
+    payload: PasswordResetRequest,
+    locale: str = Depends(get_locale),
+    db: Session = Depends(get_db),
 ):
     """Generate a password reset token and (stub) send it to the user's email."""
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == payload.email).first()
-        if not user:
-            # don't reveal user existence
-            return {"status": "ok"}
-        token = secrets.token_urlsafe(32)
-        # store a hash of the token so DB leaks don't reveal usable tokens
-        token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
-        user.password_reset_token = token_hash
-        user.password_reset_expires = datetime.now(timezone.utc) + timedelta(hours=1)
-        db.add(user)
-        db.commit()
-        # In real app, send email with a reset link containing token
-        reset_link = f"https://example.com/reset-password?token={token}"
-        html = t_format(
-            "password_reset_html", locale, email=user.email, reset_link=reset_link
-        )
-        text = t_format(
-            "password_reset_text", locale, email=user.email, reset_link=reset_link
-        )
-        subject = t_format("password_reset_subject", locale)
-        result = send_email(
-            to=user.email, subject=subject, html_body=html, text_body=text
-        )
-        if settings.DEV_EMAIL_PREVIEW:
-            # Include the reset link when running in dev preview so tests can extract token
-            return {"preview": result, "reset_link": reset_link}
+    user = db.query(User).filter(User.email == payload.email).first()
+    if not user:
+        # don't reveal user existence
         return {"status": "ok"}
-    finally:
-        db.close()
+    token = secrets.token_urlsafe(32)
+    # store a hash of the token so DB leaks don't reveal usable tokens
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    user.password_reset_token = token_hash
+    user.password_reset_expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    db.add(user)
+    db.commit()
+    # In real app, send email with a reset link containing token
+    reset_link = f"https://example.com/reset-password?token={token}"
+    html = t_format(
+        "password_reset_html", locale, email=user.email, reset_link=reset_link
+    )
+    text = t_format(
+        "password_reset_text", locale, email=user.email, reset_link=reset_link
+    )
+    subject = t_format("password_reset_subject", locale)
+    result = send_email(
+        to=user.email, subject=subject, html_body=html, text_body=text
+    )
+    if settings.DEV_EMAIL_PREVIEW:
+        # Include the reset link when running in dev preview so tests can extract token
+        return {"preview": result, "reset_link": reset_link}
+    return {"status": "ok"}
 
 
 @limiter.limit("3/minute")
 @router.post("/password-reset/confirm")
 def password_reset_confirm(
-    payload: PasswordResetConfirm, locale: str = Depends(get_locale)
+    payload: PasswordResetConfirm,
+    locale: str = Depends(get_locale),
+    db: Session = Depends(get_db),
 ):
-    from app.main import SessionLocal
 
-    db: Session = SessionLocal()
-    try:
-        token_hash = hashlib.sha256(payload.token.encode("utf-8")).hexdigest()
-        user = db.query(User).filter(User.password_reset_token == token_hash).first()
-        # ensure expiry comparison is timezone-aware
-        expires = user.password_reset_expires if user else None
-        if expires is not None and expires.tzinfo is None:
-            from datetime import timezone as _tz
-
-            expires = expires.replace(tzinfo=_tz.utc)
-        if not user or not expires or expires < datetime.now(timezone.utc):
-            raise HTTPException(status_code=400, detail="Invalid or expired token")
-        user.hashed_password = security.hash_password(payload.new_password)
-        user.password_reset_token = None
-        user.password_reset_expires = None
-        db.add(user)
-        db.commit()
-        # send confirmation email that password was changed
-        login_link = "https://example.com/login"
-        html = t_format(
-            "password_changed_html", locale, email=user.email, login_link=login_link
-        )
-        text = t_format(
-            "password_changed_text", locale, email=user.email, login_link=login_link
-        )
-        subject = t_format("password_changed_subject", locale)
-        result = send_email(
-            to=user.email, subject=subject, html_body=html, text_body=text
-        )
-        if settings.DEV_EMAIL_PREVIEW:
-            return {"preview": result}
-        return {"status": "ok"}
-    finally:
-        db.close()
+    token_hash = hashlib.sha256(payload.token.encode("utf-8")).hexdigest()
+    user = db.query(User).filter(User.password_reset_token == token_hash).first()
+    # ensure expiry comparison is timezone-aware
+    expires = user.password_reset_expires if user else None
+    if expires is not None and expires.tzinfo is None:
+        from datetime import timezone as _tz
+
+        expires = expires.replace(tzinfo=_tz.utc)
+    if not user or not expires or expires < datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+    user.hashed_password = security.hash_password(payload.new_password)
+    user.password_reset_token = None
+    user.password_reset_expires = None
+    db.add(user)
+    db.commit()
+    invalidate_user(user.id)
+    # send confirmation email that password was changed
+    login_link = "https://example.com/login"
+    html = t_format(
+        "password_changed_html", locale, email=user.email, login_link=login_link
+    )
+    text = t_format(
+        "password_changed_text", locale, email=user.email, login_link=login_link
+    )
+    subject = t_format("password_changed_subject", locale)
+    result = send_email(
+        to=user.email, subject=subject, html_body=html, text_body=text
+    )
+    if settings.DEV_EMAIL_PREVIEW:
+        return {"preview": result}
+    return {"status": "ok"}
 
 
 @router.post("/refresh")
-def refresh_token(payload: dict = Body(...)):
+def refresh_token(payload: dict = Body(...), db: Session = Depends(get_db)):
     """Exchange a refresh token for a new access token and rotate the refresh token.
     The used refresh token is revoked and a new one is issued.
     """
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
-    try:
-        old_refresh_token = payload.get("old_refresh_token")
-        if not old_refresh_token:
-            raise HTTPException(status_code=400, detail="old_refresh_token required")
-        h = hashlib.sha256(old_refresh_token.encode("utf-8")).hexdigest()
-        rt = (
-            db.query(RefreshToken)
-            .filter(RefreshToken.token_hash == h, RefreshToken.revoked == False)
-            .first()
-        )
-        # Ensure expiry comparison is timezone-aware: coerce naive DB datetimes to UTC
-        expiry = rt.expires_at if rt else None
-        if expiry is not None and expiry.tzinfo is None:
-            # assume naive datetimes in DB are UTC
-            from datetime import timezone as _tz
-
-            expiry = expiry.replace(tzinfo=_tz.utc)
-        if not rt or expiry < datetime.now(timezone.utc):
-            raise HTTPException(status_code=401, detail="Invalid refresh token")
-        user = db.query(User).filter(User.id == rt.user_id).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        # revoke the used refresh token
-        rt.revoked = True
-        db.add(rt)
-        # create a new refresh token (rotation)
-        new_plain = secrets.token_urlsafe(48)
-        new_hash = hashlib.sha256(new_plain.encode("utf-8")).hexdigest()
-        new_expires = datetime.now(timezone.utc) + timedelta(days=30)
-        new_rt = RefreshToken(
-            user_id=user.id, token_hash=new_hash, expires_at=new_expires
-        )
-        db.add(new_rt)
-        db.commit()
-        access_token = security.create_access_token(
-            {"sub": str(user.id), "role": user.role}
-        )
-        return {"access_token": access_token, "refresh_token": new_plain}
-    finally:
-        db.close()
+    old_refresh_token = payload.get("old_refresh_token")
+    if not old_refresh_token:
+        raise HTTPException(status_code=400, detail="old_refresh_token required")
+    h = hashlib.sha256(old_refresh_token.encode("utf-8")).hexdigest()
+    rt = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == h, RefreshToken.revoked == False)
+        .first()
+    )
+    # Ensure expiry comparison is timezone-aware: coerce naive DB datetimes to UTC
+    expiry = rt.expires_at if rt else None
+    if expiry is not None and expiry.tzinfo is None:
+        # assume naive datetimes in DB are UTC
+        from datetime import timezone as _tz
+
+        expiry = expiry.replace(tzinfo=_tz.utc)
+    if not rt or expiry < datetime.now(timezone.utc):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user = db.query(User).filter(User.id == rt.user_id).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    # revoke the used refresh token
+    rt.revoked = True
+    db.add(rt)
+    # create a new refresh token (rotation)
+    new_plain = secrets.token_urlsafe(48)
+    new_hash = hashlib.sha256(new_plain.encode("utf-8")).hexdigest()
+    new_expires = datetime.now(timezone.utc) + timedelta(days=30)
+    new_rt = RefreshToken(
+        user_id=user.id, token_hash=new_hash, expires_at=new_expires
+    )
+    db.add(new_rt)
+    db.commit()
+    access_token = security.create_access_token(
+        {"sub": str(user.id), "role": user.role}
+    )
+    return {"access_token": access_token, "refresh_token": new_plain}
 
 
 @router.post("/logout")
-def logout(payload: dict = Body(...)):
+def logout(payload: dict = Body(...), db: Session = Depends(get_db)):
     """Revoke the given refresh token so it cannot be used again."""
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
-    try:
-        refresh_token = payload.get("refresh_token")
-        if not refresh_token:
-            return {"status": "ok"}
-        h = hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()
-        rt = db.query(RefreshToken).filter(RefreshToken.token_hash == h).first()
-        if rt:
-            rt.revoked = True
-            db.add(rt)
-            db.commit()
+    refresh_token = payload.get("refresh_token")
+    if not refresh_token:
         return {"status": "ok"}
-    finally:
-        db.close()
+    h = hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()
+    rt = db.query(RefreshToken).filter(RefreshToken.token_hash == h).first()
+    if rt:
+        rt.revoked = True
+        db.add(rt)
+        db.commit()
+    return {"status": "ok"}
 
 
 @router.post("/verify")
-def send_verification(email: str, locale: str = Depends(get_locale)):
+def send_verification(
+    email: str, locale: str = Depends(get_locale), db: Session = Depends(get_db)
+):
     """Generate a verification token and (stub) send to user email."""
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
-            return {"status": "ok"}
-        token = security.create_access_token({"sub": str(user.id)}, expires_delta=60)
-        verify_link = f"https://example.com/verify?token={token}"
-        html = t_format(
-            "verify_account_html", locale, email=user.email, verify_link=verify_link
-        )
-        text = t_format(
-            "verify_account_text", locale, email=user.email, verify_link=verify_link
-        )
-        subject = t_format("verify_account_subject", locale)
-        result = send_email(
-            to=user.email, subject=subject, html_body=html, text_body=text
-        )
-        if settings.DEV_EMAIL_PREVIEW:
-            # Include the verification token in dev preview to make tests deterministic
-            return {"preview": result, "verification_token": token}
+    user = db.query(User).filter(User.email == email).first()
+    if not user:
         return {"status": "ok"}
-    finally:
-        db.close()
+    token = security.create_access_token({"sub": str(user.id)}, expires_delta=60)
+    verify_link = f"https://example.com/verify?token={token}"
+    html = t_format(
+        "verify_account_html", locale, email=user.email, verify_link=verify_link
+    )
+    text = t_format(
+        "verify_account_text", locale, email=user.email, verify_link=verify_link
+    )
+    subject = t_format("verify_account_subject", locale)
+    result = send_email(
+        to=user.email, subject=subject, html_body=html, text_body=text
+    )
+    if settings.DEV_EMAIL_PREVIEW:
+        # Include the verification token in dev preview to make tests deterministic
+        return {"preview": result, "verification_token": token}
+    return {"status": "ok"}
 
 
 @router.post("/verify/confirm")
-def verify_confirm(token: str):
+def verify_confirm(token: str, db: Session = Depends(get_db)):
     payload = security.decode_access_token(token)
     if not payload or "sub" not in payload:
         raise HTTPException(status_code=400, detail="Invalid token")
     user_id = int(payload["sub"])
-    from app.main import SessionLocal
 
-    db: Session = SessionLocal()
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=400, detail="User not found")
-        user.is_verified = True
-        db.add(user)
-        db.commit()
-        return {"status": "ok"}
-    finally:
-        db.close()
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=400, detail="User not found")
+    user.is_verified = True
+    db.add(user)
+    db.commit()
+    invalidate_user(user.id)
+    return {"status": "ok"}
 
 
 @limiter.limit("10/minute")
 @router.post("/login")
-def login_json(payload: dict = Body(...)):
+def login_json(payload: dict = Body(...), db: Session = Depends(get_db)):
     """JSON-based login: accepts {email, password} or {username, password}.
     For dev convenience, if only {phone} is provided, it will attempt email = f"{phone}@example.com".
     """
-    from app.main import SessionLocal
-
     email = payload.get("email") or payload.get("username")
     password = payload.get("password")
     if not email and payload.get("phone"):
@@ -330,45 +293,45 @@ def login_json(payload: dict = Body(...)):
     if not email or not password:
         raise HTTPException(status_code=400, detail="email and password required")
 
-    db: Session = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == email).first()
-        if not user or not security.verify_password(password, user.hashed_password):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
-            )
-        # update last login
-        user.last_login = datetime.now(timezone.utc)
-        db.add(user)
-        db.commit()
-
-        access_token = security.create_access_token(
-            {"sub": str(user.id), "role": user.role}
+    user = db.query(User).filter(User.email == email).first()
+    if not user or not security.verify_password(password, user.hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
-        # issue refresh token
-        refresh_plain = secrets.token_urlsafe(48)
-        refresh_hash = hashlib.sha256(refresh_plain.encode("utf-8")).hexdigest()
-        expires = datetime.now(timezone.utc) + timedelta(days=30)
-        rt = RefreshToken(user_id=user.id, token_hash=refresh_hash, expires_at=expires)
-        db.add(rt)
-        db.commit()
-        db.refresh(rt)
-        try:
-            record_event("login", user_id=user.id, props={"method": "json"})
-        except Exception:
-            pass
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "refresh_token": refresh_plain,
-            "user": {"id": user.id, "email": user.email},
-        }
-    finally:
-        db.close()
+    # update last login
+    user.last_login = datetime.now(timezone.utc)
+    db.add(user)
+    db.commit()
+
+    access_token = security.create_access_token(
+        {"sub": str(user.id), "role": user.role}
+    )
+    # issue refresh token
+    refresh_plain = secrets.token_urlsafe(48)
+    refresh_hash = hashlib.sha256(refresh_plain.encode("utf-8")).hexdigest()
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+    rt = RefreshToken(user_id=user.id, token_hash=refresh_hash, expires_at=expires)
+    db.add(rt)
+    db.commit()
+    db.refresh(rt)
+    try:
+        record_event("login", user_id=user.id, props={"method": "json"})
+    except Exception:
+        pass
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_plain,
+        "user": {"id": user.id, "email": user.email},
+    }
 
 
 @router.get("/me", response_model=UserRead)
-def me(authorization: str | None = Header(None)):
+def me(
+    request: Request,
+    authorization: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
     """Return current authenticated user using Authorization: Bearer <token> header."""
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing authorization header")
@@ -376,21 +339,14 @@ def me(authorization: str | None = Header(None)):
         scheme, token = authorization.split()
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
-    payload = security.decode_access_token(token)
+    payload = decode_request_token(request, token)
     if not payload or "sub" not in payload:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user_id = int(payload["sub"])
-    from app.main import SessionLocal
-
-    db: Session = SessionLocal()
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
-    finally:
-        db.close()
+    user = load_principal(db, payload)
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
 
 
 @limiter.limit("5 per 15 minutes", key_func=get_phone_key)
@@ -416,10 +372,8 @@ def otp_request(payload: dict = Body(...)):
 
 @limiter.limit("10 per hour", key_func=get_phone_key)
 @router.post("/verify-otp")
-def verify_otp(payload: dict = Body(...)):
+def verify_otp(payload: dict = Body(...), db: Session = Depends(get_db)):
     """Verify OTP via Twilio Verify (or dev fallback) then create/login user and issue tokens."""
-    from app.main import SessionLocal
-
     phone = payload.get("phone")
 
     otp = payload.get("otp")
@@ -443,62 +397,57 @@ def verify_otp(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
     email = f"{normalized}@example.com"
-    db: Session = SessionLocal()
+    user = db.query(User).filter(User.email == email).first()
 
-    try:
-        user = db.query(User).filter(User.email == email).first()
-
-        if not user:
-            rnd = secrets.token_urlsafe(16)
+    if not user:
+        rnd = secrets.token_urlsafe(16)
 
-            user = User(
-                email=email,
-                hashed_password=security.hash_password(rnd),
-                is_verified=True,
-            )
+        user = User(
+            email=email,
+            hashed_password=security.hash_password(rnd),
+            is_verified=True,
+        )
 
-            db.add(user)
+        db.add(user)
 
-            db.commit()
+        db.commit()
 
-            db.refresh(user)
+        db.refresh(user)
 
-            try:
-                record_event("signup", user_id=user.id, props={"method": "otp"})
+        try:
+            record_event("signup", user_id=user.id, props={"method": "otp"})
 
-            except Exception:
-                pass
+        except Exception:
+            pass
 
-        access_token = security.create_access_token(
-            {"sub": str(user.id), "role": user.role}
-        )
+    access_token = security.create_access_token(
+        {"sub": str(user.id), "role": user.role}
+    )
 
-        refresh_plain = secrets.token_urlsafe(48)
+    refresh_plain = secrets.token_urlsafe(48)
 
-        refresh_hash = hashlib.sha256(refresh_plain.encode("utf-8")).hexdigest()
+    refresh_hash = hashlib.sha256(refresh_plain.encode("utf-8")).hexdigest()
 
-        expires = datetime.now(timezone.utc) + timedelta(days=30)
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
 
-        rt = RefreshToken(user_id=user.id, token_hash=refresh_hash, expires_at=expires)
+    rt = RefreshToken(user_id=user.id, token_hash=refresh_hash, expires_at=expires)
 
-        db.add(rt)
+    db.add(rt)
 
-        db.commit()
+    db.commit()
 
-        db.refresh(rt)
+    db.refresh(rt)
 
-        try:
-            record_event("login", user_id=user.id, props={"method": "otp"})
+    try:
+        record_event("login", user_id=user.id, props={"method": "otp"})
 
-        except Exception:
-            pass
+    except Exception:
+        pass
 
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "refresh_token": refresh_plain,
-            "user": {"id": user.id, "email": user.email},
-        }
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_plain,
+        "user": {"id": user.id, "email": user.email},
+    }
 
-    finally:
-        db.close()
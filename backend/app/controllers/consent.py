@@ -6,8 +6,9 @@ from typing import Optional
 import hashlib
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
 
-from app.dependencies import get_current_user, get_current_user_optional
+from app.dependencies import get_current_user, get_current_user_optional, get_db
 from app.config import settings
 from app.limits import limiter, get_client_ip
 
@@ -99,6 +100,33 @@ def _user_latest_event(db, user_id: int) -> Optional[ConsentEvent]:
     )
 
 
+def _user_state(ev: Optional[ConsentEvent]) -> dict:
+    if not ev:
+        return {"has_consented": False, "last_event": None}
+    # has_consented if both TOS and Privacy are accepted, and event matches current policy_version
+    current_policy = _policy_version_from_current()
+    has_consented = bool(
+        ev.tos_accepted_at
+        and ev.privacy_accepted_at
+        and ev.policy_version == current_policy
+    )
+    return {
+        "has_consented": has_consented,
+        "last_event": {
+            "policy_version": ev.policy_version,
+            "consent_version": ev.consent_version,
+            "tos_accepted_at": ev.tos_accepted_at.isoformat()
+            if ev.tos_accepted_at
+            else None,
+            "privacy_accepted_at": ev.privacy_accepted_at.isoformat()
+            if ev.privacy_accepted_at
+            else None,
+            "research_opt_in": ev.research_opt_in,
+            "created_at": ev.created_at.isoformat() if ev.created_at else None,
+        },
+    }
+
+
 # --------------------
 # Endpoints
 # --------------------
@@ -107,50 +135,18 @@ def _user_latest_event(db, user_id: int) -> Optional[ConsentEvent]:
 def consent_current(
     request: Request,
     current_user: Optional[User] = Depends(get_current_user_optional),
+    db: Session = Depends(get_db),
 ):
     """
     Return current legal versions and canonical URLs.
     If authenticated, include best-effort user state (has_consented + last event) based on most recent ConsentEvent.
     """
-    from app.main import SessionLocal
-
     tos_v, privacy_v, research_v = _current_versions()
     urls = _legal_urls()
 
     user_state: Optional[dict] = None
     if current_user:
-        db = SessionLocal()
-        try:
-            ev = _user_latest_event(db, current_user.id)
-            if ev:
-                # has_consented if both TOS and Privacy are accepted, and event matches current policy_version
-                current_policy = _policy_version_from_current()
-                has_consented = bool(
-                    ev.tos_accepted_at
-                    and ev.privacy_accepted_at
-                    and ev.policy_version == current_policy
-                )
-                user_state = {
-                    "has_consented": has_consented,
-                    "last_event": {
-                        "policy_version": ev.policy_version,
-                        "consent_version": ev.consent_version,
-                        "tos_accepted_at": ev.tos_accepted_at.isoformat()
-                        if ev.tos_accepted_at
-                        else None,
-                        "privacy_accepted_at": ev.privacy_accepted_at.isoformat()
-                        if ev.privacy_accepted_at
-                        else None,
-                        "research_opt_in": ev.research_opt_in,
-                        "created_at": ev.created_at.isoformat()
-                        if ev.created_at
-                        else None,
-                    },
-                }
-            else:
-                user_state = {"has_consented": False, "last_event": None}
-        finally:
-            db.close()
+        user_state = _user_state(_user_latest_event(db, current_user.id))
 
     return {
         "tos_version": tos_v,
@@ -167,14 +163,13 @@ def consent_submit(
     payload: ConsentSubmit,
     request: Request,
     current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
 ):
     """
     Record a new immutable consent event for the authenticated user.
     - Requires acceptance of both TOS and Privacy.
     - Uses one-way IP hashing with a server-side salt (CONSENT_IP_HASH_SALT) if configured.
     """
-    from app.main import SessionLocal
-
     if not payload.tos_accepted or not payload.privacy_accepted:
         raise HTTPException(
             status_code=400, detail="Must accept both Terms and Privacy to proceed"
@@ -190,38 +185,34 @@ def consent_submit(
     ip_hash = _hash_ip(client_ip, getattr(settings, "CONSENT_IP_HASH_SALT", None))
 
     # Persist immutable event
-    db = SessionLocal()
-    try:
-        ev = ConsentEvent(
-            user_id=current_user.id,
-            policy_version=payload.policy_version or _policy_version_from_current(),
-            tos_accepted_at=tos_at,
-            privacy_accepted_at=priv_at,
-            research_opt_in=bool(payload.research_opt_in),
-            ip_hash=ip_hash,
-            user_agent=request.headers.get("user-agent"),
-            consent_version=payload.consent_version,
-            created_at=_now_utc(),
-        )
-        db.add(ev)
-        db.commit()
-        db.refresh(ev)
-
-        return {
-            "status": "ok",
-            "event": {
-                "id": ev.id,
-                "policy_version": ev.policy_version,
-                "consent_version": ev.consent_version,
-                "research_opt_in": ev.research_opt_in,
-                "tos_accepted_at": ev.tos_accepted_at.isoformat()
-                if ev.tos_accepted_at
-                else None,
-                "privacy_accepted_at": ev.privacy_accepted_at.isoformat()
-                if ev.privacy_accepted_at
-                else None,
-                "created_at": ev.created_at.isoformat() if ev.created_at else None,
-            },
-        }
-    finally:
-        db.close()
+    ev = ConsentEvent(
+        user_id=current_user.id,
+        policy_version=payload.policy_version or _policy_version_from_current(),
+        tos_accepted_at=tos_at,
+        privacy_accepted_at=priv_at,
+        research_opt_in=bool(payload.research_opt_in),
+        ip_hash=ip_hash,
+        user_agent=request.headers.get("user-agent"),
+        consent_version=payload.consent_version,
+        created_at=_now_utc(),
+    )
+    db.add(ev)
+    db.commit()
+    db.refresh(ev)
+
+    return {
+        "status": "ok",
+        "event": {
+            "id": ev.id,
+            "policy_version": ev.policy_version,
+            "consent_version": ev.consent_version,
+            "research_opt_in": ev.research_opt_in,
+            "tos_accepted_at": ev.tos_accepted_at.isoformat()
+            if ev.tos_accepted_at
+            else None,
+            "privacy_accepted_at": ev.privacy_accepted_at.isoformat()
+            if ev.privacy_accepted_at
+            else None,
+            "created_at": ev.created_at.isoformat() if ev.created_at else None,
+        },
+    }
@@ -1,401 +1,369 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.schemas.mood import MoodCreate, MoodRead
 from app.models.mood_entry import MoodEntry
 from app.models.user import User
-from app.services import security
 from app.services.analytics import record_event
 from app.schemas.journal import JournalCreate, JournalRead
 from app.schemas.symptom import SymptomCreate, SymptomRead, AnalyticsSummary
+from app.schemas.sleep import SleepCreate, SleepRead
+from app.schemas.batch import BatchRequest, BatchResponse
 from app.models.journal_entry import JournalEntry
 from app.models.symptom_entry import SymptomEntry
-from collections import Counter
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import func
 from app.models.sleep_entry import SleepEntry
+from app.config import settings
+from app.dependencies import etag_guard, get_db, decode_request_token
+from app.services.principal_cache import load_principal
+from app.utils.pagination import PageParams, page_params, paginate
+from app.services import daily_rollup, sync_changes, user_stats
 
 router = APIRouter()
 
-def get_current_user(authorization: Optional[str] = Header(None)) -> User:
+def get_current_user(request: Request, authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> User:
     if not authorization:
         raise HTTPException(status_code=401, detail='Missing authorization header')
     try:
         scheme, token = authorization.split()
     except Exception:
         raise HTTPException(status_code=401, detail='Invalid authorization header')
-    payload = security.decode_access_token(token)
+    payload = decode_request_token(request, token)
     if not payload or 'sub' not in payload:
         raise HTTPException(status_code=401, detail='Invalid token')
-    user_id = int(payload['sub'])
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        user = db.query(User).get(user_id)
-        if not user:
-            raise HTTPException(status_code=401, detail='User not found')
-        return user
-    finally:
-        db.close()
-
-@router.get('/moods', response_model=List[MoodRead])
-def list_moods(user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        entries = db.query(MoodEntry).filter(MoodEntry.user_id == user.id).order_by(MoodEntry.created_at.desc()).all()
-        return entries
-    finally:
-        db.close()
+    user = load_principal(db, payload)
+    if not user:
+        raise HTTPException(status_code=401, detail='User not found')
+    return user
+
+@router.get('/moods', response_model=List[MoodRead], dependencies=[Depends(etag_guard('moods', get_current_user))])
+def list_moods(page: PageParams = Depends(page_params), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    q = db.query(MoodEntry).filter(MoodEntry.user_id == user.id)
+    return paginate(q, MoodEntry.created_at, MoodEntry.id, page)
 
 @router.post('/moods', response_model=MoodRead)
-def create_mood(entry_in: MoodCreate, user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
-    db = SessionLocal()
+def create_mood(entry_in: MoodCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    entry = MoodEntry(user_id=user.id, score=entry_in.score, note=entry_in.note)
+    db.add(entry)
+    db.flush()
+    user_stats.mood_added(db, user.id, entry.score)
+    daily_rollup.mood_added(db, user.id, entry.created_at, entry.score)
+    sync_changes.record(db, user.id, 'mood', [entry.id])
+    db.commit()
+    db.refresh(entry)
+    from app.services.mood_trends import invalidate
+    invalidate(user.id)
     try:
-        entry = MoodEntry(user_id=user.id, score=entry_in.score, note=entry_in.note)
-        db.add(entry)
-        db.commit()
-        db.refresh(entry)
-        try:
-            record_event('mood.create', user_id=user.id, props={'score': entry.score})
-        except Exception:
-            pass
-        return entry
-    finally:
-        db.close()
+        record_event('mood.create', user_id=user.id, props={'score': entry.score})
+    except Exception:
+        pass
+    return entry
 
 
 @router.post('/journals', response_model=JournalRead)
-def create_journal(payload: JournalCreate, user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
-    db = SessionLocal()
+def create_journal(payload: JournalCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    from app.services.crypto import encrypt_for_storage
+    from app.services.data_keys import current_key
+    # rows reference the user's data key; legacy envelope rows store a wrapped key (ek) each
+    ciphertext, encryption_key, key_id = encrypt_for_storage(payload.content, current_key(db, user.id))
+
+    # Normalize entry_date: allow payload.entry_date ISO string or None
+    entry_date_val = None
     try:
-        from app.services.crypto import encrypt_text
-        content_enc = encrypt_text(payload.content) if payload.content else ''
-        # if envelope format (JSON with ct and ek), store ek separately
-        encryption_key = None
-        try:
-            import json
-            doc = json.loads(content_enc)
-            if isinstance(doc, dict) and 'ct' in doc and 'ek' in doc:
-                ciphertext = doc['ct']
-                encryption_key = doc['ek']
+        if getattr(payload, 'entry_date', None):
+            # payload.entry_date may be a datetime; convert to date
+            ed = payload.entry_date
+            if isinstance(ed, str):
+                from datetime import date
+                entry_date_val = datetime.fromisoformat(ed).date()
+            elif hasattr(ed, 'date'):
+                entry_date_val = ed.date()
             else:
-                ciphertext = content_enc
-        except Exception:
-            ciphertext = content_enc
-
-        # Normalize entry_date: allow payload.entry_date ISO string or None
+                entry_date_val = ed
+    except Exception:
         entry_date_val = None
-        try:
-            if getattr(payload, 'entry_date', None):
-                # payload.entry_date may be a datetime; convert to date
-                ed = payload.entry_date
-                if isinstance(ed, str):
-                    from datetime import date
-                    entry_date_val = datetime.fromisoformat(ed).date()
-                elif hasattr(ed, 'date'):
-                    entry_date_val = ed.date()
-                else:
-                    entry_date_val = ed
-        except Exception:
-            entry_date_val = None
-
-        j = JournalEntry(user_id=user.id, title=payload.title, content=ciphertext, encryption_key=encryption_key, entry_date=entry_date_val, progress=getattr(payload, 'progress', None))
-        db.add(j)
-        db.commit()
-        db.refresh(j)
-        # decrypt for response
-        try:
-            # if stored with envelope encryption, use envelope decrypt
-            if getattr(j, 'encryption_key', None):
-                from app.services.envelope_crypto import decrypt_from_kms
-                j.content = decrypt_from_kms(j.content, j.encryption_key)
-            else:
-                from app.services.crypto import decrypt_text
-                j.content = decrypt_text(j.content) if j.content else j.content
-        except Exception:
-            pass
-        return j
-    finally:
-        db.close()
+    now = datetime.now(timezone.utc)
+    if entry_date_val is None:
+        # same default as /journals/batch: the user's local day, not the server's
+        entry_date_val = daily_rollup.local_day(now, daily_rollup.profile_timezone(db, user.id))
+
+    j = JournalEntry(user_id=user.id, title=payload.title, content=ciphertext, encryption_key=encryption_key, key_id=key_id, created_at=now, entry_date=entry_date_val, progress=getattr(payload, 'progress', None))
+    db.add(j)
+    db.flush()
+    daily_rollup.journal_changed(db, user.id, new=j)
+    sync_changes.record(db, user.id, 'journal', [j.id])
+    db.commit()
+    db.refresh(j)
+    # decrypt for response
+    _decrypt_journals([j], db)
+    return j
 
 
 @router.get('/journals', response_model=list[JournalRead])
-def list_journals(date: str | None = None, start: str | None = None, end: str | None = None, user: User = Depends(get_current_user)):
-    """List journals for the current user.
+def list_journals(date: str | None = None, start: str | None = None, end: str | None = None, page: PageParams = Depends(page_params), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """List journals for the current user, newest first, one page at a time.
     Optional query parameters:
       - date: YYYY-MM-DD to return entries for a specific day
       - start, end: ISO datetimes to return entries in a date range
+      - cursor, limit: keyset pagination (see app.utils.pagination)
     """
-    from app.main import SessionLocal
-    db = SessionLocal()
+    q = db.query(JournalEntry).filter(JournalEntry.user_id == user.id, *_journal_filters(date, start, end))
+    items = paginate(q, JournalEntry.created_at, JournalEntry.id, page)
+    return _decrypt_journals(items, db)
+
+
+def _journal_filters(date: str | None, start: str | None, end: str | None) -> list:
+    """WHERE criteria for the `date` / `start` / `end` journal list parameters."""
+    criteria = []
+    # filter by logical entry_date if provided
     try:
-        q = db.query(JournalEntry).filter(JournalEntry.user_id == user.id)
-        # filter by logical entry_date if provided
-        try:
-            if date:
-                d = datetime.fromisoformat(date).date()
-                q = q.filter(JournalEntry.entry_date == d)
-            else:
-                if start:
-                    s_dt = datetime.fromisoformat(start)
-                    if s_dt.tzinfo is None:
-                        s_dt = s_dt.replace(tzinfo=timezone.utc)
-                    q = q.filter(JournalEntry.created_at >= s_dt)
-                if end:
-                    e_dt = datetime.fromisoformat(end)
-                    if e_dt.tzinfo is None:
-                        e_dt = e_dt.replace(tzinfo=timezone.utc)
-                    q = q.filter(JournalEntry.created_at <= e_dt)
-        except Exception:
-            # ignore parse errors and return unfiltered list
-            pass
-
-        items = q.order_by(JournalEntry.created_at.desc()).all()
-        # decrypt before returning
-        try:
-            for it in items:
-                if getattr(it, 'content', None):
-                    if getattr(it, 'encryption_key', None):
-                        from app.services.envelope_crypto import decrypt_from_kms
-                        it.content = decrypt_from_kms(it.content, it.encryption_key)
-                    else:
-                        from app.services.crypto import decrypt_text
-                        it.content = decrypt_text(it.content)
-        except Exception:
-            pass
-        return items
-    finally:
-        db.close()
+        if date:
+            d = datetime.fromisoformat(date).date()
+            criteria.append(JournalEntry.entry_date == d)
+        else:
+            if start:
+                s_dt = datetime.fromisoformat(start)
+                if s_dt.tzinfo is None:
+                    s_dt = s_dt.replace(tzinfo=timezone.utc)
+                criteria.append(JournalEntry.created_at >= s_dt)
+            if end:
+                e_dt = datetime.fromisoformat(end)
+                if e_dt.tzinfo is None:
+                    e_dt = e_dt.replace(tzinfo=timezone.utc)
+                criteria.append(JournalEntry.created_at <= e_dt)
+    except Exception:
+        # ignore parse errors and keep whatever parsed cleanly
+        pass
+    return criteria
+
+
+def _decrypt_journals(items, db: Session = None):
+    # decrypt before returning
+    from app.services.crypto import decrypt_from_storage
+    for it in items:
+        it.content = decrypt_from_storage(it.content, getattr(it, 'encryption_key', None), getattr(it, 'key_id', None), db)
+    return items
 
 
 @router.put('/journals/{journal_id}', response_model=JournalRead)
-def update_journal(journal_id: int, payload: JournalCreate, user: User = Depends(get_current_user)):
+def update_journal(journal_id: int, payload: JournalCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Update an existing journal entry. Only the owner may update."""
-    from app.main import SessionLocal
     from app.models.journal_entry import JournalEntry
-    db = SessionLocal()
+    j = db.query(JournalEntry).filter(JournalEntry.id == journal_id, JournalEntry.user_id == user.id).first()
+    if not j:
+        raise HTTPException(status_code=404, detail='Journal not found')
+
+    # encrypt content similarly to create_journal
+    from app.services.crypto import encrypt_for_storage
+    from app.services.data_keys import current_key
+    ciphertext, encryption_key, key_id = encrypt_for_storage(payload.content, current_key(db, user.id))
+
+    from types import SimpleNamespace
+    old = SimpleNamespace(entry_date=j.entry_date, created_at=j.created_at, progress=j.progress)
+    j.title = payload.title
+    j.content = ciphertext
+    j.encryption_key = encryption_key
+    j.key_id = key_id
+    # handle entry_date and progress if provided
     try:
-        j = db.query(JournalEntry).filter(JournalEntry.id == journal_id, JournalEntry.user_id == user.id).first()
-        if not j:
-            raise HTTPException(status_code=404, detail='Journal not found')
-
-        # encrypt content similarly to create_journal
-        from app.services.crypto import encrypt_text
-        content_enc = encrypt_text(payload.content) if payload.content else ''
-        encryption_key = None
-        try:
-            import json
-            doc = json.loads(content_enc)
-            if isinstance(doc, dict) and 'ct' in doc and 'ek' in doc:
-                ciphertext = doc['ct']
-                encryption_key = doc['ek']
-            else:
-                ciphertext = content_enc
-        except Exception:
-            ciphertext = content_enc
-
-        j.title = payload.title
-        j.content = ciphertext
-        j.encryption_key = encryption_key
-        # handle entry_date and progress if provided
-        try:
-            if getattr(payload, 'entry_date', None):
-                ed = payload.entry_date
-                if isinstance(ed, str):
-                    j.entry_date = datetime.fromisoformat(ed).date()
-                elif hasattr(ed, 'date'):
-                    j.entry_date = ed.date()
-            else:
-                j.entry_date = j.entry_date or None
-        except Exception:
-            pass
-        if getattr(payload, 'progress', None) is not None:
-            j.progress = payload.progress
-
-        db.add(j)
-        db.commit()
-        db.refresh(j)
-
-        # decrypt for response
-        try:
-            if getattr(j, 'encryption_key', None):
-                from app.services.envelope_crypto import decrypt_from_kms
-                j.content = decrypt_from_kms(j.content, j.encryption_key)
-            else:
-                from app.services.crypto import decrypt_text
-                j.content = decrypt_text(j.content) if j.content else j.content
-        except Exception:
-            pass
+        if getattr(payload, 'entry_date', None):
+            ed = payload.entry_date
+            if isinstance(ed, str):
+                j.entry_date = datetime.fromisoformat(ed).date()
+            elif hasattr(ed, 'date'):
+                j.entry_date = ed.date()
+        else:
+            j.entry_date = j.entry_date or None
+    except Exception:
+        pass
+    if getattr(payload, 'progress', None) is not None:
+        j.progress = payload.progress
+
+    db.add(j)
+    db.flush()
+    daily_rollup.journal_changed(db, user.id, old=old, new=j)
+    sync_changes.record(db, user.id, 'journal', [j.id])
+    db.commit()
+    db.refresh(j)
 
-        return j
-    finally:
-        db.close()
+    # decrypt for response
+    _decrypt_journals([j], db)
+    return j
 
 
 @router.delete('/journals/{journal_id}')
-def delete_journal(journal_id: int, user: User = Depends(get_current_user)):
+def delete_journal(journal_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Delete a journal entry owned by the user."""
-    from app.main import SessionLocal
     from app.models.journal_entry import JournalEntry
-    db = SessionLocal()
-    try:
-        j = db.query(JournalEntry).filter(JournalEntry.id == journal_id, JournalEntry.user_id == user.id).first()
-        if not j:
-            raise HTTPException(status_code=404, detail='Journal not found')
-        db.delete(j)
-        db.commit()
-        return {'status': 'deleted'}
-    finally:
-        db.close()
+    j = db.query(JournalEntry).filter(JournalEntry.id == journal_id, JournalEntry.user_id == user.id).first()
+    if not j:
+        raise HTTPException(status_code=404, detail='Journal not found')
+    db.delete(j)
+    db.flush()
+    daily_rollup.journal_changed(db, user.id, old=j)
+    sync_changes.record(db, user.id, 'journal', [j.id], op='delete')
+    db.commit()
+    return {'status': 'deleted'}
 
 
 @router.post('/symptoms', response_model=SymptomRead)
-def create_symptom(payload: SymptomCreate, user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        s = SymptomEntry(user_id=user.id, symptom=payload.symptom, severity=payload.severity, note=payload.note)
-        db.add(s)
-        db.commit()
-        db.refresh(s)
-        return s
-    finally:
-        db.close()
+def create_symptom(payload: SymptomCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    s = SymptomEntry(user_id=user.id, symptom=payload.symptom, severity=payload.severity, note=payload.note)
+    db.add(s)
+    db.flush()
+    user_stats.symptom_added(db, user.id, s.symptom)
+    sync_changes.record(db, user.id, 'symptom', [s.id])
+    db.commit()
+    db.refresh(s)
+    return s
 
 
 @router.get('/symptoms', response_model=list[SymptomRead])
-def list_symptoms(user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        items = db.query(SymptomEntry).filter(SymptomEntry.user_id == user.id).order_by(SymptomEntry.created_at.desc()).all()
-        return items
-    finally:
-        db.close()
+def list_symptoms(page: PageParams = Depends(page_params), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    q = db.query(SymptomEntry).filter(SymptomEntry.user_id == user.id)
+    return paginate(q, SymptomEntry.created_at, SymptomEntry.id, page)
+
+
+def _check_batch(payload: BatchRequest):
+    limit = getattr(settings, 'BATCH_MAX_ITEMS', 500)
+    if len(payload.items) > limit:
+        raise HTTPException(status_code=413, detail=f'At most {limit} items per batch')
+
+
+@router.post('/moods/batch', response_model=BatchResponse)
+def create_moods_batch(payload: BatchRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Ingest queued offline mood entries in one transaction (see app.services.batch_ingest).
+    Each item needs a client_id; replays of an already stored client_id come back as 'duplicate'."""
+    from app.services.batch_ingest import ingest_moods
+    _check_batch(payload)
+    return ingest_moods(db, user.id, payload.items)
+
+
+@router.post('/journals/batch', response_model=BatchResponse)
+def create_journals_batch(payload: BatchRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    from app.services.batch_ingest import ingest_journals
+    _check_batch(payload)
+    return ingest_journals(db, user.id, payload.items)
+
+
+@router.post('/symptoms/batch', response_model=BatchResponse)
+def create_symptoms_batch(payload: BatchRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    from app.services.batch_ingest import ingest_symptoms
+    _check_batch(payload)
+    return ingest_symptoms(db, user.id, payload.items)
 
 
 @router.get('/moods/analytics', response_model=AnalyticsSummary)
-def mood_analytics(user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        moods = db.query(MoodEntry).filter(MoodEntry.user_id == user.id).all()
-        if moods:
-            avg = sum(m.score for m in moods) / len(moods)
-        else:
-            avg = None
-        count = len(moods)
-        symptoms = db.query(SymptomEntry).filter(SymptomEntry.user_id == user.id).all()
-        most_common = [s for s, _ in Counter([sym.symptom for sym in symptoms]).most_common(3)] if symptoms else []
-        return AnalyticsSummary(average_mood=avg, entries_count=count, most_common_symptoms=most_common)
-    finally:
-        db.close()
+def mood_analytics(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # served from the running per-user totals (services/user_stats), not the raw history
+    avg, count, most_common = user_stats.summary(db, user.id)
+    return AnalyticsSummary(average_mood=avg, entries_count=count, most_common_symptoms=most_common)
 
 
 @router.get('/moods/analytics/daily')
-def mood_analytics_daily(start: str | None = None, end: str | None = None, user: User = Depends(get_current_user)):
-    """Return daily mood averages and counts between start and end (ISO dates). Defaults to last 30 days."""
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        if end:
-            end_dt = datetime.fromisoformat(end)
-            # if naive, assume UTC
-            if end_dt.tzinfo is None:
-                end_dt = end_dt.replace(tzinfo=timezone.utc)
-        else:
-            end_dt = datetime.now(timezone.utc)
-        if start:
-            start_dt = datetime.fromisoformat(start)
-            if start_dt.tzinfo is None:
-                start_dt = start_dt.replace(tzinfo=timezone.utc)
-        else:
-            start_dt = end_dt - timedelta(days=30)
+def mood_analytics_daily(start: str | None = None, end: str | None = None, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Return daily mood averages and counts between start and end (ISO dates). Defaults to last 30 days.
 
-        q = db.query(func.date(MoodEntry.created_at).label('day'), func.avg(MoodEntry.score).label('avg_score'), func.count(MoodEntry.id).label('count'))
-        q = q.filter(MoodEntry.user_id == user.id, MoodEntry.created_at >= start_dt, MoodEntry.created_at <= end_dt)
-        q = q.group_by(func.date(MoodEntry.created_at)).order_by(func.date(MoodEntry.created_at).asc())
-        rows = q.all()
-        result = [{'day': r.day.isoformat() if hasattr(r.day, 'isoformat') else str(r.day), 'average': float(r.avg_score) if r.avg_score is not None else None, 'count': int(r.count)} for r in rows]
-        return {'start': start_dt.isoformat(), 'end': end_dt.isoformat(), 'daily': result}
-    finally:
-        db.close()
+    Days are calendar days in the user's profile timezone, read from the daily rollups.
+    """
+    if end:
+        end_dt = datetime.fromisoformat(end)
+        # if naive, assume UTC
+        if end_dt.tzinfo is None:
+            end_dt = end_dt.replace(tzinfo=timezone.utc)
+    else:
+        end_dt = datetime.now(timezone.utc)
+    if start:
+        start_dt = datetime.fromisoformat(start)
+        if start_dt.tzinfo is None:
+            start_dt = start_dt.replace(tzinfo=timezone.utc)
+    else:
+        start_dt = end_dt - timedelta(days=30)
+
+    tz = daily_rollup.user_timezone(db, user.id)
+    rows = daily_rollup.days(db, user.id, daily_rollup.local_day(start_dt, tz), daily_rollup.local_day(end_dt, tz))
+    result = [{'day': r.day.isoformat(), 'average': r.mood_sum / r.mood_count, 'count': r.mood_count} for r in rows if r.mood_count]
+    return {'start': start_dt.isoformat(), 'end': end_dt.isoformat(), 'daily': result}
+
+
+@router.get('/moods/trends')
+def mood_trends(days: int = Query(90, ge=7, le=365), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Rolling 7/30-day means, EWMA, day-over-day volatility and low-day streaks over the last
+    `days` local days. Cached until the user's next mood write."""
+    from app.services.mood_trends import trends
+    return trends(db, user.id, days)
 
 
 @router.get('/journals/summary')
-def journals_progress_summary(start: str | None = None, end: str | None = None, user: User = Depends(get_current_user)):
+def journals_progress_summary(start: str | None = None, end: str | None = None, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Return daily progress summary for journals between start and end dates.
-    Returns list of {day: YYYY-MM-DD, avg_progress: float, count: int}
+    Returns list of {day: YYYY-MM-DD, avg_progress: float, count: int}, read from the daily rollups.
     """
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        if end:
-            end_dt = datetime.fromisoformat(end)
-            if end_dt.tzinfo is None:
-                end_dt = end_dt.replace(tzinfo=timezone.utc)
-        else:
-            end_dt = datetime.now(timezone.utc)
-        if start:
-            start_dt = datetime.fromisoformat(start)
-            if start_dt.tzinfo is None:
-                start_dt = start_dt.replace(tzinfo=timezone.utc)
-        else:
-            start_dt = end_dt - timedelta(days=30)
-
-        q = db.query(func.date(JournalEntry.entry_date).label('day'), func.avg(JournalEntry.progress).label('avg_progress'), func.count(JournalEntry.id).label('count'))
-        q = q.filter(JournalEntry.user_id == user.id, JournalEntry.entry_date != None, JournalEntry.entry_date >= start_dt.date(), JournalEntry.entry_date <= end_dt.date())
-        q = q.group_by(func.date(JournalEntry.entry_date)).order_by(func.date(JournalEntry.entry_date).asc())
-        rows = q.all()
-        result = [{'day': r.day.isoformat() if hasattr(r.day, 'isoformat') else str(r.day), 'avg_progress': float(r.avg_progress) if r.avg_progress is not None else None, 'count': int(r.count)} for r in rows]
-        return {'start': start_dt.isoformat(), 'end': end_dt.isoformat(), 'daily': result}
-    finally:
-        db.close()
+    if end:
+        end_dt = datetime.fromisoformat(end)
+        if end_dt.tzinfo is None:
+            end_dt = end_dt.replace(tzinfo=timezone.utc)
+    else:
+        end_dt = datetime.now(timezone.utc)
+    if start:
+        start_dt = datetime.fromisoformat(start)
+        if start_dt.tzinfo is None:
+            start_dt = start_dt.replace(tzinfo=timezone.utc)
+    else:
+        start_dt = end_dt - timedelta(days=30)
+
+    tz = daily_rollup.user_timezone(db, user.id)
+    rows = daily_rollup.days(db, user.id, daily_rollup.local_day(start_dt, tz), daily_rollup.local_day(end_dt, tz))
+    result = [{'day': r.day.isoformat(), 'avg_progress': r.progress_sum / r.progress_count, 'count': r.progress_count} for r in rows if r.progress_count]
+    return {'start': start_dt.isoformat(), 'end': end_dt.isoformat(), 'daily': result}
+
+
+@router.post('/sleep', response_model=SleepRead)
+def create_sleep(payload: SleepCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    from app.services.sleep_metrics import add_entry
+    if payload.sleep_end <= payload.sleep_start:
+        raise HTTPException(status_code=400, detail='sleep_end must be after sleep_start')
+    entry = add_entry(db, user.id, payload.sleep_start, payload.sleep_end, payload.quality)
+    db.refresh(entry)
+    return entry
+
+
+@router.delete('/sleep/{sleep_id}')
+def delete_sleep(sleep_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    from app.services.sleep_metrics import delete_entry
+    s = db.query(SleepEntry).filter(SleepEntry.id == sleep_id, SleepEntry.user_id == user.id).first()
+    if not s:
+        raise HTTPException(status_code=404, detail='Sleep entry not found')
+    delete_entry(db, s)
+    return {'status': 'deleted'}
+
+
+@router.get('/sleep/metrics')
+def sleep_metrics(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Latest night plus 7/30/90-day average sleep (hours, percent of SLEEP_TARGET_HOURS, count)
+    and bedtime consistency (stddev in minutes over 30 days), from one cached SQL aggregate."""
+    from app.services.sleep_metrics import summary
+    return summary(db, user.id)
 
 
 @router.get('/sleep/metric')
-def sleep_metric(window: str | None = None, user: User = Depends(get_current_user)):
+def sleep_metric(window: str | None = None, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Return a simple sleep metric.
 
     Query parameter `window` controls which metric is returned:
       - omitted or 'last' (default): use the latest completed sleep entry
-      - '7d' : compute the average sleep duration across the last 7 days (entries with sleep_end)
+      - '7d' : the average sleep duration across the last 7 days (entries with sleep_end)
 
     Response includes percent (0-100) and hours (float). For multi-day windows, also returns count.
+    Served from the same cached summary as /sleep/metrics.
     """
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        now = datetime.now(timezone.utc)
-        # support simple window values
-        if window and window.lower() in ('7d', '7', '7-day', 'week'):
-            days = 7
-        else:
-            days = None
-
-        if days is None:
-            # Find the latest sleep entry with an end timestamp
-            s = db.query(SleepEntry).filter(SleepEntry.user_id == user.id, SleepEntry.sleep_end != None).order_by(SleepEntry.sleep_end.desc()).first()
-            if not s or not s.sleep_end or not s.sleep_start:
-                return {'percent': None, 'hours': None}
-            dur = s.sleep_end - s.sleep_start
-            hours = dur.total_seconds() / 3600.0
-            percent = int(min(100, round((hours / 8.0) * 100)))
-            return {'percent': percent, 'hours': round(hours, 2), 'window': 'last', 'count': 1}
-        else:
-            start = now - timedelta(days=days)
-            rows = db.query(SleepEntry).filter(SleepEntry.user_id == user.id, SleepEntry.sleep_end != None, SleepEntry.sleep_end >= start).all()
-            valid = [r for r in rows if getattr(r, 'sleep_start', None) and getattr(r, 'sleep_end', None)]
-            if not valid:
-                return {'percent': None, 'hours': None, 'window': f'last_{days}_days', 'count': 0}
-            total_seconds = 0.0
-            for r in valid:
-                dur = r.sleep_end - r.sleep_start
-                total_seconds += max(0.0, dur.total_seconds())
-            avg_hours = (total_seconds / len(valid)) / 3600.0
-            percent = int(min(100, round((avg_hours / 8.0) * 100)))
-            return {'percent': percent, 'hours': round(avg_hours, 2), 'window': f'last_{days}_days', 'count': len(valid)}
-    finally:
-        db.close()
+    from app.services.sleep_metrics import summary
+    data = summary(db, user.id)
+    # support simple window values
+    if window and window.lower() in ('7d', '7', '7-day', 'week'):
+        w = data['7d']
+        return {'percent': w['percent'], 'hours': w['hours'], 'window': 'last_7_days', 'count': w['count']}
+    w = data['last']
+    if w['hours'] is None:
+        return {'percent': None, 'hours': None}
+    return {'percent': w['percent'], 'hours': w['hours'], 'window': 'last', 'count': 1}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, Response, HTTPException, Request
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_db
+from sqlalchemy.orm import Session
 from app.models.user import User
 from app.models.consent_audit import ConsentAudit
 from app.services.task_queue import enqueue
@@ -12,55 +13,49 @@ router = APIRouter()
 
 
 @router.get('/privacy/export')
-def export_my_data(format: str = 'json', current_user: User = Depends(get_current_user)):
+def export_my_data(format: str = 'json', current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Export basic user data and records (moods, journals) for the requesting user.
 
     For privacy, this only returns data for the requesting user. Admin export should be separate.
     """
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        uid = current_user.id
-        # collect user, profile, moods, journals
-        from app.models.user import User as UserModel
-        from app.models.profile import Profile
-        from app.models.mood_entry import MoodEntry
-        from app.models.journal_entry import JournalEntry
+    uid = current_user.id
+    # collect user, profile, moods, journals
+    from app.models.user import User as UserModel
+    from app.models.profile import Profile
+    from app.models.mood_entry import MoodEntry
+    from app.models.journal_entry import JournalEntry
 
-        user = db.query(UserModel).filter(UserModel.id == uid).first()
-        profile = db.query(Profile).filter(Profile.user_id == uid).first()
-        moods = db.query(MoodEntry).filter(MoodEntry.user_id == uid).all()
-        journals = db.query(JournalEntry).filter(JournalEntry.user_id == uid).all()
+    user = db.query(UserModel).filter(UserModel.id == uid).first()
+    profile = db.query(Profile).filter(Profile.user_id == uid).first()
+    moods = db.query(MoodEntry).filter(MoodEntry.user_id == uid).all()
+    journals = db.query(JournalEntry).filter(JournalEntry.user_id == uid).all()
 
-        # decrypt journals
-        try:
-            from app.services.crypto import decrypt_text
-            for j in journals:
-                if getattr(j, 'content', None):
-                    j.content = decrypt_text(j.content)
-        except Exception:
-            log.exception('Failed to decrypt journals during export')
+    # decrypt journals
+    try:
+        from app.services.crypto import decrypt_from_storage
+        for j in journals:
+            j.content = decrypt_from_storage(j.content, j.encryption_key, j.key_id, db)
+    except Exception:
+        log.exception('Failed to decrypt journals during export')
 
-        payload = {
-            'user': {'id': user.id, 'email': user.email},
-            'profile': { 'language': getattr(profile, 'language', None), 'display_name': getattr(profile, 'display_name', None) },
-            'moods': [{'id': m.id, 'score': m.score, 'note': m.note, 'created_at': m.created_at.isoformat() if m.created_at else None} for m in moods],
-            'journals': [{'id': j.id, 'title': j.title, 'content': getattr(j, 'content', None), 'created_at': j.created_at.isoformat() if j.created_at else None} for j in journals]
-        }
+    payload = {
+        'user': {'id': user.id, 'email': user.email},
+        'profile': { 'language': getattr(profile, 'language', None), 'display_name': getattr(profile, 'display_name', None) },
+        'moods': [{'id': m.id, 'score': m.score, 'note': m.note, 'created_at': m.created_at.isoformat() if m.created_at else None} for m in moods],
+        'journals': [{'id': j.id, 'title': j.title, 'content': getattr(j, 'content', None), 'created_at': j.created_at.isoformat() if j.created_at else None} for j in journals]
+    }
 
-        if format.lower() == 'csv':
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow(['section','id','key','value'])
-            writer.writerow(['user', user.id, 'email', user.email])
-            for m in payload['moods']:
-                writer.writerow(['mood', m['id'], 'score', m['score']])
-            for j in payload['journals']:
-                writer.writerow(['journal', j['id'], 'title', j['title']])
-            return Response(content=output.getvalue(), media_type='text/csv', headers={'Content-Disposition': 'attachment; filename="data_export.csv"'})
-        return payload
-    finally:
-        db.close()
+    if format.lower() == 'csv':
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['section','id','key','value'])
+        writer.writerow(['user', user.id, 'email', user.email])
+        for m in payload['moods']:
+            writer.writerow(['mood', m['id'], 'score', m['score']])
+        for j in payload['journals']:
+            writer.writerow(['journal', j['id'], 'title', j['title']])
+        return Response(content=output.getvalue(), media_type='text/csv', headers={'Content-Disposition': 'attachment; filename="data_export.csv"'})
+    return payload
 
 
 def _do_delete_user_data(user_id: int):
@@ -72,32 +67,46 @@ def _do_delete_user_data(user_id: int):
         from app.models.mood_entry import MoodEntry
         from app.models.profile import Profile
         db.query(JournalEntry).filter(JournalEntry.user_id == user_id).delete()
-        db.query(MoodEntry).filter(MoodEntry.user_id == user_id).delete()
+        # without their data keys, any copies of the ciphertext left in backups are unreadable
+        from app.services import data_keys
+        key_ids = data_keys.delete_user(db, user_id)
+        from app.models.symptom_entry import SymptomEntry
+        from app.services.user_stats import delete_moods, delete_symptoms
+        delete_moods(db, MoodEntry.user_id == user_id)
+        delete_symptoms(db, SymptomEntry.user_id == user_id)
+        from app.services import daily_rollup
+        daily_rollup.delete_user(db, user_id)
+        from app.services import sync_changes
+        sync_changes.delete_user(db, user_id)
         db.query(Profile).filter(Profile.user_id == user_id).delete()
+        from app.services import etags
+        etags.touch(db, user_id, 'profile')
         # note: keep user row to preserve referential integrity but anonymize email
         from app.models.user import User as UserModel
         u = db.query(UserModel).filter(UserModel.id == user_id).first()
         if u:
             u.email = f'deleted_user_{user_id}@example.com'
         db.commit()
+        from app.services.principal_cache import invalidate_user
+        from app.services.i18n import forget_user_locale
+        invalidate_user(user_id)
+        forget_user_locale(user_id)
+        data_keys.forget(user_id, key_ids)
+        from app.services.mood_trends import invalidate
+        invalidate(user_id)
     finally:
         db.close()
 
 
 @router.post('/privacy/delete')
-def delete_my_data(request: Request, current_user: User = Depends(get_current_user)):
+def delete_my_data(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Request deletion of user's personal data. Deletion is executed in background to avoid blocking.
 
     Returns a 202 Accepted and enqueues the deletion task; a consent audit is recorded.
     """
-    from app.main import SessionLocal
-    db = SessionLocal()
-    try:
-        audit = ConsentAudit(user_id=current_user.id, field='data_deletion_requested', old_value='False', new_value='True', source_ip=request.client.host if request.client else None, source_ua=request.headers.get('user-agent'))
-        db.add(audit)
-        db.commit()
-    finally:
-        db.close()
+    audit = ConsentAudit(user_id=current_user.id, field='data_deletion_requested', old_value='False', new_value='True', source_ip=request.client.host if request.client else None, source_ua=request.headers.get('user-agent'))
+    db.add(audit)
+    db.commit()
 
     # enqueue deletion to background
     enqueue(_do_delete_user_data, current_user.id)
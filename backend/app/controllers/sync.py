@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.config import settings
+from app.dependencies import get_current_user, get_db
+from app.models.user import User
+
+router = APIRouter()
+
+
+@router.get('/sync/changes')
+def sync_changes_feed(
+    since: Optional[str] = Query(None, description='`next` token from the previous response; omit for a full sync'),
+    limit: Optional[int] = Query(None, ge=1),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Moods, journals and symptoms created, updated or deleted since `since`.
+
+    Each change is {seq, entity, id, op, data}: `op` is 'upsert' (with the row in `data`) or
+    'delete' (a tombstone). Store `next` and pass it back as `since`; keep fetching while
+    `has_more` is true. `reset: true` means the token is too old: clear local data and sync
+    again without `since`.
+    """
+    from app.services.sync_changes import changes
+    try:
+        since_seq = int(since) if since else 0
+        if since_seq < 0:
+            raise ValueError(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid since token')
+    max_limit = getattr(settings, 'SYNC_MAX_CHANGES', 500)
+    return changes(db, user.id, since_seq, min(limit or max_limit, max_limit))
@@ -1,81 +1,58 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_db
+from sqlalchemy.orm import Session
 from app.models.user import User
 from app.schemas.stopwatch import StopwatchCreate, StopwatchRead
 from app.schemas.timer import TimerCreate, TimerRead
+from app.utils.pagination import PageParams, page_params, paginate
 
 router = APIRouter()
 
 
 @router.post('/stopwatches', response_model=StopwatchRead)
-def start_stopwatch(payload: StopwatchCreate, user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
+def start_stopwatch(payload: StopwatchCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     from app.models.stopwatch import Stopwatch
-    db = SessionLocal()
-    try:
-        s = Stopwatch(user_id=user.id, label=payload.label)
-        db.add(s)
-        db.commit()
-        db.refresh(s)
-        return s
-    finally:
-        db.close()
+    s = Stopwatch(user_id=user.id, label=payload.label)
+    db.add(s)
+    db.commit()
+    db.refresh(s)
+    return s
 
 
 @router.post('/stopwatches/{stopwatch_id}/stop', response_model=StopwatchRead)
-def stop_stopwatch(stopwatch_id: int, user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
+def stop_stopwatch(stopwatch_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     from app.models.stopwatch import Stopwatch
-    db = SessionLocal()
-    try:
-        s = db.query(Stopwatch).filter(Stopwatch.id == stopwatch_id, Stopwatch.user_id == user.id).first()
-        if not s:
-            raise HTTPException(status_code=404, detail='Stopwatch not found')
-        if s.stopped_at is None:
-            from datetime import datetime, timezone
-            s.stopped_at = datetime.now(timezone.utc)
-            db.commit()
-            db.refresh(s)
-        return s
-    finally:
-        db.close()
+    s = db.query(Stopwatch).filter(Stopwatch.id == stopwatch_id, Stopwatch.user_id == user.id).first()
+    if not s:
+        raise HTTPException(status_code=404, detail='Stopwatch not found')
+    if s.stopped_at is None:
+        from datetime import datetime, timezone
+        s.stopped_at = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(s)
+    return s
 
 
 @router.get('/stopwatches', response_model=List[StopwatchRead])
-def list_stopwatches(user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
+def list_stopwatches(page: PageParams = Depends(page_params), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     from app.models.stopwatch import Stopwatch
-    db = SessionLocal()
-    try:
-        items = db.query(Stopwatch).filter(Stopwatch.user_id == user.id).order_by(Stopwatch.started_at.desc()).all()
-        return items
-    finally:
-        db.close()
+    q = db.query(Stopwatch).filter(Stopwatch.user_id == user.id)
+    return paginate(q, Stopwatch.started_at, Stopwatch.id, page, ts_attr='started_at')
 
 
 @router.post('/timers', response_model=TimerRead)
-def create_timer(payload: TimerCreate, user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
+def create_timer(payload: TimerCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     from app.models.timer import Timer
-    db = SessionLocal()
-    try:
-        t = Timer(user_id=user.id, label=payload.label, target_at=payload.target_at)
-        db.add(t)
-        db.commit()
-        db.refresh(t)
-        return t
-    finally:
-        db.close()
+    t = Timer(user_id=user.id, label=payload.label, target_at=payload.target_at)
+    db.add(t)
+    db.commit()
+    db.refresh(t)
+    return t
 
 
 @router.get('/timers', response_model=List[TimerRead])
-def list_timers(user: User = Depends(get_current_user)):
-    from app.main import SessionLocal
+def list_timers(page: PageParams = Depends(page_params), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     from app.models.timer import Timer
-    db = SessionLocal()
-    try:
-        items = db.query(Timer).filter(Timer.user_id == user.id).order_by(Timer.created_at.desc()).all()
-        return items
-    finally:
-        db.close()
+    q = db.query(Timer).filter(Timer.user_id == user.id)
+    return paginate(q, Timer.created_at, Timer.id, page)
@@ -1,49 +1,100 @@
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
 from app.services import security
-from fastapi import Request
+from app.services.principal_cache import load_principal, load_principal_async
+from fastapi import Request, Response
 from typing import Optional
+import time
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/auth/token')
 # optional oauth scheme for endpoints that may be public
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl='/api/auth/token', auto_error=False)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    payload = security.decode_access_token(token)
-    if not payload or 'sub' not in payload:
-        raise HTTPException(status_code=401, detail='Invalid token')
-    user_id = int(payload['sub'])
-    # load user from DB
+def get_db():
+    """Request-scoped DB session.
+
+    FastAPI caches dependencies per request, so the auth dependencies below and the handler
+    that declares `db: Session = Depends(get_db)` share this one session (and at most one
+    pooled connection). The session is closed once the response has been produced.
+    """
     from app.main import SessionLocal
-    from app.models.user import User
+    from app.services import metrics
     db = SessionLocal()
+    started = time.perf_counter()
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=401, detail='User not found')
-        return user
+        yield db
     finally:
         db.close()
+        metrics.observe('db.request_session_hold', time.perf_counter() - started)
 
 
-def get_current_user_optional(token: str | None = Depends(oauth2_scheme_optional)):
+async def get_async_db():
+    """AsyncSession counterpart of `get_db` for the async read endpoints (DB_ASYNC_ENABLED)."""
+    from app.async_db import get_sessionmaker
+    from app.services import metrics
+    started = time.perf_counter()
+    async with get_sessionmaker()() as db:
+        try:
+            yield db
+        finally:
+            metrics.observe('db.async_request_session_hold', time.perf_counter() - started)
+
+
+def decode_request_token(request: Request, token: str) -> dict:
+    """`security.decode_access_token` memoized on request.state.
+
+    accept_language_middleware decodes the bearer token first; the auth dependencies below
+    reuse that payload instead of decoding the same token again.
+    """
+    state = request.state
+    if getattr(state, 'access_token', None) == token:
+        return getattr(state, 'token_payload', None) or {}
+    payload = security.decode_access_token(token)
+    state.access_token = token
+    state.token_payload = payload
+    return payload
+
+
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    payload = decode_request_token(request, token)
+    if not payload or 'sub' not in payload:
+        raise HTTPException(status_code=401, detail='Invalid token')
+    # cached principal snapshot; loads the user row only on a cache miss
+    user = load_principal(db, payload)
+    if not user:
+        raise HTTPException(status_code=401, detail='User not found')
+    return user
+
+
+def get_current_user_optional(request: Request, token: str | None = Depends(oauth2_scheme_optional), db: Session = Depends(get_db)):
     # If no token provided, return None (public access)
     if not token:
         return None
-    payload = security.decode_access_token(token)
+    payload = decode_request_token(request, token)
     if not payload or 'sub' not in payload:
         return None
-    user_id = int(payload['sub'])
-    # load user from DB
-    from app.main import SessionLocal
-    from app.models.user import User
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        return user
-    finally:
-        db.close()
+    return load_principal(db, payload)
+
+
+async def get_current_user_async(request: Request, token: str = Depends(oauth2_scheme), db=Depends(get_async_db)):
+    payload = decode_request_token(request, token)
+    if not payload or 'sub' not in payload:
+        raise HTTPException(status_code=401, detail='Invalid token')
+    user = await load_principal_async(db, payload)
+    if not user:
+        raise HTTPException(status_code=401, detail='User not found')
+    return user
+
+
+async def get_current_user_optional_async(request: Request, token: str | None = Depends(oauth2_scheme_optional), db=Depends(get_async_db)):
+    if not token:
+        return None
+    payload = decode_request_token(request, token)
+    if not payload or 'sub' not in payload:
+        return None
+    return await load_principal_async(db, payload)
 
 
 def get_current_active_user(current_user = Depends(get_current_user)):
@@ -69,3 +120,24 @@ def get_locale(request: Request, current_user = Depends(get_current_user_optiona
         return getattr(request.state, 'locale', 'en')
     # Otherwise fall back to middleware-resolved locale which may be from Accept-Language
     return getattr(request.state, 'locale', 'en')
+
+
+def etag_guard(resource: str, user_dependency=get_current_user):
+    """Dependency that answers 304 when If-None-Match still matches the user's `resource`
+    version (see services/etags); the handler, and every query in it, is skipped."""
+    from app.services import etags
+
+    def check(request: Request, response: Response, current_user=Depends(user_dependency), db: Session = Depends(get_db)):
+        tag = etags.etag(resource, current_user.id, etags.version(db, current_user.id, resource), request)
+        etags.respond(resource, tag, request, response)
+    return check
+
+
+def etag_guard_async(resource: str):
+    """`etag_guard` for the async read handlers."""
+    from app.services import etags
+
+    async def check(request: Request, response: Response, current_user=Depends(get_current_user_async), db=Depends(get_async_db)):
+        v = await etags.version_async(db, current_user.id, resource)
+        etags.respond(resource, etags.etag(resource, current_user.id, v, request), request, response)
+    return check
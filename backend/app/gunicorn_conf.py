@@ -22,6 +22,9 @@ Notes:
 - We trust X-Forwarded-* headers from the upstream proxy (Caddy) and mark requests
   as secure when X-Forwarded-Proto is https.
 - Access logs are JSON-like for easier ingestion by log processors.
+- Every worker owns its own SQLAlchemy pool (DB_POOL_SIZE + DB_MAX_OVERFLOW connections),
+  so the database must allow workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. The
+  budget is logged at startup; per-worker pool usage is served by GET /admin/metrics.
 """
 
 import os
@@ -90,3 +93,16 @@ proc_name = "soul-api"
 
 # Optional: tweak backlog (pending connections) if needed
 backlog = _getenv_int("GUNICORN_BACKLOG", 2048)
+
+
+def when_ready(server):
+    # Log the worst-case DB connection count for this worker configuration
+    pool_size = _getenv_int("DB_POOL_SIZE", 5)
+    max_overflow = _getenv_int("DB_MAX_OVERFLOW", 10)
+    server.log.info(
+        "DB connection budget: %s workers x (%s pool + %s overflow) = %s connections",
+        workers,
+        pool_size,
+        max_overflow,
+        workers * (pool_size + max_overflow),
+    )
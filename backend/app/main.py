@@ -1,12 +1,15 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import PlainTextResponse
-from sqlalchemy import create_engine
+from starlette.concurrency import run_in_threadpool
+import time
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from app.config import settings
 from app.services.i18n import parse_accept_language
-from app.services import security
+from app.services.kdf_pool import KdfPoolBusy, kdf_busy_handler
 
 # SlowAPI (rate limiting)
 from slowapi import Limiter
@@ -37,12 +40,50 @@ from app.controllers import timers as timers_controller
 from app.controllers import admin as admin_controller
 from app.controllers import analytics as analytics_controller
 from app.controllers import privacy as privacy_controller
+from app.controllers import sync as sync_controller
 
 # SQLAlchemy setup
 DATABASE_URL = settings.DATABASE_URL
-engine = create_engine(DATABASE_URL)
+
+
+def _engine_options(url: str) -> dict:
+    """Pool options for create_engine, driven by the DB_POOL_* settings."""
+    opts = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if url.startswith("sqlite"):
+        # The request-scoped session (see app.dependencies.get_db) is used by both the auth
+        # dependency and the handler, which FastAPI may run on different threadpool threads.
+        opts["connect_args"] = {"check_same_thread": False}
+        return opts
+    opts.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return opts
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# Pool instrumentation: how long each pooled connection is held between checkout and checkin.
+@event.listens_for(engine, "checkout")
+def _on_pool_checkout(dbapi_conn, conn_record, conn_proxy):
+    from app.services import metrics
+
+    conn_record.info["checked_out_at"] = time.perf_counter()
+    metrics.incr("db.pool.checkouts")
+
+
+@event.listens_for(engine, "checkin")
+def _on_pool_checkin(dbapi_conn, conn_record):
+    from app.services import metrics
+
+    started = conn_record.info.pop("checked_out_at", None)
+    if started is not None:
+        metrics.observe("db.pool.connection_hold", time.perf_counter() - started)
+
 # Base metadata import
 from app.models import Base  # noqa: E402
 
@@ -54,6 +95,9 @@ app = FastAPI(title="mh-ai-app Backend")
 
 init_rate_limiter(app)
 
+# Password hashing pool saturation -> fast 503
+app.add_exception_handler(KdfPoolBusy, kdf_busy_handler)
+
 
 # Rate limit handler is configured in app.limits
 
@@ -62,37 +106,38 @@ init_rate_limiter(app)
 async def accept_language_middleware(request: Request, call_next):
     """
     Resolve Accept-Language header and attach a normalized locale to request.state.locale.
-    Middlewares should be lightweight; deeper resolution (profile override) is handled by the
-    `get_locale` dependency which may query the DB.
+    Middlewares should be lightweight: the header parse and locale list are memoized and the
+    profile language comes from the per-user locale cache, so the steady state does no I/O.
+    Only a cache miss reads Profile.language, off the event loop.
     """
+    from app.dependencies import decode_request_token
+    from app.services import metrics
+    from app.services.i18n import available_locales, cached_user_locale, load_user_locale
+    from app.utils.cache import MISSING
+
     al = request.headers.get("accept-language")
     # Prefer explicit header parsing with q-values
     try:
-        from app.services.i18n import available_locales
-
         candidate = parse_accept_language(al, available=available_locales())
     except Exception:
         candidate = "en"
 
-    # If there's an Authorization bearer token, try to get profile language and cache it on request
+    # If there's an Authorization bearer token, use the user's profile language
     auth_header = request.headers.get("authorization")
     profile_lang = None
     if auth_header and auth_header.lower().startswith("bearer "):
         token = auth_header.split(" ", 1)[1].strip()
         try:
-            payload = security.decode_access_token(token)
+            # memoized on request.state for the auth dependencies
+            payload = decode_request_token(request, token)
             if payload and "sub" in payload:
-                from app.main import SessionLocal  # local import to avoid circular deps
-                from app.models.profile import Profile
-
-                db = SessionLocal()
-                try:
-                    uid = int(payload["sub"])
-                    p = db.query(Profile).filter(Profile.user_id == uid).first()
-                    if p and getattr(p, "language", None):
-                        profile_lang = p.language
-                finally:
-                    db.close()
+                uid = int(payload["sub"])
+                profile_lang = cached_user_locale(uid)
+                if profile_lang is MISSING:
+                    metrics.incr("locale_cache.miss")
+                    profile_lang = await run_in_threadpool(load_user_locale, uid)
+                else:
+                    metrics.incr("locale_cache.hit")
         except Exception:
             profile_lang = None
 
@@ -126,6 +171,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # pagination cursors for the list endpoints (app.utils.pagination)
+    expose_headers=["X-Next-Cursor", "Link"],
 )
 
 
@@ -152,7 +199,27 @@ def on_startup():
         pass
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    # write out buffered analytics events (and the Segment batches they feed) before exiting
+    from app.services import analytics, segment
+
+    await run_in_threadpool(analytics.shutdown)
+    await run_in_threadpool(segment.shutdown)
+
+    if getattr(settings, "DB_ASYNC_ENABLED", False):
+        from app.async_db import dispose
+
+        await dispose()
+
+
 # Routers
+if getattr(settings, "DB_ASYNC_ENABLED", False):
+    # registered first so its async handlers take over the matching sync routes
+    from app.controllers import async_reads
+
+    app.include_router(async_reads.router, prefix="/api", tags=["async-reads"])
+
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(moods.router, prefix="/api", tags=["moods"])
 app.include_router(profile.router, prefix="/api", tags=["profile"])
@@ -173,6 +240,7 @@ app.include_router(
 app.include_router(admin_controller.router, prefix="/admin", tags=["admin"])
 app.include_router(privacy_controller.router, prefix="/api", tags=["privacy"])
 app.include_router(timers_controller.router, prefix="/api", tags=["timers"])
+app.include_router(sync_controller.router, prefix="/api", tags=["sync"])
 
 
 @app.get("/healthz")
@@ -16,6 +16,14 @@ from app.models import community  # noqa: F401
 from app.models import crisis  # noqa: F401
 from app.models import translation  # noqa: F401
 from app.models import analytics  # noqa: F401
+from app.models import timer  # noqa: F401
+from app.models import stopwatch  # noqa: F401
+from app.models import user_stats  # noqa: F401
+from app.models import sleep_entry  # noqa: F401
+from app.models import daily_rollup  # noqa: F401
+from app.models import sync  # noqa: F401
+from app.models import resource_version  # noqa: F401
+from app.models import data_key  # noqa: F401
 
 # expose for main.py
 __all_models__ = [
@@ -32,4 +40,12 @@ __all_models__ = [
     crisis,
     translation,
     analytics,
+    timer,
+    stopwatch,
+    user_stats,
+    sleep_entry,
+    daily_rollup,
+    sync,
+    resource_version,
+    data_key,
 ]
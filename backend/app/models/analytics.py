@@ -8,4 +8,21 @@ class AnalyticsEvent(Base):
     event_type = Column(String, index=True, nullable=False)
     user_id = Column(Integer, nullable=True, index=True)
     props = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+
+
+class AnalyticsHourlyRollup(Base):
+    """Event counts per (hour, event_type) for completed UTC hours (see services/analytics_rollup)."""
+    __tablename__ = 'analytics_hourly_rollups'
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    event_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AnalyticsRollupState(Base):
+    """Compactor watermark: every hour before `watermark` has been rolled up, counting events up
+    to id `max_event_id` (later ids are added to their hours by the next run)."""
+    __tablename__ = 'analytics_rollup_state'
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime(timezone=True), nullable=False)
+    max_event_id = Column(Integer, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from datetime import datetime, timezone
 from app.models import Base
 
@@ -8,6 +8,10 @@ class Conversation(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        Index("ix_conversations_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
 class Message(Base):
     __tablename__ = 'messages'
     id = Column(Integer, primary_key=True, index=True)
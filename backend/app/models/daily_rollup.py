@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Date, ForeignKey
+from app.models import Base
+
+
+class UserDailyRollup(Base):
+    """Per-user totals for one local calendar day (see services/daily_rollup)."""
+    __tablename__ = 'user_daily_rollups'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    mood_sum = Column(Integer, nullable=False, default=0)
+    mood_count = Column(Integer, nullable=False, default=0)
+    progress_sum = Column(Integer, nullable=False, default=0)
+    progress_count = Column(Integer, nullable=False, default=0)
+
+
+class UserRollupState(Base):
+    # the timezone a user's rollups were bucketed in; no row means they have not been built yet
+    __tablename__ = 'user_rollup_state'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    timezone = Column(String, nullable=False)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy import ForeignKey
+from datetime import datetime, timezone
+from app.models import Base
+
+
+class UserDataKey(Base):
+    """A user's data-encryption key, stored wrapped by KMS (see services/data_keys).
+
+    Journal rows encrypted with it reference it by id; a user gets a new key (epoch) only when
+    DATA_KEY_ROTATION_DAYS is set and the current one is older than that.
+    """
+    __tablename__ = 'user_data_keys'
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    epoch = Column(Integer, nullable=False, default=1)
+    # KMS key that wrapped_key is currently wrapped under (changes when the table is re-wrapped)
+    kms_key_id = Column(String, nullable=True)
+    # base64 of the KMS CiphertextBlob
+    wrapped_key = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ux_user_data_keys_user_id_epoch", "user_id", "epoch", unique=True),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.models import Base
@@ -12,6 +12,10 @@ class Achievement(Base):
     points = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        Index("ix_achievements_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     # relationship to User (backref so User.achievements is available without editing user.py)
     user = relationship("User", backref="achievements", lazy="joined")
 
@@ -48,6 +52,10 @@ class ClaimedReward(Base):
     refunded_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        Index("ix_claimed_rewards_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     user = relationship("User", backref="claimed_rewards", lazy="joined")
     reward = relationship("Reward", lazy="joined")
 
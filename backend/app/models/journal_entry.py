@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Index
 from datetime import datetime, timezone, date
 from app.models import Base
 
@@ -11,8 +11,17 @@ class JournalEntry(Base):
     content = Column(Text, nullable=False)
     # encryption_key stores the KMS-encrypted data key (base64) when envelope encryption used
     encryption_key = Column(Text, nullable=True)
+    # or, for rows encrypted with the user's data key, that key's id (user_data_keys)
+    key_id = Column(Integer, ForeignKey('user_data_keys.id'), nullable=True)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     # optional logical date for diary entries (YYYY-MM-DD)
     entry_date = Column(Date, nullable=True, default=lambda: date.today())
     # optional daily progress metric (e.g., 0-100) stored as integer
     progress = Column(Integer, nullable=True)
+    # idempotency key supplied by offline clients replaying queued entries (batch endpoints)
+    client_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_journal_entries_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ux_journal_entries_user_id_client_id", "user_id", "client_id", unique=True),
+    )
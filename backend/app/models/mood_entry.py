@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from datetime import datetime, timezone
 from app.models import Base
 
@@ -9,3 +9,10 @@ class MoodEntry(Base):
 	score = Column(Integer, nullable=False)
 	note = Column(String, nullable=True)
 	created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+	# idempotency key supplied by offline clients replaying queued entries (batch endpoints)
+	client_id = Column(String, nullable=True)
+
+	__table_args__ = (
+		Index("ix_mood_entries_user_id_created_at_id", "user_id", "created_at", "id"),
+		Index("ux_mood_entries_user_id_client_id", "user_id", "client_id", unique=True),
+	)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from sqlalchemy import ForeignKey
+from app.models import Base
+
+
+class ResourceVersion(Base):
+    """Per-user, per-resource version counter behind the ETags of the polled read endpoints
+    (see services/etags). Bumped in the same transaction as every write to the resource."""
+    __tablename__ = 'resource_versions'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    resource = Column(String, primary_key=True)  # 'profile', 'points', 'streaks', 'engagement' or 'moods'
+    version = Column(Integer, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index
 from datetime import datetime, timezone
 from app.models import Base
 
@@ -11,3 +11,11 @@ class SleepEntry(Base):
     sleep_end = Column(DateTime(timezone=True), nullable=True)
     quality = Column(String, nullable=True)  # e.g., 'good', 'poor', or numeric string
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # derived on write (services/sleep_metrics) so the metrics aggregate is plain SQL:
+    # length of the sleep, and local bedtime as minutes after noon (so 23:00 and 01:00 are 2h apart)
+    duration_seconds = Column(Integer, nullable=True)
+    bedtime_minutes = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_sleep_entries_user_id_sleep_end", "user_id", "sleep_end"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index
 from datetime import datetime, timezone
 from app.models import Base
 
@@ -9,4 +9,8 @@ class Stopwatch(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     label = Column(String, nullable=True)
     started_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_stopwatches_user_id_started_at_id", "user_id", "started_at", "id"),
+    )
     stopped_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy import ForeignKey
+from datetime import datetime, timezone
+from app.models import Base
+
+
+class SyncState(Base):
+    """Per-user change sequence for the /sync/changes feed (see services/sync_changes)."""
+    __tablename__ = 'sync_state'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+    # tombstones at or below this sequence have been pruned; older tokens must resync in full
+    pruned_seq = Column(Integer, nullable=False, default=0)
+
+
+class SyncChange(Base):
+    # latest change per entry: a later change to the same row replaces the earlier one
+    __tablename__ = 'sync_changes'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    entity = Column(String, primary_key=True)  # 'mood', 'journal' or 'symptom'
+    entity_id = Column(Integer, primary_key=True)
+    seq = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # 'upsert' or 'delete'
+    changed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_sync_changes_user_id_seq", "user_id", "seq"),
+    )
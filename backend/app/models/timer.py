@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index
 from datetime import datetime, timezone, timedelta
 from app.models import Base
 
@@ -11,5 +11,9 @@ class Timer(Base):
     # target fire time
     target_at = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_timers_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     # optional resolved timestamp
     fired_at = Column(DateTime(timezone=True), nullable=True)
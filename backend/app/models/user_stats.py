@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime, timezone
+from app.models import Base
+
+
+class UserStats(Base):
+    """Running per-user mood totals (see services/user_stats). A row also marks that the user's
+    symptom counts have been initialized."""
+    __tablename__ = 'user_stats'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    mood_count = Column(Integer, nullable=False, default=0)
+    mood_sum = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+
+class UserSymptomCount(Base):
+    __tablename__ = 'user_symptom_counts'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    symptom = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Any
+
+class BatchRequest(BaseModel):
+    # items are validated one by one (schemas.*BatchItem) so a bad item fails alone
+    items: list[dict[str, Any]]
+
+class BatchItemResult(BaseModel):
+    index: int
+    client_id: str | None = None
+    status: str  # 'created', 'duplicate' or 'error'
+    id: int | None = None
+    error: str | None = None
+
+class BatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    errors: int
+    results: list[BatchItemResult]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class JournalCreate(BaseModel):
@@ -17,3 +17,7 @@ class JournalRead(BaseModel):
     progress: int | None
 
     model_config = {"from_attributes": True}
+
+class JournalBatchItem(JournalCreate):
+    client_id: str = Field(min_length=1, max_length=128)
+    created_at: datetime | None = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class MoodCreate(BaseModel):
@@ -13,3 +13,7 @@ class MoodRead(BaseModel):
 	created_at: datetime
 
 	model_config = {"from_attributes": True}
+
+class MoodBatchItem(MoodCreate):
+	client_id: str = Field(min_length=1, max_length=128)
+	created_at: datetime | None = None
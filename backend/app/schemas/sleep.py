@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class SleepCreate(BaseModel):
+    sleep_start: datetime
+    sleep_end: datetime
+    quality: str | None = None
+
+class SleepRead(BaseModel):
+    id: int
+    user_id: int
+    sleep_start: datetime
+    sleep_end: datetime | None
+    quality: str | None
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
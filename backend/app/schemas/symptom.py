@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class SymptomCreate(BaseModel):
@@ -16,6 +16,10 @@ class SymptomRead(BaseModel):
 
     model_config = {"from_attributes": True}
 
+class SymptomBatchItem(SymptomCreate):
+    client_id: str = Field(min_length=1, max_length=128)
+    created_at: datetime | None = None
+
 
 class AnalyticsSummary(BaseModel):
     average_mood: float | None
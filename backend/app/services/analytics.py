@@ -1,66 +1,193 @@
+import atexit
 import json
+import queue
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
 import logging
 
+from app.config import settings
+from app.services import analytics_live, metrics
+
 log = logging.getLogger('analytics')
 
-# file-based fallback for quick inspection
+# Legacy single-file log. Events now go to the segmented log in app.services.analytics_log;
+# a leftover file here is adopted into it as a sealed segment (see analytics_log.get_log()).
 _analytics_file = Path(__file__).parent.parent / 'tmp' / 'analytics.jsonl'
 _analytics_file.parent.mkdir(parents=True, exist_ok=True)
 
-
-def _write_file(event: dict):
-    try:
-        with _analytics_file.open('a', encoding='utf-8') as fh:
-            fh.write(json.dumps(event, default=str) + '\n')
-    except Exception as e:
-        log.exception('Failed writing analytics file: %s', e)
+# Buffered pipeline: record_event enqueues; a flusher thread drains the queue every
+# ANALYTICS_FLUSH_INTERVAL_SECONDS (or as soon as ANALYTICS_BATCH_SIZE events are waiting),
+# validates and scrubs the batch in one pass and writes it with one log append, one multi-row
+# INSERT and the Segment hand-off.
+_queue: 'queue.Queue[tuple[dict, datetime]]' = queue.Queue(maxsize=getattr(settings, 'ANALYTICS_QUEUE_MAX', 10000))
+_flush_lock = threading.Lock()
+_start_lock = threading.Lock()
+_stop = threading.Event()
+_flusher_thread = None
 
 
 def record_event(event_type: str, user_id: int | None = None, props: dict | None = None):
     """Record an analytics event to DB and append to a local file (for quick dashboards).
     This function is intentionally resilient: failures will not raise to callers.
+
+    Events are buffered and written in batches by a background flusher, so callers pay only for
+    an enqueue and a bump of the in-memory live counters (analytics_live); schema validation and
+    PII scrubbing happen per batch in the flusher (analytics_schema.validate_batch), where invalid
+    events are dropped and counted under `analytics.invalid`. When the queue is full the event is dropped (after waiting up to
+    ANALYTICS_ENQUEUE_TIMEOUT_MS) and counted under `analytics.dropped`; None is returned.
     """
     now = datetime.now(timezone.utc)
-    # validate and scrub props
+    analytics_live.record(event_type)
+    ev = {'event_type': event_type, 'user_id': user_id, 'props': props or {}, 'created_at': now.isoformat()}
+    if not getattr(settings, 'ANALYTICS_BUFFERED', True):
+        return ev if _write_batch([(ev, now)]) else None
+
+    _ensure_flusher()
     try:
-        from app.services.analytics_schema import validate_and_scrub
-        ok, cleaned, err = validate_and_scrub(event_type, props or {})
-        if not ok:
-            log.error('Analytics event validation failed: %s', err)
-            # do not record invalid events
+        _queue.put_nowait((ev, now))
+    except queue.Full:
+        timeout_ms = getattr(settings, 'ANALYTICS_ENQUEUE_TIMEOUT_MS', 0)
+        try:
+            if timeout_ms <= 0:
+                raise queue.Full
+            metrics.incr('analytics.backpressure')
+            _queue.put((ev, now), timeout=timeout_ms / 1000.0)
+        except queue.Full:
+            metrics.incr('analytics.dropped')
             return None
-        props = cleaned
+    metrics.incr('analytics.enqueued')
+    return ev
+
+
+def flush():
+    """Synchronously write everything currently buffered (shutdown, exports, tests)."""
+    batch_size = getattr(settings, 'ANALYTICS_BATCH_SIZE', 200)
+    while True:
+        batch = []
+        try:
+            while len(batch) < batch_size:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not batch:
+            return
+        _write_batch(batch)
+
+
+def shutdown():
+    """Stop the flusher, write what is left and close the log handle."""
+    global _flusher_thread
+    _stop.set()
+    t = _flusher_thread
+    if t is not None and t is not threading.current_thread():
+        t.join(timeout=5)
+    _flusher_thread = None
+    flush()
+    with _flush_lock:
+        from app.services.analytics_log import get_log
+        get_log().close()
+    _stop.clear()
+
+
+def _ensure_flusher():
+    global _flusher_thread
+    if _flusher_thread is not None:
+        return
+    with _start_lock:
+        if _flusher_thread is None:
+            _flusher_thread = threading.Thread(target=_flusher_loop, name='analytics-flusher', daemon=True)
+            _flusher_thread.start()
+
+
+def _flusher_loop():
+    interval = getattr(settings, 'ANALYTICS_FLUSH_INTERVAL_SECONDS', 1.0)
+    batch_size = getattr(settings, 'ANALYTICS_BATCH_SIZE', 200)
+    while not _stop.is_set():
+        batch = []
+        deadline = time.monotonic() + interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        if batch:
+            try:
+                _write_batch(batch)
+            except Exception:
+                log.exception('Analytics flush failed')
+
+
+def _validate(batch):
+    """Scrub props in place and drop events that fail their schema."""
+    try:
+        from app.services.analytics_schema import validate_batch
+        results = validate_batch([(ev['event_type'], ev['props']) for ev, _ in batch])
     except Exception:
         # if schema validation fails unexpectedly, continue with original props but log
         log.exception('Analytics schema validation error; proceeding with raw props')
+        return batch
+    valid = []
+    for item, (ok, cleaned, err) in zip(batch, results):
+        if not ok:
+            # do not record invalid events
+            log.error('Analytics event validation failed: %s', err)
+            continue
+        item[0]['props'] = cleaned
+        valid.append(item)
+    if len(valid) != len(batch):
+        metrics.incr('analytics.invalid', len(batch) - len(valid))
+    return valid
 
-    ev = {'event_type': event_type, 'user_id': user_id, 'props': props or {}, 'created_at': now.isoformat()}
-    # append to file (best-effort)
-    try:
-        _write_file(ev)
-    except Exception:
-        pass
-    # store to DB (lazy imports to avoid circular import at module import time)
-    try:
-        from app.main import SessionLocal
-        from app.models.analytics import AnalyticsEvent
-        db = SessionLocal()
+
+def _write_batch(batch):
+    """Validate and write one batch; returns the number of events kept."""
+    metrics.gauge('analytics.queue_depth', _queue.qsize())
+    batch = _validate(batch)
+    if not batch:
+        return 0
+    with _flush_lock, metrics.timed('analytics.flush'):
+        # append to the segmented file log (best-effort)
+        try:
+            from app.services.analytics_log import get_log
+            get_log().append(
+                [json.dumps(ev, default=str) + '\n' for ev, _ in batch],
+                first_ts=min(ev['created_at'] for ev, _ in batch),
+                last_ts=max(ev['created_at'] for ev, _ in batch),
+            )
+        except Exception as e:
+            log.exception('Failed writing analytics log: %s', e)
+        # store to DB with a single multi-row INSERT (lazy imports to avoid circular import)
         try:
-            a = AnalyticsEvent(event_type=event_type, user_id=user_id, props=props or {})
-            db.add(a)
-            db.commit()
-        finally:
-            db.close()
-    except Exception as e:
-        log.exception('Failed to save analytics event to DB: %s', e)
+            from app.main import SessionLocal
+            from app.models.analytics import AnalyticsEvent
+            rows = [
+                {'event_type': ev['event_type'], 'user_id': ev['user_id'], 'props': ev['props'], 'created_at': ts}
+                for ev, ts in batch
+            ]
+            db = SessionLocal()
+            try:
+                db.execute(AnalyticsEvent.__table__.insert().values(rows))
+                db.commit()
+            finally:
+                db.close()
+            metrics.incr('analytics.flushed', len(batch))
+        except Exception as e:
+            metrics.incr('analytics.db_errors', len(batch))
+            log.exception('Failed to save analytics events to DB: %s', e)
 
     # also enqueue to Segment in background (best-effort)
     try:
         from app.services.segment import enqueue_track
-        enqueue_track(event_type, user_id=user_id, properties=props or {})
+        for ev, _ in batch:
+            enqueue_track(ev['event_type'], user_id=ev['user_id'], properties=ev['props'])
     except Exception:
         log.exception('Failed to enqueue segment event')
+    return len(batch)
 
-    return ev
+
+atexit.register(shutdown)
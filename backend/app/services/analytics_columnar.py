@@ -0,0 +1,203 @@
+"""Columnar encoding of analytics events for the export path.
+
+Events are pivoted into typed columns instead of CSV rows:
+
+- `event_type`: dictionary-encoded (int32 codes into a small table of names)
+- `user_id`: int64 (missing users are null in Parquet, -1 plus a validity mask in .npz)
+- `created_at`: int64 microseconds since the Unix epoch, UTC
+- `props.<key>`: one column per prop named in analytics_schema.EVENT_SCHEMAS, typed from the
+  values seen (bool, int64, float64, else string), null where an event does not carry it
+- `props_extra`: JSON of any remaining props (unknown event types), null when there are none
+
+Parquet (via pyarrow) is written when pyarrow is installed; otherwise a NumPy `.npz` archive with
+the same columns. Both are optional dependencies and imported lazily.
+"""
+import importlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.services.analytics_log import _parse_ts
+from app.services.analytics_schema import EVENT_SCHEMAS
+
+log = logging.getLogger('analytics_columnar')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _optional(name: str):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def available_format() -> Optional[str]:
+    """'parquet' if pyarrow is importable, else 'npz' if numpy is, else None."""
+    if _optional('pyarrow') is not None:
+        return 'parquet'
+    if _optional('numpy') is not None:
+        return 'npz'
+    return None
+
+
+def known_props() -> List[str]:
+    keys = []
+    for schema in EVENT_SCHEMAS.values():
+        for k in schema['allowed']:
+            if k not in keys:
+                keys.append(k)
+    return keys
+
+
+def _column_type(values: list) -> str:
+    kinds = set()
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            kinds.add('bool')
+        elif isinstance(v, int):
+            kinds.add('int')
+        elif isinstance(v, float):
+            kinds.add('float')
+        else:
+            return 'str'
+    if kinds == {'bool'}:
+        return 'bool'
+    if kinds == {'int'}:
+        return 'int'
+    if kinds and kinds <= {'int', 'float'}:
+        return 'float'
+    return 'str' if kinds else 'int'
+
+
+def build_columns(lines: Iterable[str]) -> dict:
+    """Pivot raw JSONL event lines into plain Python columns plus per-column types."""
+    keys = known_props()
+    known = set(keys)
+    codes: Dict[str, int] = {}
+    event_type, user_id, created_at, extra = [], [], [], []
+    props = {k: [] for k in keys}
+    for line in lines:
+        try:
+            obj = json.loads(line)
+        except Exception:
+            continue
+        name = obj.get('event_type') or ''
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(codes)
+        event_type.append(code)
+        uid = obj.get('user_id')
+        user_id.append(int(uid) if uid is not None else None)
+        ts = _parse_ts(obj.get('created_at'))
+        created_at.append((ts - _EPOCH) // _MICROSECOND if ts is not None else 0)
+        p = obj.get('props') or {}
+        for k in keys:
+            props[k].append(p.get(k))
+        rest = {k: v for k, v in p.items() if k not in known}
+        extra.append(json.dumps(rest) if rest else None)
+    return {
+        'rows': len(event_type),
+        'event_type_codes': event_type,
+        'event_type_names': list(codes),
+        'user_id': user_id,
+        'created_at': created_at,
+        'props': props,
+        'prop_types': {k: _column_type(v) for k, v in props.items()},
+        'props_extra': extra,
+    }
+
+
+def _coerce(values: list, kind: str) -> list:
+    if kind == 'str':
+        return [None if v is None else (v if isinstance(v, str) else json.dumps(v)) for v in values]
+    if kind == 'float':
+        return [None if v is None else float(v) for v in values]
+    return values
+
+
+def write_parquet(cols: dict, target: Path):
+    pa = importlib.import_module('pyarrow')
+    pq = importlib.import_module('pyarrow.parquet')
+    arrow_types = {'bool': pa.bool_(), 'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+    arrays = {
+        'event_type': pa.DictionaryArray.from_arrays(
+            pa.array(cols['event_type_codes'], type=pa.int32()),
+            pa.array(cols['event_type_names'], type=pa.string()),
+        ),
+        'user_id': pa.array(cols['user_id'], type=pa.int64()),
+        'created_at': pa.array(cols['created_at'], type=pa.int64()).cast(pa.timestamp('us', tz='UTC')),
+    }
+    for k, values in cols['props'].items():
+        kind = cols['prop_types'][k]
+        arrays[f'props.{k}'] = pa.array(_coerce(values, kind), type=arrow_types[kind])
+    arrays['props_extra'] = pa.array(cols['props_extra'], type=pa.string())
+    pq.write_table(pa.table(arrays), str(target), compression='zstd')
+
+
+def write_npz(cols: dict, target: Path):
+    np = importlib.import_module('numpy')
+    n = cols['rows']
+    out = {
+        'event_type': np.asarray(cols['event_type_codes'], dtype=np.int32),
+        'event_type.dictionary': np.asarray(cols['event_type_names'], dtype=np.str_),
+        'user_id': np.asarray([-1 if v is None else v for v in cols['user_id']], dtype=np.int64),
+        'user_id.valid': np.asarray([v is not None for v in cols['user_id']], dtype=bool),
+        'created_at': np.asarray(cols['created_at'], dtype=np.int64),
+    }
+    fill = {'bool': False, 'int': 0, 'float': 0.0, 'str': ''}
+    dtypes = {'bool': bool, 'int': np.int64, 'float': np.float64, 'str': np.str_}
+    for k, values in cols['props'].items():
+        kind = cols['prop_types'][k]
+        values = _coerce(values, kind)
+        out[f'props.{k}'] = np.asarray([fill[kind] if v is None else v for v in values], dtype=dtypes[kind]).reshape(n)
+        out[f'props.{k}.valid'] = np.asarray([v is not None for v in values], dtype=bool)
+    out['props_extra'] = np.asarray([v or '' for v in cols['props_extra']], dtype=np.str_).reshape(n)
+    # stored without pickling so analysts can np.load(..., allow_pickle=False)
+    np.savez_compressed(str(target), **out)
+
+
+def write(lines: Iterable[str], target: Path, fmt: Optional[str] = None) -> Optional[Path]:
+    """Write events to `target` (suffix replaced with .parquet / .npz); returns the path written."""
+    fmt = fmt or available_format()
+    if fmt not in ('parquet', 'npz'):
+        log.error('No columnar backend available (install pyarrow or numpy)')
+        return None
+    target = Path(target).with_suffix('.' + fmt)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    cols = build_columns(lines)
+    if fmt == 'parquet':
+        write_parquet(cols, target)
+    else:
+        write_npz(cols, target)
+    return target
+
+
+def load(path: Path) -> dict:
+    """Read a columnar export back as {column: numpy array}, event_type decoded to names."""
+    np = importlib.import_module('numpy')
+    path = Path(path)
+    if path.suffix == '.parquet':
+        pq = importlib.import_module('pyarrow.parquet')
+        table = pq.read_table(str(path))
+        out = {}
+        for name in table.column_names:
+            col = table.column(name)
+            if name == 'created_at':
+                out[name] = col.cast('int64').to_numpy()
+            elif name == 'event_type':
+                col = col.combine_chunks()
+                names = np.asarray(col.dictionary.to_pylist(), dtype=np.str_)
+                out[name] = names[col.indices.to_numpy()]
+            else:
+                out[name] = col.to_numpy(zero_copy_only=False)
+        return out
+    with np.load(str(path), allow_pickle=False) as data:
+        out = {k: data[k] for k in data.files}
+    out['event_type'] = out.pop('event_type.dictionary')[out['event_type']]
+    return out
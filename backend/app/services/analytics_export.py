@@ -1,8 +1,11 @@
 import csv
+import gzip
 import json
+import os
 from pathlib import Path
-from datetime import datetime
-from app.services.analytics import _analytics_file
+from datetime import datetime, timezone
+from app.services.analytics import _analytics_file, flush as flush_analytics
+from app.services.analytics_log import get_log
 import logging
 from app.config import settings
 from typing import Optional
@@ -10,20 +13,26 @@ from typing import Optional
 log = logging.getLogger('analytics_export')
 
 
-def export_to_csv(target_path: str):
-    """Read JSONL analytics file and export aggregated CSV rows (event_type, user_id, created_at, props).
-    This is a simple export; in production you'd batch and stream to a remote sink.
+def export_to_csv(target_path: str, start=None, end=None):
+    """Export analytics events as CSV rows (event_type, user_id, created_at, props).
+
+    `start` / `end` (datetimes or ISO strings) restrict the export to that window; only the log
+    segments whose time range overlaps it are opened.
     """
-    src = _analytics_file
-    if not src.exists():
-        log.warning('No analytics file to export: %s', src)
+    # include events still sitting in the in-process buffer
+    flush_analytics()
+    alog = get_log()
+    # a legacy single-file log written outside the pipeline is folded in as a segment
+    alog.adopt(_analytics_file)
+    if not alog.total_lines:
+        log.warning('No analytics events to export in %s', alog.dir)
         return None
     target = Path(target_path)
     target.parent.mkdir(parents=True, exist_ok=True)
-    with src.open('r', encoding='utf-8') as fh, target.open('w', newline='', encoding='utf-8') as out:
+    with target.open('w', newline='', encoding='utf-8') as out:
         writer = csv.writer(out)
         writer.writerow(['event_type', 'user_id', 'created_at', 'props'])
-        for line in fh:
+        for line in alog.read_lines(start, end):
             try:
                 obj = json.loads(line)
                 writer.writerow([obj.get('event_type'), obj.get('user_id'), obj.get('created_at'), json.dumps(obj.get('props'))])
@@ -32,6 +41,92 @@ def export_to_csv(target_path: str):
     return str(target)
 
 
+def export_columnar(target_path: str, start=None, end=None, fmt: Optional[str] = None):
+    """Export analytics events in a columnar format (see analytics_columnar).
+
+    Writes Parquet when pyarrow is installed, else a NumPy .npz; `fmt` forces one of them. The
+    suffix of `target_path` is replaced to match. Returns the written path, or None.
+    """
+    from app.services import analytics_columnar
+
+    flush_analytics()
+    alog = get_log()
+    alog.adopt(_analytics_file)
+    if not alog.total_lines:
+        log.warning('No analytics events to export in %s', alog.dir)
+        return None
+    out = analytics_columnar.write(alog.read_lines(start, end), Path(target_path), fmt=fmt or getattr(settings, 'ANALYTICS_EXPORT_FORMAT', None))
+    return str(out) if out else None
+
+
+def _checkpoint_path() -> Path:
+    configured = getattr(settings, 'ANALYTICS_EXPORT_CHECKPOINT', None)
+    return Path(configured) if configured else get_log().dir / 'export.checkpoint.json'
+
+
+def load_checkpoint(path: Optional[Path] = None) -> int:
+    """Global log line offset up to which events have already been exported."""
+    p = Path(path) if path else _checkpoint_path()
+    try:
+        return int(json.loads(p.read_text(encoding='utf-8'))['offset'])
+    except FileNotFoundError:
+        return 0
+    except Exception:
+        log.exception('Unreadable export checkpoint %s; starting from 0', p)
+        return 0
+
+
+def save_checkpoint(offset: int, path: Optional[Path] = None):
+    """Durably record `offset` (write, fsync, atomic rename)."""
+    p = Path(path) if path else _checkpoint_path()
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(p.name + '.tmp')
+    with tmp.open('w', encoding='utf-8') as fh:
+        json.dump({'offset': offset, 'updated_at': datetime.now(timezone.utc).isoformat()}, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, p)
+
+
+def export_incremental(target_dir: str, checkpoint_path: Optional[Path] = None) -> Optional[dict]:
+    """Export only the events appended since the last checkpoint to a gzipped CSV.
+
+    The active log segment is sealed first, so each run reads exactly the segments written since
+    the previous one and per-run work does not grow with history. The checkpoint is NOT advanced
+    here; call `save_checkpoint(result['to_offset'])` once the file has been shipped, so a failed
+    upload is retried (with the newer events) on the next run.
+
+    Returns None when there is nothing new, else a dict with path, events, from_offset, to_offset.
+    """
+    flush_analytics()
+    alog = get_log()
+    alog.adopt(_analytics_file)
+    alog.seal_active()
+    start = load_checkpoint(checkpoint_path)
+    end = alog.total_lines
+    if end <= start:
+        return None
+    ts = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    target = Path(target_dir) / f'analytics_export_{ts}_{start}-{end}.csv.gz'
+    target.parent.mkdir(parents=True, exist_ok=True)
+    events = 0
+    last = start - 1
+    with gzip.open(target, 'wt', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(['event_type', 'user_id', 'created_at', 'props'])
+        for offset, line in alog.iter_from(start):
+            if offset >= end:
+                break
+            last = offset
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+            writer.writerow([obj.get('event_type'), obj.get('user_id'), obj.get('created_at'), json.dumps(obj.get('props'))])
+            events += 1
+    return {'path': str(target), 'events': events, 'from_offset': start, 'to_offset': last + 1}
+
+
 def push_to_remote_stub(target_url: str):
     """Placeholder for pushing analytics to an external service (e.g., Segment, HTTP endpoint).
     In production, you'd support batching, retries, backoff, and authentication.
@@ -43,6 +138,8 @@ def push_to_remote_stub(target_url: str):
 def upload_to_s3(bucket: str, key: str, local_path: str) -> bool:
     """Upload a file to S3 using boto3 if available and configured.
 
+    Files above ANALYTICS_MULTIPART_THRESHOLD_MB are sent as a multipart upload in
+    ANALYTICS_MULTIPART_CHUNK_MB parts, several in parallel.
     Returns True on success, False otherwise.
     """
     try:
@@ -56,7 +153,14 @@ def upload_to_s3(bucket: str, key: str, local_path: str) -> bool:
         s3 = boto3.client('s3', aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
                           aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
                           region_name=getattr(settings, 'AWS_REGION', None))
-        s3.upload_file(local_path, bucket, key)
+        transfer = importlib.import_module('boto3.s3.transfer')
+        mb = 1024 * 1024
+        config = transfer.TransferConfig(
+            multipart_threshold=getattr(settings, 'ANALYTICS_MULTIPART_THRESHOLD_MB', 16) * mb,
+            multipart_chunksize=getattr(settings, 'ANALYTICS_MULTIPART_CHUNK_MB', 16) * mb,
+            max_concurrency=getattr(settings, 'ANALYTICS_MULTIPART_CONCURRENCY', 4),
+        )
+        s3.upload_file(local_path, bucket, key, Config=config)
         log.info('Uploaded %s to s3://%s/%s', local_path, bucket, key)
         return True
     except Exception:
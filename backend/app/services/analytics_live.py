@@ -0,0 +1,118 @@
+"""In-memory live analytics counters for the admin SSE stream.
+
+record_event bumps a per-second, per-event_type counter in a ring of LIVE_ANALYTICS_WINDOW_SECONDS
+buckets (no I/O, one short lock). A single broadcaster task per worker process snapshots the ring
+once a second, serializes it once and hands the same payload to every connected dashboard, so the
+cost of a tick does not depend on the number of viewers and viewers never touch the database.
+
+Counters are per process: with several workers each stream shows the events recorded by the
+worker serving it.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from app.config import settings
+from app.services import metrics
+
+log = logging.getLogger('analytics_live')
+
+
+class SlidingWindowCounter:
+    def __init__(self, window_seconds: int = 60):
+        self.window = max(1, int(window_seconds))
+        # slot i holds [second, {event_type: count}] for the last second with second % window == i
+        self._slots = [[-1, {}] for _ in range(self.window)]
+        self._lock = threading.Lock()
+
+    def incr(self, event_type: str, now: Optional[float] = None):
+        sec = int(time.time() if now is None else now)
+        with self._lock:
+            slot = self._slots[sec % self.window]
+            if slot[0] != sec:
+                slot[0], slot[1] = sec, {}
+            counts = slot[1]
+            counts[event_type] = counts.get(event_type, 0) + 1
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        """Counts for the last completed second and totals over the window ending there."""
+        last = int(time.time() if now is None else now) - 1
+        window: Dict[str, int] = {}
+        with self._lock:
+            slot = self._slots[last % self.window]
+            per_second = dict(slot[1]) if slot[0] == last else {}
+            for sec, counts in self._slots:
+                if last - self.window < sec <= last:
+                    for k, v in counts.items():
+                        window[k] = window.get(k, 0) + v
+        return {'ts': last, 'counts': per_second, 'window_seconds': self.window, 'window': window}
+
+
+class LiveBroadcaster:
+    """Fans one snapshot per tick out to every subscribed stream."""
+
+    def __init__(self, counter: SlidingWindowCounter, interval: float = 1.0, queue_size: int = 8):
+        self.counter = counter
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # first use, or the previous loop is gone (e.g. a restarted test client)
+            self._loop, self._task = loop, None
+            self._subscribers = set()
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(q)
+        metrics.gauge('analytics.live.subscribers', len(self._subscribers))
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._subscribers.discard(q)
+        metrics.gauge('analytics.live.subscribers', len(self._subscribers))
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                # tick just after each second boundary so a snapshot covers a whole second
+                await asyncio.sleep(self.interval - (time.time() % self.interval) + 0.01)
+                payload = json.dumps(self.counter.snapshot())
+                metrics.incr('analytics.live.ticks')
+                for q in list(self._subscribers):
+                    if q.full():
+                        # slow viewer: drop its oldest tick rather than buffering without bound
+                        q.get_nowait()
+                    q.put_nowait(payload)
+        except Exception:
+            log.exception('Live analytics broadcaster failed')
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+
+_counter = SlidingWindowCounter(getattr(settings, 'LIVE_ANALYTICS_WINDOW_SECONDS', 60))
+_broadcaster: Optional[LiveBroadcaster] = None
+
+
+def record(event_type: str):
+    _counter.incr(event_type)
+
+
+def get_broadcaster() -> LiveBroadcaster:
+    # created lazily so the tasks/queues bind to the serving event loop
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = LiveBroadcaster(_counter)
+    return _broadcaster
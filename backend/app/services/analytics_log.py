@@ -0,0 +1,341 @@
+"""Segmented, rotating JSONL log for analytics events.
+
+Events are appended to an active segment (`seg-<seq>.jsonl`). When it grows past
+ANALYTICS_SEGMENT_MAX_BYTES or gets older than ANALYTICS_SEGMENT_MAX_AGE_SECONDS it is sealed:
+gzip-compressed to `seg-<seq>.jsonl.gz` and a new active segment is started. Each segment is
+described by its global starting line offset, line count, byte size and the time range of its
+events, so readers can pick the segments that overlap a time window, or resume from a line
+offset, without scanning the whole history.
+
+Sealed segments never change, so their records are appended once, at sealing, to
+`sealed.jsonl`. `manifest.json` stays small: the counters, the active segment and how many bytes
+of `sealed.jsonl` are committed. Every append rewrites only that, however many segments exist.
+
+Several worker processes share one log: appends and rotation happen under an exclusive lock
+file (fcntl, where available) and the manifest is replaced atomically. Readers take no lock;
+they read the manifest snapshot and only the byte prefixes of `sealed.jsonl` and of the active
+segment it records.
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single process, thread lock only
+    fcntl = None
+
+log = logging.getLogger('analytics_log')
+
+_MANIFEST = 'manifest.json'
+_SEALED = 'sealed.jsonl'
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class SegmentedLog:
+    def __init__(self, directory: Path, max_bytes: int = 64 * 1024 * 1024, max_age_seconds: float = 3600):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._tlock = threading.Lock()
+        self._handle = None
+        self._handle_name = None
+
+    # -- manifest ------------------------------------------------------------------------
+
+    def _read_head(self) -> dict:
+        try:
+            return json.loads((self.dir / _MANIFEST).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return {'next_seq': 1, 'total_lines': 0, 'sealed_bytes': 0, 'active': None}
+
+    def _read_sealed(self, nbytes: int) -> List[dict]:
+        try:
+            with (self.dir / _SEALED).open('rb') as fh:
+                data = fh.read(nbytes)
+        except FileNotFoundError:
+            return []
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def manifest(self) -> dict:
+        """{'next_seq', 'total_lines', 'segments'}: every sealed segment, then the active one."""
+        head = self._read_head()
+        if 'segments' in head:  # not yet migrated by a writer (see _head)
+            return head
+        segs = self._read_sealed(head['sealed_bytes'])
+        if head['active'] is not None:
+            segs.append(head['active'])
+        return {'next_seq': head['next_seq'], 'total_lines': head['total_lines'], 'segments': segs}
+
+    def _head(self) -> dict:
+        """The manifest for a writer holding the lock, moving an old single-file one (with every
+        segment listed in it) over to sealed.jsonl first."""
+        head = self._read_head()
+        if 'segments' not in head:
+            return head
+        segs = head['segments']
+        active = segs[-1] if segs and not segs[-1]['sealed'] else None
+        data = b''.join(json.dumps(seg).encode('utf-8') + b'\n' for seg in segs if seg['sealed'])
+        with (self.dir / _SEALED).open('wb') as fh:
+            fh.write(data)
+        head = {'next_seq': head['next_seq'], 'total_lines': head['total_lines'],
+                'sealed_bytes': len(data), 'active': active}
+        self._save_manifest(head)
+        return head
+
+    def _save_manifest(self, head: dict):
+        tmp = self.dir / f'{_MANIFEST}.{os.getpid()}.tmp'
+        tmp.write_text(json.dumps(head), encoding='utf-8')
+        os.replace(tmp, self.dir / _MANIFEST)
+
+    def segments(self) -> List[dict]:
+        return self.manifest()['segments']
+
+    @property
+    def total_lines(self) -> int:
+        return self._read_head()['total_lines']
+
+    @contextmanager
+    def _locked(self):
+        with self._tlock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.dir / '.lock', 'a') as lf:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    # -- writing -------------------------------------------------------------------------
+
+    def append(self, lines: List[str], first_ts: str, last_ts: str):
+        """Append newline-terminated JSON lines whose events span [first_ts, last_ts]."""
+        if not lines:
+            return
+        data = ''.join(lines).encode('utf-8')
+        with self._locked():
+            m = self._head()
+            active = m['active']
+            if active is not None and self._needs_rotation(active):
+                self._seal(m, active)
+                active = None
+            if active is None:
+                active = self._new_segment(m)
+            fh = self._open_active(active['name'])
+            fh.write(data)
+            fh.flush()
+            active['lines'] += len(lines)
+            active['bytes'] += len(data)
+            active['first_ts'] = min(filter(None, [active['first_ts'], first_ts]))
+            active['last_ts'] = max(filter(None, [active['last_ts'], last_ts]))
+            m['total_lines'] += len(lines)
+            self._save_manifest(m)
+
+    def seal_active(self):
+        """Seal the active segment now (exports call this so they can read whole segments)."""
+        with self._locked():
+            m = self._head()
+            active = m['active']
+            if active is not None and active['lines']:
+                self._seal(m, active)
+                self._save_manifest(m)
+
+    def adopt(self, path: Path):
+        """Import a pre-existing single-file JSONL log as a sealed segment and remove it."""
+        path = Path(path)
+        if not path.exists() or path.stat().st_size == 0:
+            return
+        with self._locked():
+            m = self._head()
+            active = m['active']
+            if active is not None:
+                self._seal(m, active)
+            seg = self._new_segment(m)
+            raw = self.dir / seg['name']
+            shutil.move(str(path), str(raw))
+            lines, first, last = 0, None, None
+            with raw.open('r', encoding='utf-8') as fh:
+                for line in fh:
+                    lines += 1
+                    try:
+                        ts = json.loads(line).get('created_at')
+                    except Exception:
+                        continue
+                    if ts:
+                        first = ts if first is None or ts < first else first
+                        last = ts if last is None or ts > last else last
+            seg.update(lines=lines, bytes=raw.stat().st_size, first_ts=first, last_ts=last)
+            m['total_lines'] += lines
+            self._seal(m, seg)
+            self._save_manifest(m)
+
+    def close(self):
+        with self._tlock:
+            if self._handle is not None:
+                self._handle.close()
+            self._handle = None
+            self._handle_name = None
+
+    def _needs_rotation(self, seg: dict) -> bool:
+        if seg['bytes'] >= self.max_bytes:
+            return True
+        return self.max_age_seconds > 0 and time.time() - seg['created_at'] >= self.max_age_seconds
+
+    def _new_segment(self, m: dict) -> dict:
+        seq = m['next_seq']
+        m['next_seq'] = seq + 1
+        seg = {
+            'name': f'seg-{seq:08d}.jsonl', 'seq': seq, 'start_line': m['total_lines'],
+            'lines': 0, 'bytes': 0, 'first_ts': None, 'last_ts': None,
+            'created_at': time.time(), 'sealed': False,
+        }
+        m['active'] = seg
+        return seg
+
+    def _open_active(self, name: str):
+        # keep the append handle open between batches; another process may have rotated
+        if self._handle is None or self._handle_name != name:
+            if self._handle is not None:
+                self._handle.close()
+            self._handle = open(self.dir / name, 'ab', buffering=1 << 16)
+            self._handle_name = name
+        return self._handle
+
+    def _seal(self, m: dict, seg: dict):
+        if self._handle_name == seg['name']:
+            self._handle.close()
+            self._handle, self._handle_name = None, None
+        raw = self.dir / seg['name']
+        gz = self.dir / (seg['name'] + '.gz')
+        if raw.exists():
+            with raw.open('rb') as src, gzip.open(gz, 'wb', compresslevel=6) as dst:
+                # only the bytes the manifest accounts for; a crashed writer may have left a tail
+                remaining = seg['bytes']
+                while remaining > 0:
+                    chunk = src.read(min(1 << 20, remaining))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+            raw.unlink()
+        seg['name'] = gz.name
+        seg['compressed_bytes'] = gz.stat().st_size if gz.exists() else 0
+        seg['sealed'] = True
+        # cut back to the committed prefix first: a writer may have died after appending its
+        # record but before saving the manifest
+        record = json.dumps(seg).encode('utf-8') + b'\n'
+        with (self.dir / _SEALED).open('ab') as fh:
+            fh.truncate(m['sealed_bytes'])
+            fh.write(record)
+        m['sealed_bytes'] += len(record)
+        m['active'] = None
+
+    # -- reading -------------------------------------------------------------------------
+
+    def select(self, start=None, end=None) -> List[dict]:
+        """Segments whose time range overlaps [start, end] (either bound may be None)."""
+        start, end = _parse_ts(start), _parse_ts(end)
+        out = []
+        for seg in self.segments():
+            if not seg['lines']:
+                continue
+            first, last = _parse_ts(seg['first_ts']), _parse_ts(seg['last_ts'])
+            if start is not None and last is not None and last < start:
+                continue
+            if end is not None and first is not None and first > end:
+                continue
+            out.append(seg)
+        return out
+
+    def _open_segment(self, seg: dict):
+        path = self.dir / seg['name']
+        if seg['sealed']:
+            return gzip.open(path, 'rt', encoding='utf-8')
+        # active segment: read only the prefix the manifest vouches for
+        try:
+            with path.open('rb') as fh:
+                data = fh.read(seg['bytes'])
+        except FileNotFoundError:
+            # sealed by a writer since the manifest was read
+            return gzip.open(self.dir / (seg['name'] + '.gz'), 'rt', encoding='utf-8')
+        return io.StringIO(data.decode('utf-8'))
+
+    def read_lines(self, start=None, end=None) -> Iterator[str]:
+        """Yield raw JSONL lines for events with start <= created_at <= end."""
+        lo, hi = _parse_ts(start), _parse_ts(end)
+        for seg in self.select(lo, hi):
+            first, last = _parse_ts(seg['first_ts']), _parse_ts(seg['last_ts'])
+            whole = (lo is None or (first is not None and first >= lo)) and (hi is None or (last is not None and last <= hi))
+            with self._open_segment(seg) as fh:
+                for line in fh:
+                    if not whole:
+                        try:
+                            ts = _parse_ts(json.loads(line).get('created_at'))
+                        except Exception:
+                            continue
+                        if ts is None or (lo is not None and ts < lo) or (hi is not None and ts > hi):
+                            continue
+                    yield line
+
+    def iter_from(self, offset: int) -> Iterator[Tuple[int, str]]:
+        """Yield (global_line_offset, line) for every line at or after `offset`."""
+        for seg in self.segments():
+            if seg['start_line'] + seg['lines'] <= offset:
+                continue
+            skip = max(0, offset - seg['start_line'])
+            with self._open_segment(seg) as fh:
+                for i, line in enumerate(fh):
+                    if i >= seg['lines']:
+                        break
+                    if i >= skip:
+                        yield seg['start_line'] + i, line
+
+
+_log: Optional[SegmentedLog] = None
+_log_lock = threading.Lock()
+
+
+def get_log() -> SegmentedLog:
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                default_dir = Path(__file__).parent.parent / 'tmp' / 'analytics'
+                _log = SegmentedLog(
+                    Path(getattr(settings, 'ANALYTICS_LOG_DIR', None) or default_dir),
+                    max_bytes=getattr(settings, 'ANALYTICS_SEGMENT_MAX_BYTES', 64 * 1024 * 1024),
+                    max_age_seconds=getattr(settings, 'ANALYTICS_SEGMENT_MAX_AGE_SECONDS', 3600),
+                )
+                # pick up the pre-rotation single-file log, if one is still lying around
+                from app.services.analytics import _analytics_file
+                try:
+                    _log.adopt(_analytics_file)
+                except Exception:
+                    log.exception('Failed adopting legacy analytics file %s', _analytics_file)
+    return _log
@@ -0,0 +1,210 @@
+"""Hourly rollups of analytics_events for the admin summary.
+
+A compactor rolls completed UTC hours up into `analytics_hourly_rollups` (hour, event_type, count)
+and advances a watermark in `analytics_rollup_state`. The summary reads rollups for the hours
+before the watermark and counts raw rows only from the watermark on, i.e. the current partial
+hour (plus the previous one during the first ANALYTICS_ROLLUP_GRACE_SECONDS of an hour, while the
+buffered pipeline may still be writing it). Both sides are range queries on created_at / hour, so
+dashboard cost depends on the window length, not on the size of the events table.
+
+The compactor runs from the analytics scheduler every ANALYTICS_ROLLUP_INTERVAL_MINUTES, never on
+the request path. Rows that arrive after their hour was rolled up (Segment retries, a buffered
+flush held back longer than the grace period) are found by id: each run records the highest
+event id it counted and adds rows above the previous one that are dated before the watermark to
+their hours' rollups. A row whose insert transaction is still open while a run past its id
+commits is the one case this misses.
+
+Concurrent runs are safe: the state row only moves with a compare-and-set on (watermark, id) in
+the same transaction as the rollup rows, so a losing worker rolls back.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.analytics import AnalyticsEvent, AnalyticsHourlyRollup, AnalyticsRollupState
+from app.services import metrics
+
+log = logging.getLogger('analytics_rollup')
+
+_STATE_KEY = 'hourly'
+_HOUR = timedelta(hours=1)
+
+
+def _aware(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _hour_floor(dt: datetime) -> datetime:
+    return _aware(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def _counts(db: Session, start: datetime, end: datetime, top_id: Optional[int] = None) -> Dict[str, int]:
+    q = (
+        db.query(AnalyticsEvent.event_type, func.count(AnalyticsEvent.id))
+        .filter(AnalyticsEvent.created_at >= start, AnalyticsEvent.created_at < end)
+    )
+    if top_id is not None:
+        q = q.filter(AnalyticsEvent.id <= top_id)
+    return {event_type: int(cnt) for event_type, cnt in q.group_by(AnalyticsEvent.event_type)}
+
+
+def _next_event_hour(db: Session, start: datetime, end: datetime) -> Optional[datetime]:
+    first = (
+        db.query(func.min(AnalyticsEvent.created_at))
+        .filter(AnalyticsEvent.created_at >= start, AnalyticsEvent.created_at < end)
+        .scalar()
+    )
+    return _hour_floor(first) if first is not None else None
+
+
+def _hour_bucket(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return func.date_trunc('hour', func.timezone('UTC', AnalyticsEvent.created_at))
+    if dialect == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:00:00', AnalyticsEvent.created_at)
+    return None
+
+
+def _tail_counts(db: Session, start: datetime, end: datetime) -> List[Tuple[datetime, str, int]]:
+    """(hour, event_type, count) for raw events in [start, end)."""
+    bucket = _hour_bucket(db)
+    if bucket is None:
+        # no hour truncation for this database: one grouped query per hour
+        out, hour = [], start
+        while hour < end:
+            out.extend((hour, et, cnt) for et, cnt in _counts(db, hour, hour + _HOUR).items())
+            hour += _HOUR
+        return out
+    rows = (
+        db.query(bucket, AnalyticsEvent.event_type, func.count(AnalyticsEvent.id))
+        .filter(AnalyticsEvent.created_at >= start, AnalyticsEvent.created_at < end)
+        .group_by(bucket, AnalyticsEvent.event_type)
+    )
+    out = []
+    for hour, event_type, cnt in rows:
+        if isinstance(hour, str):
+            hour = datetime.fromisoformat(hour)
+        out.append((_aware(hour), event_type, int(cnt)))
+    return out
+
+
+def _late_counts(db: Session, after_id: int, top_id: int, before: datetime) -> Counter:
+    # rows inserted since the last run but dated before its watermark (Segment retries, buffered
+    # flushes); a short id range on the primary key, so grouped here rather than in SQL
+    rows = (
+        db.query(AnalyticsEvent.created_at, AnalyticsEvent.event_type)
+        .filter(AnalyticsEvent.id > after_id, AnalyticsEvent.id <= top_id, AnalyticsEvent.created_at < before)
+    )
+    return Counter((_hour_floor(created_at), event_type) for created_at, event_type in rows)
+
+
+def _add_late(db: Session, late: Counter):
+    table = AnalyticsHourlyRollup.__table__
+    for (hour, event_type), n in late.items():
+        where = (AnalyticsHourlyRollup.hour == hour, AnalyticsHourlyRollup.event_type == event_type)
+        if not db.execute(update(AnalyticsHourlyRollup).where(*where).values(count=AnalyticsHourlyRollup.count + n)).rowcount:
+            db.execute(table.insert().values(hour=hour, event_type=event_type, count=n))
+
+
+def watermark(db: Session) -> Optional[datetime]:
+    state = db.query(AnalyticsRollupState).get(_STATE_KEY)
+    return _aware(state.watermark) if state is not None else None
+
+
+def compact(db: Session, now: Optional[datetime] = None) -> int:
+    """Roll up completed hours past the watermark and add late rows to the hours they belong to;
+    returns the number of hours advanced."""
+    now = now or datetime.now(timezone.utc)
+    horizon = _hour_floor(now - timedelta(seconds=getattr(settings, 'ANALYTICS_ROLLUP_GRACE_SECONDS', 300)))
+    state = db.query(AnalyticsRollupState).get(_STATE_KEY)
+    if state is None:
+        first = db.query(func.min(AnalyticsEvent.created_at)).scalar()
+        db.add(AnalyticsRollupState(name=_STATE_KEY, watermark=_hour_floor(first) if first is not None else horizon))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+        state = db.query(AnalyticsRollupState).get(_STATE_KEY)
+    stored, stored_id = state.watermark, state.max_event_id
+    start = _aware(stored)
+    end = max(start, min(horizon, start + _HOUR * getattr(settings, 'ANALYTICS_ROLLUP_MAX_HOURS_PER_RUN', 168)))
+    # everything this run counts is bounded by the highest id seen now; the next run picks up
+    # rows above it by id, whichever hour they are dated
+    top_id = db.query(func.max(AnalyticsEvent.id)).scalar() or 0
+    if end == start and top_id == (stored_id or 0):
+        return 0
+
+    with metrics.timed('analytics.rollup.compact'):
+        # before the first run that records an id, late rows cannot be told apart
+        late = _late_counts(db, stored_id, top_id, start) if stored_id is not None else Counter()
+        rows = []
+        hour = start
+        while hour < end:
+            counts = _counts(db, hour, hour + _HOUR, top_id)
+            rows.extend({'hour': hour, 'event_type': et, 'count': cnt} for et, cnt in counts.items())
+            nxt = hour + _HOUR
+            if not counts:
+                # skip over quiet stretches in one indexed lookup
+                nxt = _next_event_hour(db, nxt, end) or end
+            hour = nxt
+        try:
+            matches = (AnalyticsRollupState.max_event_id.is_(None) if stored_id is None
+                       else AnalyticsRollupState.max_event_id == stored_id)
+            moved = db.execute(
+                update(AnalyticsRollupState)
+                .where(AnalyticsRollupState.name == _STATE_KEY, AnalyticsRollupState.watermark == stored, matches)
+                .values(watermark=end, max_event_id=top_id)
+            )
+            if moved.rowcount != 1:
+                # another worker compacted first
+                db.rollback()
+                return 0
+            if rows:
+                db.execute(AnalyticsHourlyRollup.__table__.insert().values(rows))
+            _add_late(db, late)
+            db.commit()
+        except IntegrityError:
+            # another worker rolled up the same hours first
+            db.rollback()
+            return 0
+    if late:
+        metrics.incr('analytics.rollup.late_events', sum(late.values()))
+    hours = int((end - start) / _HOUR)
+    metrics.incr('analytics.rollup.hours', hours)
+    return hours
+
+
+def summary(db: Session, days: int, now: Optional[datetime] = None) -> dict:
+    """Counts by event_type and by UTC day from the start of the hour `days` days ago until now."""
+    now = now or datetime.now(timezone.utc)
+    start = _hour_floor(now - timedelta(days=days))
+    wm = watermark(db)
+    split = max(start, min(wm, _hour_floor(now))) if wm is not None else start
+    by_type, daily = Counter(), Counter()
+
+    rolled = (
+        db.query(AnalyticsHourlyRollup.hour, AnalyticsHourlyRollup.event_type, AnalyticsHourlyRollup.count)
+        .filter(AnalyticsHourlyRollup.hour >= start, AnalyticsHourlyRollup.hour < split)
+    )
+    for hour, event_type, cnt in rolled:
+        by_type[event_type] += cnt
+        daily[_aware(hour).date()] += cnt
+
+    # raw rows only from the watermark on (just the current hour or two once the compactor runs,
+    # the whole window if it never has), in one statement grouped by hour
+    for hour, event_type, cnt in _tail_counts(db, split, _hour_floor(now) + _HOUR):
+        by_type[event_type] += cnt
+        daily[hour.date()] += cnt
+
+    return {
+        'by_type': dict(by_type),
+        'daily': [{'day': d.isoformat(), 'count': c} for d, c in sorted(daily.items())],
+    }
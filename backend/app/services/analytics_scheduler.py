@@ -1,8 +1,6 @@
 import logging
-from datetime import datetime
 from pathlib import Path
-from app.services.analytics_export import export_to_csv, upload_to_s3
-from app.services.analytics import _analytics_file
+from app.services.analytics_export import export_incremental, save_checkpoint, upload_to_s3
 from app.config import settings
 
 log = logging.getLogger('analytics_scheduler')
@@ -10,28 +8,42 @@ log = logging.getLogger('analytics_scheduler')
 
 def _job_export_and_upload():
     try:
-        if not _analytics_file.exists():
-            log.info('No analytics file to export; skipping job')
-            return
-        ts = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
-        local_csv = f'tmp/analytics_export_{ts}.csv'
-        exported = export_to_csv(local_csv)
-        if not exported:
-            log.warning('Export returned no file; skipping upload')
+        result = export_incremental('tmp')
+        if not result:
+            log.info('No new analytics events since last export; skipping job')
             return
+        exported = result['path']
         # upload if configured
         s3_bucket = getattr(settings, 'ANALYTICS_S3_BUCKET', None)
         if s3_bucket:
             key = f'analytics/{Path(exported).name}'
             ok = upload_to_s3(s3_bucket, key, exported)
             if not ok:
+                # keep the checkpoint where it was so the next run re-exports these events
                 log.error('Failed to upload analytics export to S3')
+                return
         else:
             log.info('ANALYTICS_S3_BUCKET not set; not uploading')
+        save_checkpoint(result['to_offset'])
+        log.info('Exported %s analytics events (offsets %s-%s)', result['events'], result['from_offset'], result['to_offset'])
     except Exception:
         log.exception('analytics export job failed')
 
 
+def _job_compact_rollups():
+    from app.main import SessionLocal
+    from app.services.analytics_rollup import compact
+    db = SessionLocal()
+    try:
+        hours = compact(db)
+        if hours:
+            log.info('Rolled up %s hours of analytics events', hours)
+    except Exception:
+        log.exception('analytics rollup job failed')
+    finally:
+        db.close()
+
+
 def start_scheduler():
     try:
         import importlib
@@ -44,5 +56,6 @@ def start_scheduler():
     sched = BackgroundScheduler()
     interval_minutes = getattr(settings, 'ANALYTICS_EXPORT_INTERVAL_MINUTES', 60)
     sched.add_job(_job_export_and_upload, 'interval', minutes=interval_minutes)
+    sched.add_job(_job_compact_rollups, 'interval', minutes=getattr(settings, 'ANALYTICS_ROLLUP_INTERVAL_MINUTES', 5))
     sched.start()
     log.info('Analytics scheduler started; interval=%s minutes', interval_minutes)
@@ -1,5 +1,5 @@
 import re
-from typing import Dict, Any, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 import logging
 
 log = logging.getLogger('analytics_schema')
@@ -15,6 +15,13 @@ EVENT_SCHEMAS = {
     'crisis.detected': {'required': ['severity'], 'allowed': ['severity', 'match']},
 }
 
+Result = Tuple[bool, Dict[str, Any], str | None]
+
+_EMAIL_RE = re.compile(r"\b[\w.-]+@[\w.-]+\.[A-Za-z]{2,6}\b")
+# seven or more digits anywhere in the value; \D and \d are disjoint so this cannot backtrack badly
+_PHONE_RE = re.compile(r"(?:\D*\d){7}")
+_MAX_TEXT = 200
+
 
 def _scrub_value(v: Any) -> Any:
     """Scrub obvious PII values: emails, phone numbers, long strings.
@@ -22,41 +29,96 @@ def _scrub_value(v: Any) -> Any:
     This is intentionally conservative: we replace with placeholders when likely PII.
     """
     if isinstance(v, str):
-        # email
-        if re.search(r"\b[\w.-]+@[\w.-]+\.[A-Za-z]{2,6}\b", v):
+        # email (cheap membership test first; the pattern needs an '@')
+        if '@' in v and _EMAIL_RE.search(v):
             return '<REDACTED_EMAIL>'
-        # phone (very loose)
-        if re.sub(r"\D", "", v) and len(re.sub(r"\D", "", v)) >= 7:
+        # phone (very loose): at least 7 digits
+        if len(v) >= 7 and _PHONE_RE.match(v):
             return '<REDACTED_PHONE>'
         # long free-form text -> truncate
-        if len(v) > 200:
-            return v[:200] + '...'
+        if len(v) > _MAX_TEXT:
+            return v[:_MAX_TEXT] + '...'
     return v
 
 
+class EventValidator:
+    """Validator for one event type, compiled from its EVENT_SCHEMAS entry."""
+
+    __slots__ = ('event_type', 'allowed', 'required', '_required_set')
+
+    def __init__(self, event_type: str, schema: Dict[str, Any]):
+        self.event_type = event_type
+        self.allowed = frozenset(schema.get('allowed', ()))
+        self.required = tuple(schema.get('required', ()))
+        self._required_set = frozenset(self.required)
+
+    def __call__(self, props: Dict[str, Any]) -> Result:
+        if props.keys() <= self.allowed:
+            cleaned = {k: _scrub_value(v) for k, v in props.items()}
+        else:
+            cleaned = {}
+            for k, v in props.items():
+                if k in self.allowed:
+                    cleaned[k] = _scrub_value(v)
+                else:
+                    # ignore disallowed keys
+                    log.warning('Dropping disallowed analytics prop %s for event %s', k, self.event_type)
+        if not self._required_set <= cleaned.keys():
+            missing = next(r for r in self.required if r not in cleaned)
+            return False, cleaned, f'missing required prop: {missing}'
+        return True, cleaned, None
+
+
+def compile_schemas(schemas: Dict[str, Dict[str, Any]]) -> Dict[str, EventValidator]:
+    return {event_type: EventValidator(event_type, schema) for event_type, schema in schemas.items()}
+
+
+_validators = compile_schemas(EVENT_SCHEMAS)
+
+
+def recompile():
+    """Rebuild the validators after EVENT_SCHEMAS has been changed at runtime."""
+    global _validators
+    _validators = compile_schemas(EVENT_SCHEMAS)
+
+
+def validator_for(event_type: str) -> Callable[[Dict[str, Any]], Result] | None:
+    return _validators.get(event_type)
+
+
+def _scrub_unknown(props: Dict[str, Any]) -> Result:
+    # unknown events are allowed but flagged (by the caller)
+    return True, {k: _scrub_value(v) for k, v in props.items()}, None
+
+
 def validate_and_scrub(event_type: str, props: Dict[str, Any]) -> Tuple[bool, Dict[str, Any], str | None]:
     """Validate props against EVENT_SCHEMAS and scrub PII.
 
     Returns (ok, cleaned_props, error_message)
     """
-    schema = EVENT_SCHEMAS.get(event_type)
-    if not schema:
-        # unknown events are allowed but flagged
+    validator = _validators.get(event_type)
+    if validator is None:
         log.warning('Unknown analytics event type: %s', event_type)
-        cleaned = {k: _scrub_value(v) for k, v in (props or {}).items()}
-        return True, cleaned, None
+        return _scrub_unknown(props or {})
+    return validator(props or {})
 
-    cleaned = {}
-    for k, v in (props or {}).items():
-        if k in schema['allowed']:
-            cleaned[k] = _scrub_value(v)
-        else:
-            # ignore disallowed keys
-            log.warning('Dropping disallowed analytics prop %s for event %s', k, event_type)
 
-    # check required
-    for req in schema.get('required', []):
-        if req not in cleaned:
-            return False, cleaned, f'missing required prop: {req}'
+def validate_batch(events: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Result]:
+    """Validate and scrub many (event_type, props) pairs in one pass.
 
-    return True, cleaned, None
+    Same results as calling validate_and_scrub per event; unknown event types are logged once per
+    batch instead of once per event.
+    """
+    get = _validators.get
+    unknown = set()
+    out = []
+    for event_type, props in events:
+        validator = get(event_type)
+        if validator is None:
+            unknown.add(event_type)
+            out.append(_scrub_unknown(props or {}))
+        else:
+            out.append(validator(props or {}))
+    for event_type in unknown:
+        log.warning('Unknown analytics event type: %s', event_type)
+    return out
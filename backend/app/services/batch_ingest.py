@@ -0,0 +1,241 @@
+"""Bulk ingestion for the offline-sync batch endpoints (/moods/batch, /journals/batch, /symptoms/batch).
+
+Mobile clients queue entries while offline and replay them later. A batch is handled as:
+
+  1. validate every item on its own (a bad item gets an 'error' result, the rest proceed)
+  2. drop items whose client_id was already stored for this user (a replay) or repeats an
+     earlier item of the same batch; both are reported as 'duplicate' with the stored id
+  3. encrypt journal contents with the user's data key (services/data_keys) on a small thread
+     pool; without KMS configured they fall back to the local key
+  4. insert the new rows with multi-row INSERT statements, update the running stats and daily
+     rollups once per batch, and commit everything in one transaction
+  5. read the new ids back through the unique (user_id, client_id) index and append them to
+     the user's changes feed (services/sync_changes)
+
+If two replays of the same batch race, the loser's commit fails on that unique index; it is
+rolled back and retried once, and the retry reports the winner's rows as duplicates.
+"""
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.journal_entry import JournalEntry
+from app.models.mood_entry import MoodEntry
+from app.models.symptom_entry import SymptomEntry
+from app.schemas.journal import JournalBatchItem
+from app.schemas.mood import MoodBatchItem
+from app.schemas.symptom import SymptomBatchItem
+from app.services import daily_rollup, etags, metrics, sync_changes, user_stats
+
+log = logging.getLogger('batch_ingest')
+
+# a client clock may run a little ahead; anything further in the future is rejected
+_CLOCK_SKEW = timedelta(minutes=5)
+# keep bound parameters per statement well under SQLite's historical limit of 999
+_MAX_PARAMS = 900
+
+_pool_lock = threading.Lock()
+_encrypt_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> Optional[ThreadPoolExecutor]:
+    global _encrypt_pool
+    workers = getattr(settings, 'BATCH_ENCRYPT_WORKERS', 4)
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _encrypt_pool is None:
+            _encrypt_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-encrypt')
+    return _encrypt_pool
+
+
+def _error(index: int, client_id, message: str) -> dict:
+    return {'index': index, 'client_id': client_id, 'status': 'error', 'id': None, 'error': message}
+
+
+def _validate(raw_items: List[Dict[str, Any]], schema, now: datetime):
+    """Split raw items into (index, item) pairs to insert, pre-filled results for the rest."""
+    results: Dict[int, dict] = {}
+    valid = []
+    for i, raw in enumerate(raw_items):
+        client_id = raw.get('client_id') if isinstance(raw, dict) else None
+        try:
+            item = schema.model_validate(raw)
+        except ValidationError as e:
+            err = e.errors()[0]
+            field = '.'.join(str(p) for p in err.get('loc', ()))
+            results[i] = _error(i, client_id, f"{field}: {err.get('msg')}" if field else err.get('msg'))
+            continue
+        if item.created_at is not None:
+            if item.created_at.tzinfo is None:
+                item.created_at = item.created_at.replace(tzinfo=timezone.utc)
+            # stored as UTC: SQLite drops the offset, and rollups must bucket what is stored
+            item.created_at = item.created_at.astimezone(timezone.utc)
+            if item.created_at > now + _CLOCK_SKEW:
+                results[i] = _error(i, item.client_id, 'created_at is in the future')
+                continue
+        valid.append((i, item))
+    return valid, results
+
+
+def _chunks(seq: list, size: int):
+    for start in range(0, len(seq), size):
+        yield seq[start:start + size]
+
+
+def _ids_by_client_id(db: Session, model, user_id: int, client_ids) -> Dict[str, int]:
+    found: Dict[str, int] = {}
+    for chunk in _chunks(list(client_ids), _MAX_PARAMS):
+        for row_id, client_id in (
+            db.query(model.id, model.client_id).filter(model.user_id == user_id, model.client_id.in_(chunk))
+        ):
+            found[client_id] = row_id
+    return found
+
+
+def _insert_rows(db: Session, model, rows: List[dict]):
+    if not rows:
+        return
+    per_row = len(rows[0])
+    for chunk in _chunks(rows, max(1, _MAX_PARAMS // per_row)):
+        db.execute(model.__table__.insert().values(chunk))
+
+
+def _ingest(db: Session, user_id: int, entity: str, model, valid, results: Dict[int, dict],
+            build_rows: Callable, after_insert: Callable) -> List[dict]:
+    """Shared steps 2, 4 and 5; returns the inserted rows."""
+    existing = _ids_by_client_id(db, model, user_id, {item.client_id for _, item in valid})
+    fresh, repeats, seen = [], [], set()
+    for i, item in valid:
+        if item.client_id in existing or item.client_id in seen:
+            repeats.append((i, item))
+        else:
+            seen.add(item.client_id)
+            fresh.append((i, item))
+
+    rows = build_rows(fresh)
+    _insert_rows(db, model, rows)
+    ids = dict(existing)
+    if rows:
+        created = _ids_by_client_id(db, model, user_id, seen)
+        ids.update(created)
+        after_insert(rows)
+        sync_changes.record(db, user_id, entity, sorted(created.values()))
+    db.commit()
+
+    for i, item in fresh:
+        results[i] = {'index': i, 'client_id': item.client_id, 'status': 'created', 'id': ids.get(item.client_id), 'error': None}
+    for i, item in repeats:
+        results[i] = {'index': i, 'client_id': item.client_id, 'status': 'duplicate', 'id': ids.get(item.client_id), 'error': None}
+    return rows
+
+
+def _run(db: Session, kind: str, entity: str, user_id: int, raw_items, model, schema, build_rows, after_insert):
+    """(response body, inserted rows)."""
+    now = datetime.now(timezone.utc)
+    valid, base = _validate(raw_items, schema, now)
+    with metrics.timed(f'batch.{kind}'):
+        for attempt in (1, 2):
+            results = dict(base)
+            try:
+                rows = _ingest(db, user_id, entity, model, valid, results, lambda fresh: build_rows(fresh, now), after_insert)
+                break
+            except IntegrityError:
+                db.rollback()
+                if attempt == 2:
+                    raise
+                log.info('Concurrent %s batch for user %s; retrying to pick up duplicates', kind, user_id)
+                metrics.incr(f'batch.{kind}.retried')
+    ordered = [results[i] for i in range(len(raw_items))]
+    summary = Counter(r['status'] for r in ordered)
+    metrics.incr(f'batch.{kind}.created', summary['created'])
+    metrics.incr(f'batch.{kind}.duplicates', summary['duplicate'])
+    metrics.incr(f'batch.{kind}.errors', summary['error'])
+    body = {
+        'created': summary['created'],
+        'duplicates': summary['duplicate'],
+        'errors': summary['error'],
+        'results': ordered,
+    }
+    return body, rows
+
+
+def ingest_moods(db: Session, user_id: int, raw_items) -> dict:
+    def build(fresh, now):
+        return [
+            {'user_id': user_id, 'score': item.score, 'note': item.note,
+             'created_at': item.created_at or now, 'client_id': item.client_id}
+            for _, item in fresh
+        ]
+
+    def after_insert(rows):
+        user_stats.moods_added(db, user_id, [r['score'] for r in rows])
+        daily_rollup.moods_added(db, user_id, [(r['created_at'], r['score']) for r in rows])
+        etags.touch(db, user_id, 'moods')
+
+    body, rows = _run(db, 'moods', 'mood', user_id, raw_items, MoodEntry, MoodBatchItem, build, after_insert)
+    if rows:
+        from app.services.analytics import record_event
+        from app.services.mood_trends import invalidate
+        invalidate(user_id)
+        for r in rows:
+            try:
+                record_event('mood.create', user_id=user_id, props={'score': r['score'], 'source': 'sync'})
+            except Exception:
+                pass
+    return body
+
+
+def _encrypt_all(contents: List[str], data_key) -> list:
+    from app.services.crypto import encrypt_for_storage
+    pool = _pool()
+    if pool is None or len(contents) < 2:
+        return [encrypt_for_storage(c, data_key) for c in contents]
+    return list(pool.map(lambda c: encrypt_for_storage(c, data_key), contents))
+
+
+def ingest_journals(db: Session, user_id: int, raw_items) -> dict:
+    def build(fresh, now):
+        from app.services.data_keys import current_key
+        # the user's data key is fetched once here; the pool threads only run the cipher
+        encrypted = _encrypt_all([item.content for _, item in fresh], current_key(db, user_id) if fresh else None)
+        tz = daily_rollup.profile_timezone(db, user_id)
+        rows = []
+        for (_, item), (ciphertext, wrapped_key, key_id) in zip(fresh, encrypted):
+            created_at = item.created_at or now
+            ed = item.entry_date
+            rows.append({
+                'user_id': user_id, 'title': item.title, 'content': ciphertext, 'encryption_key': wrapped_key, 'key_id': key_id,
+                'created_at': created_at,
+                'entry_date': ed.date() if ed is not None else daily_rollup.local_day(created_at, tz),
+                'progress': item.progress, 'client_id': item.client_id,
+            })
+        return rows
+
+    def after_insert(rows):
+        from types import SimpleNamespace
+        daily_rollup.journals_added(db, user_id, [SimpleNamespace(**r) for r in rows])
+
+    return _run(db, 'journals', 'journal', user_id, raw_items, JournalEntry, JournalBatchItem, build, after_insert)[0]
+
+
+def ingest_symptoms(db: Session, user_id: int, raw_items) -> dict:
+    def build(fresh, now):
+        return [
+            {'user_id': user_id, 'symptom': item.symptom, 'severity': item.severity, 'note': item.note,
+             'created_at': item.created_at or now, 'client_id': item.client_id}
+            for _, item in fresh
+        ]
+
+    def after_insert(rows):
+        user_stats.symptoms_added(db, user_id, Counter(r['symptom'] for r in rows))
+
+    return _run(db, 'symptoms', 'symptom', user_id, raw_items, SymptomEntry, SymptomBatchItem, build, after_insert)[0]
@@ -0,0 +1,94 @@
+"""Versioned ciphertext format for encrypted fields (journal content).
+
+A sealed value is a header byte naming the format, followed by that format's payload, stored
+as unpadded urlsafe base64 in the existing text columns:
+
+    0x01  AES-256-GCM: 12-byte random nonce | ciphertext | 16-byte tag, with the header byte
+          as associated data
+
+The AES key is derived with HKDF-SHA256 from the configured key (the Fernet DATA_ENCRYPTION_KEY
+or a user's 32-byte data key), so the same key material is never used directly by two
+algorithms. Cipher objects are cached per key (by digest) for DATA_KEY_CACHE_TTL_SECONDS.
+
+Values written before this are Fernet tokens (always starting with 'gAAAAA', version byte 0x80)
+or the JSON {'ct', 'ek'} envelope; `version` tells the formats apart by their first bytes, and
+callers fall back to the legacy readers for anything that is not sealed here. New values are
+written in this format only with CIPHERTEXT_VERSION=1; the default 0 keeps writing Fernet, so a
+rolling deploy never has older workers meet values they cannot read.
+"""
+import base64
+import hashlib
+import os
+from typing import Optional
+
+from app.config import settings
+from app.utils.cache import MISSING, TTLCache
+
+AES_GCM = 0x01
+
+_NONCE = 12
+_TAG = 16
+_HKDF_INFO = b'journal-content/aes-256-gcm/v1'
+
+_ciphers = TTLCache(
+    maxsize=getattr(settings, 'DATA_KEY_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'DATA_KEY_CACHE_TTL_SECONDS', 300),
+)
+
+
+def enabled() -> bool:
+    """Whether new values are sealed in this format (rather than as legacy Fernet tokens)."""
+    return getattr(settings, 'CIPHERTEXT_VERSION', 0) == AES_GCM
+
+
+def _aead(key: bytes):
+    digest = hashlib.sha256(key).digest()
+    aead = _ciphers.get(digest)
+    if aead is MISSING:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+        derived = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=_HKDF_INFO).derive(key)
+        aead = AESGCM(derived)
+        _ciphers.set(digest, aead)
+    return aead
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def version(value: str) -> Optional[int]:
+    """Header byte of a value sealed by `seal`, or None for anything else (legacy Fernet tokens,
+    JSON envelopes, plaintext)."""
+    # a leading 0x01 byte always encodes to 'A' (Fernet tokens start with 'g', JSON with '{')
+    if len(value) < 4 or value[0] != 'A':
+        return None
+    try:
+        raw = _b64decode(value[:4])
+    except Exception:
+        return None
+    return raw[0] if raw and raw[0] == AES_GCM else None
+
+
+def seal(key: bytes, plaintext: str) -> str:
+    nonce = os.urandom(_NONCE)
+    header = bytes([AES_GCM])
+    return _b64encode(header + nonce + _aead(key).encrypt(nonce, plaintext.encode('utf-8'), header))
+
+
+def unseal(key: bytes, value: str) -> str:
+    """Plaintext of a sealed value; raises if it was not sealed with `key` or was tampered with."""
+    raw = _b64decode(value)
+    if len(raw) < 1 + _NONCE + _TAG or raw[0] != AES_GCM:
+        raise ValueError('not an AES-GCM sealed value')
+    header, nonce, body = raw[:1], raw[1:1 + _NONCE], raw[1 + _NONCE:]
+    return _aead(key).decrypt(nonce, body, header).decode('utf-8')
+
+
+def clear():
+    _ciphers.clear()
@@ -1,19 +1,42 @@
+import base64
+import functools
 import logging
 from app.config import settings
+from app.services import ciphertext as sealed
 
 log = logging.getLogger('crypto')
 
 
+@functools.lru_cache(maxsize=8)
+def _fernet_for(key: str):
+    try:
+        from cryptography.fernet import Fernet
+        return Fernet(key.encode('utf-8'))
+    except Exception:
+        log.exception('cryptography.Fernet not available or invalid key')
+        return None
+
+
 def _get_fernet():
     key = getattr(settings, 'DATA_ENCRYPTION_KEY', None)
     if not key:
         return None
+    return _fernet_for(key)
+
+
+@functools.lru_cache(maxsize=8)
+def _raw_key(key: str):
     try:
-        from cryptography.fernet import Fernet
-        return Fernet(key.encode('utf-8'))
+        raw = base64.urlsafe_b64decode(key.encode('utf-8'))
     except Exception:
-        log.exception('cryptography.Fernet not available or invalid key')
         return None
+    return raw if len(raw) == 32 else None
+
+
+def _local_key():
+    """Raw bytes of DATA_ENCRYPTION_KEY (the AES-GCM format derives its key from them)."""
+    key = getattr(settings, 'DATA_ENCRYPTION_KEY', None)
+    return _raw_key(key) if key else None
 
 
 def encrypt_text(plaintext: str) -> str:
@@ -31,6 +54,14 @@ def encrypt_text(plaintext: str) -> str:
         except Exception:
             log.exception('Envelope encryption failed; falling back to local Fernet')
 
+    if sealed.enabled():
+        key = _local_key()
+        if key:
+            try:
+                return sealed.seal(key, plaintext)
+            except Exception:
+                log.exception('AES-GCM encryption failed; falling back to Fernet')
+
     f = _get_fernet()
     if not f:
         return plaintext
@@ -41,22 +72,70 @@ def encrypt_text(plaintext: str) -> str:
         return plaintext
 
 
-def decrypt_text(ciphertext: str) -> str:
-    # detect envelope payload format
+def encrypt_for_storage(plaintext: str, data_key=None):
+    """(ciphertext, wrapped key or None, key id or None) as journal rows store them.
+
+    `data_key` is the user's (key_id, key) from data_keys.current_key: the row is encrypted
+    with it and references it by id. Without one, this is encrypt_text with the envelope split
+    into ciphertext and per-row wrapped key.
+    """
+    if data_key is not None and plaintext:
+        from app.services.envelope_crypto import encrypt_with_data_key
+        key_id, key = data_key
+        return encrypt_with_data_key(plaintext, key), None, key_id
+    content_enc = encrypt_text(plaintext) if plaintext else ''
     try:
         import json
-        doc = json.loads(ciphertext)
+        doc = json.loads(content_enc)
         if isinstance(doc, dict) and 'ct' in doc and 'ek' in doc:
-            # use KMS to decrypt ek then decrypt ct
-            kms_key = getattr(settings, 'KMS_KEY_ID', None)
-            try:
-                from app.services.envelope_crypto import decrypt_from_kms
-                return decrypt_from_kms(doc['ct'], doc['ek'])
-            except Exception:
-                log.exception('Failed to decrypt using KMS envelope; falling back to Fernet')
+            return doc['ct'], doc['ek'], None
     except Exception:
-        # not JSON, continue to Fernet
         pass
+    return content_enc, None, None
+
+
+def decrypt_from_storage(content: str, encryption_key: str | None, key_id: int | None = None, db=None) -> str:
+    """Inverse of encrypt_for_storage; returns the stored value unchanged if it cannot be decrypted."""
+    if not content:
+        return content
+    try:
+        if key_id is not None:
+            from app.services.data_keys import key_by_id
+            from app.services.envelope_crypto import decrypt_with_data_key
+            return decrypt_with_data_key(content, key_by_id(key_id, db))
+        if encryption_key:
+            from app.services.envelope_crypto import decrypt_from_kms
+            return decrypt_from_kms(content, encryption_key)
+        return decrypt_text(content)
+    except Exception:
+        log.exception('Failed to decrypt stored content')
+        return content
+
+
+def decrypt_text(ciphertext: str) -> str:
+    # the format is told by the first bytes: sealed (header byte), JSON envelope ('{'), else Fernet
+    if sealed.version(ciphertext) == sealed.AES_GCM:
+        key = _local_key()
+        if key:
+            try:
+                return sealed.unseal(key, ciphertext)
+            except Exception:
+                # plaintext that happens to look sealed, or another key; try the legacy readers
+                pass
+    elif ciphertext.startswith('{'):
+        try:
+            import json
+            doc = json.loads(ciphertext)
+            if isinstance(doc, dict) and 'ct' in doc and 'ek' in doc:
+                # use KMS to decrypt ek then decrypt ct
+                try:
+                    from app.services.envelope_crypto import decrypt_from_kms
+                    return decrypt_from_kms(doc['ct'], doc['ek'])
+                except Exception:
+                    log.exception('Failed to decrypt using KMS envelope; falling back to Fernet')
+        except Exception:
+            # not JSON, continue to Fernet
+            pass
 
     f = _get_fernet()
     if not f:
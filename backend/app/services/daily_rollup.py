@@ -0,0 +1,337 @@
+"""Per-user daily rollups behind /moods/analytics/daily and /journals/summary.
+
+`user_daily_rollups` holds one row per (user, local day) with the mood score sum/count and journal
+progress sum/count for that day. Writers bump the row for the affected
+day in the same transaction as the entry, so a range query reads at most one row per day instead
+of grouping the raw history.
+
+Days are calendar days in the user's Profile.timezone (UTC when unset or invalid):
+  - moods by the local day of created_at
+  - journals by entry_date (already a local, user-chosen day), else the local day of created_at
+
+A user's rollups are (re)built from raw rows by the first write that touches them, when their
+timezone changes (PATCH /profile), and by `rebuild_job` for users whose rollups are missing or
+no longer match the timezone recorded in `user_rollup_state`. Reads never write: until then they
+compute the requested days from the raw rows. Retention subtracts the rows it deletes
+(`delete_moods`/`delete_journals`) rather than dropping whole days.
+"""
+import logging
+import zoneinfo
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import List, Optional
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.daily_rollup import UserDailyRollup, UserRollupState
+from app.models.journal_entry import JournalEntry
+from app.models.mood_entry import MoodEntry
+from app.models.profile import Profile
+from app.services import metrics, user_stats
+
+log = logging.getLogger('daily_rollup')
+
+_FIELDS = ('mood_sum', 'mood_count', 'progress_sum', 'progress_count')
+
+
+def _tz(name: Optional[str]) -> tzinfo:
+    try:
+        return zoneinfo.ZoneInfo(name) if name else timezone.utc
+    except Exception:
+        return timezone.utc
+
+
+def local_day(ts: datetime, tz: tzinfo) -> date:
+    if ts.tzinfo is None:
+        # SQLite hands back naive datetimes; they are stored as UTC
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(tz).date()
+
+
+def _tz_name(db: Session, user_id: int) -> str:
+    return db.query(Profile.timezone).filter(Profile.user_id == user_id).scalar() or 'UTC'
+
+
+def profile_timezone(db: Session, user_id: int) -> tzinfo:
+    """The user's timezone, without touching their rollups (e.g. to default a new entry's day)."""
+    return _tz(_tz_name(db, user_id))
+
+
+def journal_day(j: JournalEntry, tz: tzinfo) -> date:
+    return j.entry_date or local_day(j.created_at or datetime.now(timezone.utc), tz)
+
+
+def _recompute(db: Session, user_id: int, tz: tzinfo, start: Optional[date] = None,
+               end: Optional[date] = None) -> dict:
+    """{local day: totals} from the raw rows, optionally only for days start..end."""
+    days: dict = {}
+    # UTC bounds one day wider than the local days on each side cover every timezone offset
+    lo = datetime.combine(start - timedelta(days=1), time.min, timezone.utc) if start else None
+    hi = datetime.combine(end + timedelta(days=2), time.min, timezone.utc) if end else None
+
+    def bucket(d):
+        if (start and d < start) or (end and d > end):
+            return None
+        return days.setdefault(d, dict.fromkeys(_FIELDS, 0))
+
+    moods = db.query(MoodEntry.created_at, MoodEntry.score).filter(MoodEntry.user_id == user_id)
+    journals = (
+        db.query(JournalEntry.entry_date, JournalEntry.created_at, JournalEntry.progress)
+        .filter(JournalEntry.user_id == user_id, JournalEntry.progress != None)  # noqa: E711
+    )
+    if lo is not None:
+        moods = moods.filter(MoodEntry.created_at >= lo)
+    if hi is not None:
+        moods = moods.filter(MoodEntry.created_at < hi)
+    if start and end:
+        journals = journals.filter(or_(
+            JournalEntry.entry_date.between(start, end),
+            and_(JournalEntry.entry_date == None, JournalEntry.created_at >= lo, JournalEntry.created_at < hi),  # noqa: E711
+        ))
+
+    for created_at, score in moods:
+        b = bucket(local_day(created_at, tz))
+        if b is not None:
+            b['mood_sum'] += score
+            b['mood_count'] += 1
+    for j in journals:
+        b = bucket(journal_day(j, tz))
+        if b is not None:
+            b['progress_sum'] += j.progress
+            b['progress_count'] += 1
+    return days
+
+
+def rebuild(db: Session, user_id: int, tz_name: str) -> int:
+    """Replace a user's rollups with totals recomputed from raw rows; returns the number of days."""
+    days = _recompute(db, user_id, _tz(tz_name))
+    db.query(UserDailyRollup).filter(UserDailyRollup.user_id == user_id).delete(synchronize_session=False)
+    if days:
+        db.bulk_insert_mappings(UserDailyRollup, [{'user_id': user_id, 'day': d, **v} for d, v in days.items()])
+    state = db.query(UserRollupState).get(user_id)
+    if state is None:
+        db.add(UserRollupState(user_id=user_id, timezone=tz_name))
+    else:
+        state.timezone = tz_name
+    db.flush()
+    metrics.incr('daily_rollup.rebuilt')
+    return len(days)
+
+
+def _ensure(db: Session, user_id: int):
+    """(tz, existed). Builds the user's rollups from raw rows (including anything the caller has
+    flushed) when they are missing or were bucketed in a different timezone."""
+    tz_name = _tz_name(db, user_id)
+    state = db.query(UserRollupState.timezone).filter(UserRollupState.user_id == user_id).scalar()
+    if state == tz_name:
+        return _tz(tz_name), True
+    try:
+        with db.begin_nested():
+            rebuild(db, user_id, tz_name)
+    except IntegrityError:
+        # a concurrent request built them first from rows that exclude our uncommitted one
+        return _tz(tz_name), True
+    return _tz(tz_name), False
+
+
+def _bump(db: Session, user_id: int, day: date, **deltas):
+    values = {k: getattr(UserDailyRollup, k) + v for k, v in deltas.items()}
+    where = (UserDailyRollup.user_id == user_id, UserDailyRollup.day == day)
+    if db.execute(update(UserDailyRollup).where(*where).values(**values)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(UserDailyRollup(user_id=user_id, day=day, **{**dict.fromkeys(_FIELDS, 0), **deltas}))
+    except IntegrityError:
+        db.execute(update(UserDailyRollup).where(*where).values(**values))
+
+
+def mood_added(db: Session, user_id: int, created_at: datetime, score: int):
+    """Account for a new mood entry. Call after flushing the entry, before commit."""
+    moods_added(db, user_id, [(created_at, score)])
+
+
+def moods_added(db: Session, user_id: int, entries):
+    """Account for new (created_at, score) mood entries, one update per local day touched."""
+    if not entries:
+        return
+    tz, existed = _ensure(db, user_id)
+    if not existed:
+        return
+    per_day: dict = {}
+    for created_at, score in entries:
+        day = local_day(created_at, tz)
+        s, c = per_day.get(day, (0, 0))
+        per_day[day] = (s + score, c + 1)
+    for day, (s, c) in per_day.items():
+        _bump(db, user_id, day, mood_sum=s, mood_count=c)
+
+
+def journal_changed(db: Session, user_id: int, old=None, new=None):
+    """Account for a journal create (`new`), delete (`old`) or update (both).
+
+    `old` is a snapshot of (entry_date, created_at, progress) taken before the change; call after
+    flushing, before commit.
+    """
+    tz, existed = _ensure(db, user_id)
+    if not existed:
+        return
+    if old is not None and old.progress is not None:
+        _bump(db, user_id, journal_day(old, tz), progress_sum=-old.progress, progress_count=-1)
+    if new is not None and new.progress is not None:
+        _bump(db, user_id, journal_day(new, tz), progress_sum=new.progress, progress_count=1)
+
+
+def journals_added(db: Session, user_id: int, entries):
+    """Account for several new journal entries (objects with entry_date/created_at/progress)."""
+    tz, existed = _ensure(db, user_id)
+    if not existed:
+        return
+    per_day: dict = {}
+    for j in entries:
+        if j.progress is None:
+            continue
+        day = journal_day(j, tz)
+        s, c = per_day.get(day, (0, 0))
+        per_day[day] = (s + j.progress, c + 1)
+    for day, (s, c) in per_day.items():
+        _bump(db, user_id, day, progress_sum=s, progress_count=c)
+
+
+def user_timezone(db: Session, user_id: int) -> tzinfo:
+    """The timezone `days` buckets the user's entries in."""
+    return profile_timezone(db, user_id)
+
+
+def refresh(db: Session, user_id: int):
+    """Rebuild the user's rollups in the caller's transaction if they are missing or bucketed in
+    another timezone (e.g. right after a timezone change)."""
+    _ensure(db, user_id)
+
+
+def days(db: Session, user_id: int, start: date, end: date) -> List[UserDailyRollup]:
+    """The user's rollup rows for local days start..end inclusive, oldest first.
+
+    Read-only: when the stored rollups are missing or stale the range is computed from the raw
+    rows instead (unsaved rows); writes and `rebuild_stale` bring the stored ones up to date.
+    """
+    tz_name = _tz_name(db, user_id)
+    state = db.query(UserRollupState.timezone).filter(UserRollupState.user_id == user_id).scalar()
+    if state != tz_name:
+        metrics.incr('daily_rollup.read_raw')
+        computed = _recompute(db, user_id, _tz(tz_name), start, end)
+        return [UserDailyRollup(user_id=user_id, day=d, **v) for d, v in sorted(computed.items())]
+    return (
+        db.query(UserDailyRollup)
+        .filter(UserDailyRollup.user_id == user_id, UserDailyRollup.day >= start, UserDailyRollup.day <= end)
+        .order_by(UserDailyRollup.day.asc())
+        .all()
+    )
+
+
+def rebuild_stale(db: Session, limit: int = 500) -> int:
+    """Rebuild up to `limit` users whose rollups are missing or in an old timezone; returns how many."""
+    from app.models.user import User
+    want = func.coalesce(Profile.timezone, 'UTC')
+    users = (
+        db.query(User.id, want)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .outerjoin(UserRollupState, UserRollupState.user_id == User.id)
+        .filter(or_(UserRollupState.user_id == None, UserRollupState.timezone != want))  # noqa: E711
+        .order_by(User.id)
+        .limit(limit)
+        .all()
+    )
+    done = 0
+    for user_id, tz_name in users:
+        try:
+            rebuild(db, user_id, tz_name)
+            db.commit()
+            done += 1
+        except IntegrityError:
+            # written concurrently by the user's first write
+            db.rollback()
+    return done
+
+
+def rebuild_job():
+    from app.main import SessionLocal
+    db = SessionLocal()
+    try:
+        n = rebuild_stale(db)
+        if n:
+            log.info('Rebuilt daily rollups for %s users', n)
+    except Exception:
+        log.exception('daily rollup rebuild failed')
+    finally:
+        db.close()
+
+
+def _current_timezones(db: Session, user_ids) -> dict:
+    """{user id: tz} for the users whose stored rollups match their timezone; the others are
+    recomputed from the raw rows when rebuilt, so there is nothing stored to adjust."""
+    want = func.coalesce(Profile.timezone, 'UTC')
+    rows = (
+        db.query(UserRollupState.user_id, UserRollupState.timezone)
+        .outerjoin(Profile, Profile.user_id == UserRollupState.user_id)
+        .filter(UserRollupState.user_id.in_(list(user_ids)), UserRollupState.timezone == want)
+    )
+    return {uid: _tz(name) for uid, name in rows}
+
+
+def _subtract(db: Session, removed: dict, sum_field: str, count_field: str):
+    """Take {user id: {local day: (sum, count)}} back out of the stored days, dropping emptied days."""
+    for uid, per_day in removed.items():
+        for day, (s, c) in per_day.items():
+            db.execute(
+                update(UserDailyRollup)
+                .where(UserDailyRollup.user_id == uid, UserDailyRollup.day == day)
+                .values(**{sum_field: getattr(UserDailyRollup, sum_field) - s,
+                           count_field: getattr(UserDailyRollup, count_field) - c})
+            )
+    if removed:
+        db.query(UserDailyRollup).filter(
+            UserDailyRollup.user_id.in_(list(removed)),
+            *(getattr(UserDailyRollup, f) == 0 for f in _FIELDS),
+        ).delete(synchronize_session=False)
+
+
+def _group(rows, zones: dict, day_of) -> dict:
+    out: dict = {}
+    for row in rows:
+        tz = zones.get(row.user_id)
+        if tz is None:
+            continue
+        per_day = out.setdefault(row.user_id, {})
+        day = day_of(row, tz)
+        s, c = per_day.get(day, (0, 0))
+        per_day[day] = (s + row.value, c + 1)
+    return out
+
+
+def delete_moods(db: Session, *criteria) -> int:
+    """Subtract the mood rows matching `criteria` from their days, then delete them (retention)."""
+    rows = db.query(MoodEntry.user_id, MoodEntry.created_at, MoodEntry.score.label('value')).filter(*criteria).all()
+    zones = _current_timezones(db, {r.user_id for r in rows})
+    _subtract(db, _group(rows, zones, lambda r, tz: local_day(r.created_at, tz)), 'mood_sum', 'mood_count')
+    # keeps the per-user mood totals in step, in the same transaction
+    return user_stats.delete_moods(db, *criteria)
+
+
+def delete_journals(db: Session, *criteria) -> int:
+    """Subtract the journal rows matching `criteria` from their days, then delete them (retention)."""
+    rows = (
+        db.query(JournalEntry.user_id, JournalEntry.entry_date, JournalEntry.created_at,
+                 JournalEntry.progress.label('value'))
+        .filter(*criteria, JournalEntry.progress != None)  # noqa: E711
+        .all()
+    )
+    zones = _current_timezones(db, {r.user_id for r in rows})
+    _subtract(db, _group(rows, zones, journal_day), 'progress_sum', 'progress_count')
+    return db.query(JournalEntry).filter(*criteria).delete(synchronize_session=False) or 0
+
+
+def delete_user(db: Session, user_id: int):
+    db.query(UserDailyRollup).filter(UserDailyRollup.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserRollupState).filter(UserRollupState.user_id == user_id).delete(synchronize_session=False)
@@ -0,0 +1,183 @@
+"""Per-user data keys for journal encryption.
+
+With KMS configured, each user gets one data-encryption key (DEK), generated by KMS the first
+time they write and stored wrapped in `user_data_keys`. Journal rows are encrypted with it
+locally and reference it by `key_id`, so a write costs no KMS round trip and a read costs at
+most one Decrypt per key per worker (unwrapped keys are cached in services/envelope_crypto).
+
+With DATA_KEY_ROTATION_DAYS set, a key older than that is retired for writes: the next write
+creates the user's next epoch key. Old keys stay readable. Rotating the KMS key re-wraps only
+this table (`rewrap_all`); journal rows are not touched. Privacy deletion drops a user's keys;
+a cached current key is checked against the table before each use, so a worker that still
+holds a deleted key creates a new one instead of writing rows nobody can decrypt.
+
+Rows written before this (a wrapped key per row in `encryption_key`) keep working as before.
+"""
+import base64
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.data_key import UserDataKey
+from app.services import envelope_crypto, metrics
+from app.utils.cache import MISSING, TTLCache
+
+log = logging.getLogger('data_keys')
+
+# user_id -> (key_id, wrapped_key, created_at) of the key new rows are written with
+_current = TTLCache(
+    maxsize=getattr(settings, 'DATA_KEY_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'DATA_KEY_CACHE_TTL_SECONDS', 300),
+)
+# key_id -> wrapped_key, for reads
+_wrapped = TTLCache(
+    maxsize=getattr(settings, 'DATA_KEY_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'DATA_KEY_CACHE_TTL_SECONDS', 300),
+)
+
+
+def _aware(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def _retired(created_at: Optional[datetime]) -> bool:
+    days = getattr(settings, 'DATA_KEY_ROTATION_DAYS', 0)
+    if not days or created_at is None:
+        return False
+    return datetime.now(timezone.utc) - _aware(created_at) >= timedelta(days=days)
+
+
+def _latest(db: Session, user_id: int) -> Optional[UserDataKey]:
+    return (
+        db.query(UserDataKey)
+        .filter(UserDataKey.user_id == user_id)
+        .order_by(UserDataKey.epoch.desc())
+        .first()
+    )
+
+
+def _create(user_id: int, epoch: int, kms_key_id: str) -> None:
+    # committed on its own session: a write that rolls back must not take with it a key that
+    # this worker has already cached and handed out
+    from app.main import SessionLocal
+    res = envelope_crypto.generate_data_key(kms_key_id)
+    if not res:
+        return
+    wrapped = base64.b64encode(res[1]).decode('utf-8')
+    db = SessionLocal()
+    try:
+        db.add(UserDataKey(user_id=user_id, epoch=epoch, kms_key_id=kms_key_id, wrapped_key=wrapped))
+        db.commit()
+        metrics.incr('data_keys.created')
+    except IntegrityError:
+        # another request created this epoch's key first; use theirs
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _still_stored(db: Session, key_id: int, wrapped: str) -> bool:
+    # compared by wrapped key too: SQLite may hand a deleted key's id to the next key created
+    stored = db.query(UserDataKey.wrapped_key).filter(UserDataKey.id == key_id).scalar()
+    return stored == wrapped
+
+
+def current_key(db: Session, user_id: int) -> Optional[Tuple[int, bytes]]:
+    """(key_id, plaintext key) to encrypt the user's new rows with, creating the key on first
+    use; None when KMS is not configured (or key generation failed)."""
+    kms_key_id = getattr(settings, 'KMS_KEY_ID', None)
+    if not kms_key_id:
+        return None
+    hit = _current.get(user_id)
+    if hit is not MISSING and not _still_stored(db, hit[0], hit[1]):
+        # deleted (privacy deletion) since it was cached, possibly by another worker
+        forget(user_id, (hit[0],))
+        hit = MISSING
+    if hit is MISSING or _retired(hit[2]):
+        row = _latest(db, user_id)
+        if row is None or _retired(row.created_at):
+            _create(user_id, (row.epoch + 1) if row else 1, kms_key_id)
+            row = _latest(db, user_id)
+            if row is None or _retired(row.created_at):
+                return None
+        hit = (row.id, row.wrapped_key, row.created_at)
+        _current.set(user_id, hit)
+        _wrapped.set(row.id, row.wrapped_key)
+    key_id, wrapped, _ = hit
+    return key_id, envelope_crypto.unwrap_stored_key(wrapped)
+
+
+def key_by_id(key_id: int, db: Optional[Session] = None) -> bytes:
+    """Plaintext of data key `key_id`. Opens a short session of its own when `db` is not given
+    (journals decrypted off the request thread)."""
+    wrapped = _wrapped.get(key_id)
+    if wrapped is MISSING:
+        own = db is None
+        if own:
+            from app.main import SessionLocal
+            db = SessionLocal()
+        try:
+            wrapped = db.query(UserDataKey.wrapped_key).filter(UserDataKey.id == key_id).scalar()
+        finally:
+            if own:
+                db.close()
+        if wrapped is None:
+            raise LookupError(f'data key {key_id} not found')
+        _wrapped.set(key_id, wrapped)
+    return envelope_crypto.unwrap_stored_key(wrapped)
+
+
+def rewrap_all(db: Session, kms_key_id: str, batch: int = 100, commit: bool = True) -> int:
+    """Re-wrap every user data key under `kms_key_id` (KMS ReEncrypt); returns the number of keys
+    that were (or, with commit=False, would be) re-wrapped."""
+    changed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(UserDataKey)
+            .filter(UserDataKey.id > last_id)
+            .order_by(UserDataKey.id.asc())
+            .limit(batch)
+            .all()
+        )
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            if row.kms_key_id == kms_key_id:
+                continue
+            changed += 1
+            if commit:
+                row.wrapped_key = envelope_crypto.rewrap_stored_key(row.wrapped_key, kms_key_id)
+                row.kms_key_id = kms_key_id
+        if commit:
+            db.commit()
+    if commit:
+        # other workers keep the old wrapping (still valid under the old key) until their TTL
+        clear()
+        log.info('Re-wrapped %s data keys under %s', changed, kms_key_id)
+    return changed
+
+
+def delete_user(db: Session, user_id: int) -> list:
+    """Delete the user's data keys (part of the caller's transaction); returns their ids for
+    `forget` once committed."""
+    ids = [k for (k,) in db.query(UserDataKey.id).filter(UserDataKey.user_id == user_id)]
+    db.query(UserDataKey).filter(UserDataKey.user_id == user_id).delete(synchronize_session=False)
+    return ids
+
+
+def forget(user_id: int, key_ids=()):
+    """Evict the user's current key and the given keys from this worker's caches."""
+    _current.pop(user_id)
+    for key_id in key_ids:
+        _wrapped.pop(key_id)
+
+
+def clear():
+    _current.clear()
+    _wrapped.clear()
@@ -1,12 +1,22 @@
 import logging
 import base64
+import hashlib
+import threading
+import time
 from typing import Tuple, Optional
 from app.config import settings
+from app.services import ciphertext as sealed
+from app.services import metrics
+from app.utils.cache import MISSING, TTLCache
 
 log = logging.getLogger('envelope_crypto')
 
+_kms_lock = threading.Lock()
+_kms_client = None
+_kms_loaded = False
 
-def _get_kms_client():
+
+def _build_kms_client():
     try:
         import importlib
         boto3 = importlib.import_module('boto3')
@@ -17,6 +27,111 @@ def _get_kms_client():
         return None
 
 
+def _get_kms_client():
+    """The worker's KMS client, built once (boto3 clients are thread-safe and keep their
+    connection pool); None when boto3 is not available."""
+    global _kms_client, _kms_loaded
+    if not _kms_loaded:
+        with _kms_lock:
+            if not _kms_loaded:
+                _kms_client = _build_kms_client()
+                _kms_loaded = True
+    return _kms_client
+
+
+def reset_kms_client():
+    """Forget the shared client (after changing AWS settings, and in tests)."""
+    global _kms_client, _kms_loaded
+    with _kms_lock:
+        _kms_client, _kms_loaded = None, False
+
+
+def _zero(_digest, key: bytearray):
+    key[:] = bytes(len(key))
+
+
+# Unwrapped data keys by SHA-256 of the wrapped key. Entries are bytearrays so they can be
+# overwritten when they leave the cache; callers get a short-lived bytes copy, taken under
+# _data_keys_lock so a concurrent eviction can never zero a key that is still in use.
+_data_keys = TTLCache(
+    maxsize=getattr(settings, 'DATA_KEY_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'DATA_KEY_CACHE_TTL_SECONDS', 300),
+    on_evict=_zero,
+)
+_data_keys_lock = threading.Lock()
+# Fernet objects for reading legacy rows, by data-key digest
+_fernets = TTLCache(
+    maxsize=getattr(settings, 'DATA_KEY_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'DATA_KEY_CACHE_TTL_SECONDS', 300),
+)
+_PURGE_INTERVAL = 30.0
+_last_purge = 0.0
+
+
+def _digest(wrapped_key: bytes) -> bytes:
+    return hashlib.sha256(wrapped_key).digest()
+
+
+def _cached_data_key(wrapped_key: bytes) -> Optional[bytes]:
+    global _last_purge
+    with _data_keys_lock:
+        now = time.monotonic()
+        if now - _last_purge >= _PURGE_INTERVAL:
+            # expired keys are otherwise only zeroed when looked up again
+            _last_purge = now
+            _data_keys.purge_expired()
+        key = _data_keys.get(_digest(wrapped_key))
+        return None if key is MISSING else bytes(key)
+
+
+def _remember_data_key(wrapped_key: bytes, plaintext_key: bytes):
+    if not _data_keys.enabled:
+        return
+    with _data_keys_lock:
+        _data_keys.set(_digest(wrapped_key), bytearray(plaintext_key))
+
+
+def unwrap_data_key(client, wrapped_key: bytes) -> bytes:
+    """Plaintext of a KMS-wrapped data key, from the per-worker cache or a KMS Decrypt."""
+    key = _cached_data_key(wrapped_key)
+    if key is not None:
+        metrics.incr('kms.data_key_cache_hit')
+        return key
+    metrics.incr('kms.data_key_cache_miss')
+    with metrics.timed('kms.decrypt'):
+        key = client.decrypt(CiphertextBlob=wrapped_key)['Plaintext']
+    _remember_data_key(wrapped_key, key)
+    return key
+
+
+def unwrap_stored_key(encrypted_key_b64: str) -> bytes:
+    """Plaintext of a stored (base64) wrapped key. Without KMS, generate_data_key's local
+    fallback stores the raw key, which is returned as is."""
+    blob = base64.b64decode(encrypted_key_b64)
+    client = _get_kms_client()
+    if not client:
+        return blob
+    return unwrap_data_key(client, blob)
+
+
+def rewrap_stored_key(encrypted_key_b64: str, kms_key_id: str) -> str:
+    """Re-wrap a stored key under `kms_key_id` with KMS ReEncrypt (the plaintext never leaves KMS)."""
+    client = _get_kms_client()
+    if not client:
+        return encrypted_key_b64
+    with metrics.timed('kms.re_encrypt'):
+        resp = client.re_encrypt(CiphertextBlob=base64.b64decode(encrypted_key_b64), DestinationKeyId=kms_key_id)
+    return base64.b64encode(resp['CiphertextBlob']).decode('utf-8')
+
+
+def clear_data_keys():
+    """Zero and drop every cached data key, and the ciphers built from them."""
+    with _data_keys_lock:
+        _data_keys.clear()
+    _fernets.clear()
+    sealed.clear()
+
+
 def generate_data_key(kms_key_id: str) -> Optional[Tuple[bytes, bytes]]:
     """Requests KMS to generate a data key. Returns (plaintext_key_bytes, encrypted_key_bytes) or None.
     encrypted_key_bytes is the ciphertext blob from KMS and plaintext_key_bytes is the raw key.
@@ -37,27 +152,34 @@ def generate_data_key(kms_key_id: str) -> Optional[Tuple[bytes, bytes]]:
             return None
 
     try:
-        resp = client.generate_data_key(KeyId=kms_key_id, KeySpec='AES_256')
+        with metrics.timed('kms.generate_data_key'):
+            resp = client.generate_data_key(KeyId=kms_key_id, KeySpec='AES_256')
         plaintext = resp['Plaintext']
         ciphertext = resp['CiphertextBlob']
+        # the row written with this key is usually read back straight away
+        _remember_data_key(ciphertext, plaintext)
         return plaintext, ciphertext
     except Exception:
         log.exception('KMS generate_data_key failed')
         return None
 
 
+def _fernet(data_key_plain: bytes):
+    # legacy format: Fernet (AES-128-CBC + HMAC) keyed by the 32-byte data key
+    digest = _digest(data_key_plain)
+    f = _fernets.get(digest)
+    if f is MISSING:
+        from cryptography.fernet import Fernet
+        f = Fernet(base64.urlsafe_b64encode(data_key_plain))
+        _fernets.set(digest, f)
+    return f
+
+
 def encrypt_with_data_key(plaintext: str, data_key_plain: bytes) -> str:
-    # use Fernet-like (URL-safe base64) wrapper around AES key
     try:
-        from cryptography.fernet import Fernet
-        # If the data_key_plain is 32 bytes AES key, Fernet expects 32 urlsafe base64 bytes
-        import base64
-        if len(data_key_plain) == 32:
-            fkey = base64.urlsafe_b64encode(data_key_plain)
-        else:
-            fkey = base64.urlsafe_b64encode(data_key_plain)
-        f = Fernet(fkey)
-        return f.encrypt(plaintext.encode('utf-8')).decode('utf-8')
+        if sealed.enabled():
+            return sealed.seal(data_key_plain, plaintext)
+        return _fernet(data_key_plain).encrypt(plaintext.encode('utf-8')).decode('utf-8')
     except Exception:
         log.exception('Local encrypt_with_data_key failed; returning plaintext')
         return plaintext
@@ -65,11 +187,9 @@ def encrypt_with_data_key(plaintext: str, data_key_plain: bytes) -> str:
 
 def decrypt_with_data_key(ciphertext: str, data_key_plain: bytes) -> str:
     try:
-        from cryptography.fernet import Fernet
-        import base64
-        fkey = base64.urlsafe_b64encode(data_key_plain)
-        f = Fernet(fkey)
-        return f.decrypt(ciphertext.encode('utf-8')).decode('utf-8')
+        if sealed.version(ciphertext) == sealed.AES_GCM:
+            return sealed.unseal(data_key_plain, ciphertext)
+        return _fernet(data_key_plain).decrypt(ciphertext.encode('utf-8')).decode('utf-8')
     except Exception:
         log.exception('Local decrypt_with_data_key failed; returning ciphertext')
         return ciphertext
@@ -113,8 +233,7 @@ def decrypt_from_kms(ciphertext: str, encrypted_key_b64: str) -> Optional[str]:
             return ciphertext
 
     try:
-        resp = client.decrypt(CiphertextBlob=enc_blob)
-        plain = resp['Plaintext']
+        plain = unwrap_data_key(client, enc_blob)
         return decrypt_with_data_key(ciphertext, plain)
     except Exception:
         log.exception('KMS decrypt failed')
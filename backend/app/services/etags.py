@@ -0,0 +1,206 @@
+"""ETags for the endpoints clients poll (/profile, /points, /streaks, /engagement/summary, /moods).
+
+Each (user, resource) pair has a version counter in `resource_versions` that is bumped in the
+same transaction as any write to the data behind the resource. The ETag of a response is a
+digest of the user, resource and version (plus the query string, so every page of /moods gets
+its own tag). A request whose If-None-Match still matches is answered with a bodiless 304 by the
+guard dependency, before the handler runs any query or serializes anything.
+
+Writes are picked up without touching the write paths:
+
+  - a session `before_flush` listener notes the users/resources of new, changed and deleted
+    rows of the tracked models (_TRACKED)
+  - a `before_commit` listener bumps the noted counters inside the committing transaction
+  - an `after_commit` listener evicts them from this worker's version cache
+
+Bulk statements (multi-row INSERTs, Query.delete) bypass the flush, so their callers note the
+change with `touch`. Versions are cached per worker for ETAG_VERSION_TTL_SECONDS; a warm cache
+answers a matching poll without any DB round trip, and a write handled by another worker is
+seen once the entry expires.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Set, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.resource_version import ResourceVersion
+from app.services import metrics
+from app.utils.cache import MISSING, TTLCache
+
+RESOURCES = ('profile', 'points', 'streaks', 'engagement', 'moods')
+
+# table -> resources whose responses are built from its rows. The profile includes an
+# engagement_status derived from the latest streak, achievement and points activity.
+_TRACKED = {
+    'profiles': ('profile',),
+    'points_ledger': ('points', 'engagement', 'profile'),
+    'achievements': ('engagement', 'profile'),
+    'streaks': ('streaks', 'engagement', 'profile'),
+    'mood_entries': ('moods',),
+}
+
+# resources whose response also depends on the current (UTC) day: engagement_status decays
+# with time since the last activity, without any write
+_DAILY = {'profile'}
+
+_PENDING = 'etags.pending'
+_BUMPED = 'etags.bumped'
+
+_versions = TTLCache(
+    maxsize=getattr(settings, 'ETAG_VERSION_CACHE_MAX_ENTRIES', 50000),
+    ttl_seconds=getattr(settings, 'ETAG_VERSION_TTL_SECONDS', 5),
+)
+
+
+def touch(db: Session, user_id: int, *resources: str):
+    """Note a write to `resources` of `user_id`; the versions are bumped when `db` commits."""
+    pending: Set[Tuple[int, str]] = db.info.setdefault(_PENDING, set())
+    pending.update((user_id, r) for r in resources)
+
+
+def _bump(db: Session, user_id: int, resources: Iterable[str]):
+    resources = sorted(resources)
+    where = (ResourceVersion.user_id == user_id, ResourceVersion.resource.in_(resources))
+    if db.execute(update(ResourceVersion).where(*where).values(version=ResourceVersion.version + 1)).rowcount == len(resources):
+        return
+    # the rows that exist were bumped above; create the others at version 1
+    present = {r for (r,) in db.query(ResourceVersion.resource).filter(*where)}
+    missing = [r for r in resources if r not in present]
+    if not missing:
+        return
+    try:
+        with db.begin_nested():
+            db.bulk_insert_mappings(ResourceVersion, [{'user_id': user_id, 'resource': r, 'version': 1} for r in missing])
+    except IntegrityError:
+        # created concurrently; bump whatever the other transaction inserted
+        db.execute(
+            update(ResourceVersion)
+            .where(ResourceVersion.user_id == user_id, ResourceVersion.resource.in_(missing))
+            .values(version=ResourceVersion.version + 1)
+        )
+
+
+@event.listens_for(Session, 'before_flush')
+def _note_writes(session: Session, flush_context, instances):
+    for states, check in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in states:
+            resources = _TRACKED.get(getattr(obj, '__tablename__', None))
+            if resources is None or (check and not session.is_modified(obj)):
+                continue
+            user_id = getattr(obj, 'user_id', None)
+            if user_id is not None:
+                touch(session, user_id, *resources)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_pending(session: Session):
+    if session.get_nested_transaction() is not None:
+        # releasing a savepoint; the outer commit bumps
+        return
+    if session.new or session.dirty or session.deleted:
+        # commit flushes after this hook; flush now so those writes are noted too
+        session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    per_user: Dict[int, Set[str]] = {}
+    for user_id, resource in pending:
+        per_user.setdefault(user_id, set()).add(resource)
+    for user_id, resources in per_user.items():
+        _bump(session, user_id, resources)
+    session.info.setdefault(_BUMPED, set()).update(pending)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_bumped(session: Session):
+    for key in session.info.pop(_BUMPED, ()):
+        _versions.pop(key)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_pending(session: Session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING, None)
+        session.info.pop(_BUMPED, None)
+
+
+def version(db: Session, user_id: int, resource: str) -> int:
+    key = (user_id, resource)
+    cached = _versions.get(key)
+    if cached is not MISSING:
+        metrics.incr('etag.version_cache_hit')
+        return cached
+    metrics.incr('etag.version_cache_miss')
+    v = (
+        db.query(ResourceVersion.version)
+        .filter(ResourceVersion.user_id == user_id, ResourceVersion.resource == resource)
+        .scalar()
+    ) or 0
+    _versions.set(key, v)
+    return v
+
+
+async def version_async(db, user_id: int, resource: str) -> int:
+    """`version` for an AsyncSession."""
+    key = (user_id, resource)
+    cached = _versions.get(key)
+    if cached is not MISSING:
+        metrics.incr('etag.version_cache_hit')
+        return cached
+    metrics.incr('etag.version_cache_miss')
+    v = await db.scalar(
+        select(ResourceVersion.version)
+        .where(ResourceVersion.user_id == user_id, ResourceVersion.resource == resource)
+    ) or 0
+    _versions.set(key, v)
+    return v
+
+
+def etag(resource: str, user_id: int, v: int, request: Request) -> str:
+    parts = [resource, str(user_id), str(v), request.url.query]
+    if resource in _DAILY:
+        parts.append(datetime.now(timezone.utc).date().isoformat())
+    digest = hashlib.blake2s('|'.join(parts).encode(), digest_size=10).hexdigest()
+    return f'W/"{resource}-{v}-{digest}"'
+
+
+def _matches(header: str | None, tag: str) -> bool:
+    if not header:
+        return False
+    # weak comparison: W/ prefixes are ignored on both sides
+    opaque = tag[2:] if tag.startswith('W/') else tag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _record(resource: str, hit: bool):
+    metrics.incr(f'etag.{resource}.{"hit" if hit else "miss"}')
+    hits = metrics.counter_value(f'etag.{resource}.hit')
+    total = hits + metrics.counter_value(f'etag.{resource}.miss')
+    metrics.gauge(f'etag.{resource}.hit_rate', round(hits / total, 4))
+
+
+def respond(resource: str, tag: str, request: Request, response: Response):
+    """Raise a 304 if the client already holds `tag`; otherwise stamp it on the response."""
+    headers = {'ETag': tag, 'Cache-Control': 'private, no-cache'}
+    if _matches(request.headers.get('if-none-match'), tag):
+        _record(resource, hit=True)
+        raise HTTPException(status_code=304, headers=headers)
+    _record(resource, hit=False)
+    response.headers.update(headers)
+
+
+def clear():
+    _versions.clear()
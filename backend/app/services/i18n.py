@@ -3,8 +3,10 @@ from pathlib import Path
 from functools import lru_cache
 from typing import Dict
 from app.models.translation import Translation
+from app.config import settings
+from app.utils.cache import TTLCache
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 _i18n_dir = Path(__file__).parent.parent / 'i18n'
 
@@ -82,7 +84,15 @@ def parse_accept_language(header_value: str, available: List[str] | None = None)
     """Parse Accept-Language header with q-values and return the best matching locale.
     If available is provided, prefer matches from that list; otherwise return the primary tag.
     Examples: 'en-US,en;q=0.9,es;q=0.8' -> 'en'
+
+    Results are memoized per (raw header, available locales); browsers send a handful of
+    distinct header values so the steady state is a dict lookup.
     """
+    return _parse_accept_language(header_value or '', tuple(available) if available else None)
+
+
+@lru_cache(maxsize=1024)
+def _parse_accept_language(header_value: str, available: Tuple[str, ...] | None) -> str:
     if not header_value:
         return 'en'
     parts = [p.strip() for p in header_value.split(',') if p.strip()]
@@ -119,13 +129,59 @@ def parse_accept_language(header_value: str, available: List[str] | None = None)
 
 
 def available_locales() -> List[str]:
-    """Return list of available locale basenames based on files in the i18n folder."""
+    """Return list of available locale basenames based on files in the i18n folder.
+
+    The folder ships with the code, so it is listed once per process; call
+    `_locale_names.cache_clear()` after adding a bundle at runtime.
+    """
+    return list(_locale_names())
+
+
+@lru_cache(maxsize=1)
+def _locale_names() -> Tuple[str, ...]:
     try:
         files = [_i18n_dir.joinpath(f).name for f in _i18n_dir.iterdir() if f.suffix == '.json']
         locales = [Path(f).stem for f in files]
         # ensure 'en' is present as fallback
         if 'en' not in locales:
             locales.insert(0, 'en')
-        return locales
+        return tuple(locales)
     except Exception:
-        return ['en']
+        return ('en',)
+
+
+
+# Per-worker cache of Profile.language keyed by user id (None = no profile / no language).
+# Writers call remember_user_locale/forget_user_locale after committing; the TTL bounds how
+# long a change made in another worker can go unnoticed.
+_user_locales = TTLCache(
+    maxsize=getattr(settings, 'LOCALE_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'LOCALE_CACHE_TTL_SECONDS', 300),
+)
+
+
+def cached_user_locale(user_id: int):
+    """Return the cached profile language for user_id, or `MISSING` if not cached."""
+    return _user_locales.get(user_id)
+
+
+def load_user_locale(user_id: int) -> Optional[str]:
+    """Read Profile.language from the DB and cache it. Used on a cache miss."""
+    from app.main import SessionLocal
+    from app.models.profile import Profile
+    db = SessionLocal()
+    try:
+        row = db.query(Profile.language).filter(Profile.user_id == user_id).first()
+        lang = row[0] if row and row[0] else None
+    finally:
+        db.close()
+    _user_locales.set(user_id, lang)
+    return lang
+
+
+def remember_user_locale(user_id: int, language: Optional[str]):
+    _user_locales.set(user_id, language or None)
+
+
+def forget_user_locale(user_id: int):
+    _user_locales.pop(user_id)
@@ -0,0 +1,96 @@
+"""Bounded worker pool for password KDF work.
+
+pbkdf2 hashing burns a core for tens of milliseconds per call. Running it inline in the auth
+handlers lets a login burst occupy the whole request threadpool, so `security.hash_password`
+and `security.verify_password` submit their work here instead. hashlib releases the GIL while
+deriving, so a small thread pool keeps KDF work to KDF_POOL_WORKERS cores per worker process.
+
+At most KDF_POOL_WORKERS + KDF_QUEUE_DEPTH operations are admitted at once; beyond that `run`
+raises KdfPoolBusy immediately, which the app turns into a 503 with Retry-After rather than
+letting requests pile up behind the pool.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.services import metrics
+
+log = logging.getLogger('kdf_pool')
+
+
+class KdfPoolBusy(Exception):
+    """Raised when the KDF pool already has its maximum number of operations admitted."""
+
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_in_flight = 0
+
+
+def configure(workers: int, queue_depth: int):
+    """(Re)build the pool. workers <= 0 runs KDF work inline on the calling thread."""
+    global _executor, _slots
+    with _lock:
+        old = _executor
+        if workers > 0:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kdf')
+            _slots = threading.BoundedSemaphore(workers + max(0, queue_depth))
+        else:
+            _executor = None
+            _slots = None
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def run(op: str, fn, *args):
+    """Run fn(*args) on the KDF pool, recording latency under `kdf.<op>`."""
+    global _in_flight
+    executor, slots = _executor, _slots
+    if executor is None:
+        with metrics.timed(f'kdf.{op}'):
+            return fn(*args)
+    if not slots.acquire(blocking=False):
+        metrics.incr(f'kdf.{op}.rejected')
+        raise KdfPoolBusy(op)
+    with _lock:
+        _in_flight += 1
+        metrics.gauge('kdf.in_flight', _in_flight)
+    submitted = time.perf_counter()
+
+    def _task():
+        started = time.perf_counter()
+        metrics.observe(f'kdf.{op}.queue_wait', started - submitted)
+        try:
+            return fn(*args)
+        finally:
+            metrics.observe(f'kdf.{op}', time.perf_counter() - started)
+
+    try:
+        return executor.submit(_task).result()
+    finally:
+        slots.release()
+        with _lock:
+            _in_flight -= 1
+            metrics.gauge('kdf.in_flight', _in_flight)
+
+
+def kdf_busy_handler(request: Request, exc: KdfPoolBusy):
+    log.warning('KDF pool saturated; rejecting %s %s', request.method, request.url.path)
+    return JSONResponse(
+        {'detail': 'Server busy, please retry'},
+        status_code=503,
+        headers={'Retry-After': str(getattr(settings, 'KDF_RETRY_AFTER_SECONDS', 1))},
+    )
+
+
+configure(
+    getattr(settings, 'KDF_POOL_WORKERS', 2),
+    getattr(settings, 'KDF_QUEUE_DEPTH', 32),
+)
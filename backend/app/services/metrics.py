@@ -0,0 +1,105 @@
+"""In-process metrics registry.
+
+Counters and latency timers live per worker process (gunicorn forks one registry per
+worker). `snapshot()` returns a JSON-serialisable view that the admin metrics endpoint
+exposes; it is intentionally dependency-free so services can report without importing
+a metrics client.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+# number of recent samples kept per timer for percentile estimates
+_SAMPLE_WINDOW = 2048
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_gauges: Dict[str, float] = {}
+_timers: Dict[str, '_Timer'] = {}
+
+
+class _Timer:
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=_SAMPLE_WINDOW)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float | None:
+            if not ordered:
+                return None
+            idx = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+            return round(ordered[idx] * 1000.0, 3)
+
+        return {
+            'count': self.count,
+            'avg_ms': round((self.total / self.count) * 1000.0, 3) if self.count else None,
+            'max_ms': round(self.max * 1000.0, 3),
+            'p50_ms': pct(0.50),
+            'p95_ms': pct(0.95),
+            'p99_ms': pct(0.99),
+        }
+
+
+def incr(name: str, value: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        t = _timers.get(name)
+        if t is None:
+            t = _timers[name] = _Timer()
+        t.observe(seconds)
+
+
+@contextmanager
+def timed(name: str):
+    """Context manager that records the wall time of its body under `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def counter_value(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'timers': {k: t.summary() for k, t in _timers.items()},
+        }
+
+
+def reset():
+    """Clear all metrics (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timers.clear()
@@ -0,0 +1,209 @@
+"""Mood trend engine behind /moods/trends.
+
+A user's mood history is loaded once from the daily rollups (services/daily_rollup) as dense
+per-day NumPy arrays (score sum and entry count for every local day in the range), and every
+metric is computed from those arrays without a per-day Python loop:
+
+  - rolling means over each of ROLLING_WINDOWS days, entry-weighted, all windows at once from
+    one pair of cumulative sums
+  - an EWMA of the daily averages (span MOOD_EWMA_SPAN_DAYS) over days with entries
+  - day-over-day volatility: the standard deviation of the change in daily average between
+    consecutive logged days, over the same rolling windows
+  - streaks of low days (daily average <= MOOD_LOW_DAY_THRESHOLD) from run-length boundaries
+
+Results are cached per worker. The cache entry is validated against the user's running mood
+totals (services/user_stats), which every mood write and delete changes, so a write in any
+worker makes the next read recompute; writes in this worker also evict the entry directly.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.user_stats import UserStats
+from app.services import daily_rollup, metrics
+from app.utils.cache import MISSING, TTLCache
+
+ROLLING_WINDOWS = (7, 30)
+
+_cache = TTLCache(
+    maxsize=getattr(settings, 'MOOD_TRENDS_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'MOOD_TRENDS_CACHE_TTL_SECONDS', 600),
+)
+
+
+def _windowed_sums(cs: np.ndarray, windows) -> np.ndarray:
+    """Trailing-window sums for every day and window: shape (len(windows), len(cs) - 1).
+
+    `cs` is a cumulative sum with a leading 0, so the sum over days (t - w, t] is cs[t+1] - cs[t+1-w].
+    """
+    n = len(cs) - 1
+    end = np.arange(1, n + 1)
+    start = np.maximum(end[None, :] - np.asarray(windows)[:, None], 0)
+    return cs[end][None, :] - cs[start]
+
+
+def rolling_means(sums: np.ndarray, counts: np.ndarray, windows=ROLLING_WINDOWS) -> np.ndarray:
+    """Entry-weighted mean score over each trailing window (NaN where the window has no entries)."""
+    s = _windowed_sums(np.concatenate(([0.0], np.cumsum(sums))), windows)
+    c = _windowed_sums(np.concatenate(([0.0], np.cumsum(counts))), windows)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(c > 0, s / c, np.nan)
+
+
+def ewma(x: np.ndarray, span: float) -> np.ndarray:
+    """Exponentially weighted mean of x (adjusted weights, like pandas' ewm(span).mean()).
+
+    Computed blockwise from cumulative sums; blocks are sized so the in-block weights cannot
+    overflow, and each block starts from the previous block's carried totals.
+    """
+    n = len(x)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    decay = 1.0 - 2.0 / (span + 1.0)
+    if decay <= 0:
+        return x.astype(float)
+    block = max(1, int(500 / -math.log(decay)))
+    num = den = 0.0
+    for b in range(0, n, block):
+        seg = x[b:b + block]
+        k = np.arange(len(seg))
+        grow = decay ** -k
+        shrink = decay ** k
+        seg_num = decay * shrink * num + shrink * np.cumsum(seg * grow)
+        seg_den = decay * shrink * den + shrink * np.cumsum(grow)
+        out[b:b + block] = seg_num / seg_den
+        num, den = seg_num[-1], seg_den[-1]
+    return out
+
+
+def rolling_volatility(daily: np.ndarray, windows=ROLLING_WINDOWS) -> np.ndarray:
+    """Std. deviation of day-over-day changes in the daily average over each trailing window.
+
+    A change is only counted between two consecutive days that both have entries; NaN where a
+    window holds fewer than two changes.
+    """
+    change = np.diff(daily, prepend=np.nan)
+    valid = ~np.isnan(change)
+    d = np.where(valid, change, 0.0)
+    s1 = _windowed_sums(np.concatenate(([0.0], np.cumsum(d))), windows)
+    s2 = _windowed_sums(np.concatenate(([0.0], np.cumsum(d * d))), windows)
+    c = _windowed_sums(np.concatenate(([0], np.cumsum(valid))), windows)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = s2 / c - (s1 / c) ** 2
+        return np.where(c >= 2, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def low_streaks(low: np.ndarray):
+    """(start index, length) of every run of consecutive True values."""
+    edges = np.diff(np.concatenate(([0], low.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+
+def _num(v) -> Optional[float]:
+    return None if v is None or np.isnan(v) else round(float(v), 3)
+
+
+def compute(db: Session, user_id: int, days: int = 90, now: Optional[datetime] = None) -> dict:
+    """Trend metrics for the last `days` local days (today included)."""
+    tz = daily_rollup.user_timezone(db, user_id)
+    today = daily_rollup.local_day(now or datetime.now(timezone.utc), tz)
+    # extra history so the first reported day already has full rolling windows
+    first = today - timedelta(days=days - 1 + max(ROLLING_WINDOWS))
+    n = (today - first).days + 1
+    sums = np.zeros(n)
+    counts = np.zeros(n)
+    rows = daily_rollup.days(db, user_id, first, today)
+    if rows:
+        idx = np.fromiter(((r.day - first).days for r in rows), dtype=np.int64, count=len(rows))
+        sums[idx] = [r.mood_sum for r in rows]
+        counts[idx] = [r.mood_count for r in rows]
+
+    logged = counts > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily = np.where(logged, sums / counts, np.nan)
+    means = rolling_means(sums, counts)
+    vol = rolling_volatility(daily)
+    smooth = np.full(n, np.nan)
+    smooth[logged] = ewma(daily[logged], getattr(settings, 'MOOD_EWMA_SPAN_DAYS', 7))
+    # carry the last EWMA value forward over days without entries
+    last_seen = np.maximum.accumulate(np.where(logged, np.arange(n), -1))
+    smooth = np.where(last_seen >= 0, smooth[np.maximum(last_seen, 0)], np.nan)
+
+    threshold = getattr(settings, 'MOOD_LOW_DAY_THRESHOLD', 4)
+    low = logged & (daily <= threshold)
+    starts, lengths = low_streaks(low[n - days:])
+    ends = starts + lengths - 1
+    # today may not be logged yet, so a streak ending yesterday is still current
+    current = 0
+    if len(lengths) and (ends[-1] == days - 1 or (ends[-1] == days - 2 and not logged[-1])):
+        current = int(lengths[-1])
+
+    shown = range(n - days, n)
+    series = [
+        {
+            'day': (first + timedelta(days=i)).isoformat(),
+            'average': _num(daily[i]),
+            'count': int(counts[i]),
+            **{f'mean_{w}d': _num(means[j, i]) for j, w in enumerate(ROLLING_WINDOWS)},
+            'ewma': _num(smooth[i]),
+        }
+        for i in shown if logged[i]
+    ]
+    return {
+        'start': (today - timedelta(days=days - 1)).isoformat(),
+        'end': today.isoformat(),
+        'latest': {
+            **{f'mean_{w}d': _num(means[j, -1]) for j, w in enumerate(ROLLING_WINDOWS)},
+            'ewma': _num(smooth[-1]),
+            **{f'volatility_{w}d': _num(vol[j, -1]) for j, w in enumerate(ROLLING_WINDOWS)},
+        },
+        'low_days': {
+            'threshold': threshold,
+            'count': int(low[n - days:].sum()),
+            'current_streak': current,
+            'longest_streak': int(lengths.max()) if len(lengths) else 0,
+        },
+        'series': series,
+    }
+
+
+def _stamp(db: Session, user_id: int) -> tuple:
+    """What a cached result depends on besides the request: the running mood totals (changed by
+    every mood write/delete), the user's timezone and the current local day."""
+    row = (
+        db.query(UserStats.mood_count, UserStats.mood_sum, UserStats.updated_at)
+        .filter(UserStats.user_id == user_id)
+        .first()
+    )
+    tz = daily_rollup.user_timezone(db, user_id)
+    return tuple(row) if row else None, str(tz), daily_rollup.local_day(datetime.now(timezone.utc), tz)
+
+
+def trends(db: Session, user_id: int, days: int = 90) -> dict:
+    """Cached `compute`."""
+    stamp = _stamp(db, user_id)
+    hit = _cache.get(user_id)
+    if hit is not MISSING and hit[0] == stamp and days in hit[1]:
+        metrics.incr('mood_trends.cache_hit')
+        return hit[1][days]
+    metrics.incr('mood_trends.cache_miss')
+    result = compute(db, user_id, days)
+    by_days = hit[1] if hit is not MISSING and hit[0] == stamp else {}
+    by_days[days] = result
+    _cache.set(user_id, (stamp, by_days))
+    return result
+
+
+def invalidate(user_id: int):
+    _cache.pop(user_id)
+
+
+def clear():
+    _cache.clear()
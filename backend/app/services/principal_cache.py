@@ -0,0 +1,148 @@
+"""In-process cache of authenticated principals.
+
+`get_current_user` and friends resolve the JWT `sub` to a user row on every request. This
+module keeps a small TTL + LRU cache of detached user snapshots keyed by (user_id, token
+issue time) so hot authenticated endpoints can skip that SELECT.
+
+The cache is per worker process. Writers that change identity-relevant fields (email, role,
+is_active, is_verified, password) must call `invalidate_user(user_id)` after committing;
+other workers converge within PRINCIPAL_CACHE_TTL_SECONDS.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.services import metrics
+
+
+class Principal:
+    """Detached, read-only snapshot of the fields handlers read from the current user."""
+
+    __slots__ = ('id', 'email', 'role', 'is_active', 'is_verified', 'created_at')
+
+    def __init__(self, id, email, role, is_active, is_verified, created_at):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+        self.is_verified = is_verified
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user) -> 'Principal':
+        return cls(user.id, user.email, user.role, user.is_active, user.is_verified, user.created_at)
+
+    def __repr__(self) -> str:
+        return f'<Principal id={self.id} role={self.role}>'
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = 10000, ttl_seconds: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[int, object], Tuple[float, Principal]]' = OrderedDict()
+        self._by_user: dict[int, set] = {}
+
+    def get(self, user_id: int, issued_at) -> Optional[Principal]:
+        if self.ttl_seconds <= 0:
+            return None
+        key = (user_id, issued_at)
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, principal = item
+            if expires <= now:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def put(self, user_id: int, issued_at, principal: Principal):
+        if self.ttl_seconds <= 0 or self.maxsize <= 0:
+            return
+        key = (user_id, issued_at)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+
+principal_cache = PrincipalCache(
+    maxsize=getattr(settings, 'PRINCIPAL_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'PRINCIPAL_CACHE_TTL_SECONDS', 60),
+)
+
+
+def invalidate_user(user_id: int):
+    principal_cache.invalidate_user(user_id)
+
+
+def _cache_key(payload: dict) -> Tuple[int, object]:
+    # tokens minted before `iat` was added fall back to their expiry as the issue marker
+    return int(payload['sub']), payload.get('iat') or payload.get('exp')
+
+
+def _cached(user_id: int, issued_at) -> Optional[Principal]:
+    principal = principal_cache.get(user_id, issued_at)
+    metrics.incr('principal_cache.hit' if principal is not None else 'principal_cache.miss')
+    return principal
+
+
+def load_principal(db, payload: dict) -> Optional[Principal]:
+    """Resolve a decoded access-token payload to a Principal, hitting the DB only on a miss."""
+    from app.models.user import User
+    user_id, issued_at = _cache_key(payload)
+    principal = _cached(user_id, issued_at)
+    if principal is not None:
+        return principal
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(user_id, issued_at, principal)
+    return principal
+
+
+async def load_principal_async(db, payload: dict) -> Optional[Principal]:
+    """`load_principal` for an AsyncSession."""
+    from sqlalchemy import select
+    from app.models.user import User
+    user_id, issued_at = _cache_key(payload)
+    principal = _cached(user_id, issued_at)
+    if principal is not None:
+        return principal
+    user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+    if not user:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(user_id, issued_at, principal)
+    return principal
@@ -14,11 +14,21 @@ def purge_old_data():
     from app.main import SessionLocal
     from app.models.journal_entry import JournalEntry
     from app.models.mood_entry import MoodEntry
+    from app.services.daily_rollup import delete_journals, delete_moods
+    from app.services import sync_changes
     db = SessionLocal()
     try:
-        jcount = db.query(JournalEntry).filter(JournalEntry.created_at < cutoff).delete()
-        mcount = db.query(MoodEntry).filter(MoodEntry.created_at < cutoff).delete()
+        # tombstones first so synced devices drop the purged rows too
+        sync_changes.record_deleted_where(db, 'journal', JournalEntry.created_at < cutoff)
+        sync_changes.record_deleted_where(db, 'mood', MoodEntry.created_at < cutoff)
+        # both subtract the deleted rows from the daily rollups (and moods from the user totals)
+        # in the same transaction
+        jcount = delete_journals(db, JournalEntry.created_at < cutoff)
+        mcount = delete_moods(db, MoodEntry.created_at < cutoff)
+        sync_changes.prune_tombstones(db)
         db.commit()
+        from app.services.mood_trends import clear
+        clear()
         total = (jcount or 0) + (mcount or 0)
         log.info('Retention purge removed %s records', total)
         return total
@@ -41,5 +51,11 @@ def start_retention_scheduler():
     sched = BackgroundScheduler()
     interval_minutes = getattr(settings, 'RETENTION_CHECK_INTERVAL_MINUTES', 24 * 60)
     sched.add_job(purge_old_data, 'interval', minutes=interval_minutes)
+    from app.services.user_stats import verify_job
+    sched.add_job(verify_job, 'interval', minutes=getattr(settings, 'USER_STATS_VERIFY_INTERVAL_MINUTES', 24 * 60))
+    from app.services.daily_rollup import rebuild_job
+    sched.add_job(rebuild_job, 'interval', minutes=getattr(settings, 'DAILY_ROLLUP_REBUILD_INTERVAL_MINUTES', 15))
+    from app.services.sleep_metrics import backfill_job
+    sched.add_job(backfill_job, 'interval', minutes=getattr(settings, 'DAILY_ROLLUP_REBUILD_INTERVAL_MINUTES', 15))
     sched.start()
     log.info('Retention scheduler started; interval=%s minutes', interval_minutes)
@@ -1,28 +1,51 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
+import hashlib
+import time
 from app.config import settings
+from app.services import kdf_pool, metrics
+from app.utils.cache import TTLCache, MISSING
 
 # Use pbkdf2_sha256 to avoid bcrypt platform/length issues in some environments
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 def hash_password(password: str) -> str:
-	return pwd_context.hash(password)
+	# KDF work runs on the bounded kdf_pool; raises kdf_pool.KdfPoolBusy (503) when saturated
+	return kdf_pool.run("hash", pwd_context.hash, password)
 
 def verify_password(plain: str, hashed: str) -> bool:
-	return pwd_context.verify(plain, hashed)
+	return kdf_pool.run("verify", pwd_context.verify, plain, hashed)
 
 def create_access_token(data: dict, expires_delta: int = None) -> str:
 	to_encode = data.copy()
 	expire_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES if expires_delta is None else expires_delta
-	expire = datetime.now(timezone.utc) + timedelta(minutes=int(expire_minutes))
-	to_encode.update({"exp": expire})
+	now = datetime.now(timezone.utc)
+	expire = now + timedelta(minutes=int(expire_minutes))
+	# iat lets per-token caches (see principal_cache) tell tokens for the same user apart
+	to_encode.update({"exp": expire, "iat": now})
 	encoded = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
 	return encoded
 
+# Verified-token cache: sha256(token) -> decoded payload, kept until the token's `exp`, so each
+# distinct token is verified once per worker. Only successful decodes are cached.
+_verified_tokens = TTLCache(maxsize=getattr(settings, "JWT_CACHE_MAX_ENTRIES", 10000), ttl_seconds=float("inf"))
+
 def decode_access_token(token: str) -> dict:
+	key = hashlib.sha256(token.encode("utf-8")).digest()
+	cached = _verified_tokens.get(key)
+	if cached is not MISSING:
+		metrics.incr("jwt_cache.hit")
+		return dict(cached)
+	metrics.incr("jwt_cache.miss")
 	try:
 		payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-		return payload
 	except JWTError:
 		return {}
+	exp = payload.get("exp")
+	if isinstance(exp, (int, float)):
+		_verified_tokens.set(key, dict(payload), ttl_seconds=exp - time.time())
+	return payload
+
+def clear_token_cache():
+	_verified_tokens.clear()
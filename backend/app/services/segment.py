@@ -1,50 +1,257 @@
+"""Segment delivery via the /v1/batch API.
+
+Track calls are accumulated in memory and sent by one sender thread when SEGMENT_BATCH_SIZE
+events are waiting or the oldest has waited SEGMENT_FLUSH_INTERVAL_SECONDS. All requests go
+through one keep-alive `requests.Session`. Failed batches (connection errors, 429, 5xx) are
+rescheduled with jittered exponential backoff and retried from the same loop between fresh
+batches, so one failing batch does not hold up the ones behind it. On shutdown, retries that
+are not due before the flush deadline are dropped (counted as segment.failed).
+"""
+import heapq
+import itertools
+import json
 import logging
-from typing import Any, Dict
-from app.services import task_queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
 from app.config import settings
+from app.services import metrics
 
 log = logging.getLogger('segment')
 
+# Segment rejects batch payloads over 500KB
+_MAX_BATCH_BYTES = 475_000
 
-def enqueue_track(event_name: str, user_id: int | None = None, properties: Dict[str, Any] | None = None):
-    """Enqueue a call to Segment (or a stub) using the app's background queue.
 
-    This uses the same in-process task queue by default. In production you may swap
-    to Celery or another worker system.
-    """
-    task_queue.enqueue(_send_track, event_name, user_id, properties or {})
+class SegmentBatcher:
+    def __init__(self, write_key: Optional[str], api_url: str = 'https://api.segment.io',
+                 batch_size: int = 100, flush_interval: float = 2.0, max_queue: int = 10000,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 timeout: float = 10.0):
+        self.write_key = write_key
+        self.url = api_url.rstrip('/') + '/v1/batch'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending: deque = deque()
+        self._oldest: Optional[float] = None
+        # (due_monotonic, seq, attempt, events)
+        self._retries: list = []
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._session = None
 
+    # -- producer side -------------------------------------------------------------------
 
-def _send_track(event_name: str, user_id: int | None, properties: Dict[str, Any]):
-    """Send an HTTP request to Segment HTTP API if configured; otherwise log a stub.
-    """
-    write_key = getattr(settings, 'SEGMENT_WRITE_KEY', None)
-    if not write_key:
-        log.info('Segment not configured; would send: %s %s %s', event_name, user_id, properties)
+    def track(self, event_name: str, user_id: int | None, properties: Dict[str, Any]) -> bool:
+        if not self.write_key:
+            log.debug('Segment not configured; would send: %s %s %s', event_name, user_id, properties)
+            return True
+        msg = {
+            'type': 'track',
+            'event': event_name,
+            'properties': properties,
+            'messageId': uuid.uuid4().hex,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }
+        if user_id is not None:
+            msg['userId'] = str(user_id)
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                metrics.incr('segment.dropped')
+                return False
+            if not self._pending:
+                # first event starts the age clock; wake the sender so it can arm its timer
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            self._pending.append(msg)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_thread()
         return True
 
-    try:
-        import requests
-        from requests.auth import HTTPBasicAuth
-    except Exception:
-        log.exception('requests library not available for Segment call')
-        return False
+    def flush(self, timeout: float = 10.0):
+        """Send everything accumulated now on the calling thread. Parked retries keep their
+        backoff: they are sent as they fall due within `timeout`, later ones stay parked."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                if now >= deadline:
+                    return
+                batch = self._take_batch()
+                retry = None
+                if not batch:
+                    if not self._retries or self._retries[0][0] > deadline:
+                        return
+                    if self._retries[0][0] > now:
+                        self._cond.wait(timeout=self._retries[0][0] - now)
+                        continue
+                    retry = heapq.heappop(self._retries)
+            if batch:
+                self._send(batch, attempt=0)
+            else:
+                self._send(retry[3], attempt=retry[2])
 
-    payload = {
-        'event': event_name,
-        'properties': properties,
-    }
-    if user_id is not None:
-        payload['userId'] = str(user_id)
-
-    try:
-        resp = requests.post('https://api.segment.io/v1/track', json=payload, auth=HTTPBasicAuth(write_key, ''))
-        if resp.status_code >= 200 and resp.status_code < 300:
-            log.info('Segment track sent: %s', event_name)
-            return True
+    def shutdown(self, timeout: float = 10.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=timeout)
+        self._thread = None
+        self.flush(timeout=timeout)
+        with self._cond:
+            dropped, self._retries = self._retries, []
+        if dropped:
+            # not due before the deadline; resending them now would just hammer a failing endpoint
+            n = sum(len(r[3]) for r in dropped)
+            log.warning('Dropping %s Segment events still waiting to be retried at shutdown', n)
+            metrics.incr('segment.failed', n)
+        self._stopping = False
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    # -- sender side ---------------------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name='segment-sender', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.monotonic()
+                    if len(self._pending) >= self.batch_size:
+                        break
+                    if self._pending and now - self._oldest >= self.flush_interval:
+                        break
+                    if self._retries and self._retries[0][0] <= now:
+                        break
+                    waits = []
+                    if self._pending:
+                        waits.append(self._oldest + self.flush_interval - now)
+                    if self._retries:
+                        waits.append(self._retries[0][0] - now)
+                    self._cond.wait(timeout=max(0.0, min(waits)) if waits else None)
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                retry = None
+                if self._retries and self._retries[0][0] <= now:
+                    retry = heapq.heappop(self._retries)
+                batch = None
+                if len(self._pending) >= self.batch_size or (self._pending and now - self._oldest >= self.flush_interval):
+                    batch = self._take_batch()
+            try:
+                if retry is not None:
+                    self._send(retry[3], attempt=retry[2])
+                if batch:
+                    self._send(batch, attempt=0)
+            except Exception:
+                log.exception('Segment sender error')
+
+    def _take_batch(self) -> List[dict]:
+        # caller holds self._cond
+        batch, size = [], 0
+        while self._pending and len(batch) < self.batch_size:
+            n = len(json.dumps(self._pending[0], default=str))
+            if batch and size + n > _MAX_BATCH_BYTES:
+                break
+            batch.append(self._pending.popleft())
+            size += n
+        self._oldest = time.monotonic() if self._pending else None
+        return batch
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            s.auth = (self.write_key, '')
+            s.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            s.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            self._session = s
+        return self._session
+
+    def _send(self, events: List[dict], attempt: int) -> bool:
+        retryable = True
+        try:
+            with metrics.timed('segment.post'):
+                resp = self._get_session().post(
+                    self.url,
+                    json={'batch': events, 'sentAt': datetime.now(timezone.utc).isoformat()},
+                    timeout=self.timeout,
+                )
+            if 200 <= resp.status_code < 300:
+                metrics.incr('segment.batches')
+                metrics.incr('segment.sent', len(events))
+                return True
+            retryable = resp.status_code == 429 or resp.status_code >= 500
+            log.error('Segment batch failed: %s %s', resp.status_code, resp.text[:200])
+        except Exception:
+            log.exception('Failed to call Segment')
+        if retryable and attempt < self.max_retries:
+            # full jitter: uniform(0, min(cap, base * 2**attempt))
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            metrics.incr('segment.retries')
+            with self._cond:
+                heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), attempt + 1, events))
+                self._cond.notify()
+            self._ensure_thread()
         else:
-            log.error('Segment track failed: %s %s', resp.status_code, resp.text)
-            return False
-    except Exception:
-        log.exception('Failed to call Segment')
+            metrics.incr('segment.failed', len(events))
         return False
+
+
+_batcher: Optional[SegmentBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> SegmentBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = SegmentBatcher(
+                    getattr(settings, 'SEGMENT_WRITE_KEY', None),
+                    api_url=getattr(settings, 'SEGMENT_API_URL', 'https://api.segment.io'),
+                    batch_size=getattr(settings, 'SEGMENT_BATCH_SIZE', 100),
+                    flush_interval=getattr(settings, 'SEGMENT_FLUSH_INTERVAL_SECONDS', 2.0),
+                    max_queue=getattr(settings, 'SEGMENT_QUEUE_MAX', 10000),
+                    max_retries=getattr(settings, 'SEGMENT_MAX_RETRIES', 5),
+                )
+    return _batcher
+
+
+def enqueue_track(event_name: str, user_id: int | None = None, properties: Dict[str, Any] | None = None):
+    """Queue a Segment track call; it is delivered with the next /v1/batch request."""
+    return get_batcher().track(event_name, user_id, properties or {})
+
+
+def flush(timeout: float = 10.0):
+    if _batcher is not None:
+        _batcher.flush(timeout=timeout)
+
+
+def shutdown(timeout: float = 10.0):
+    if _batcher is not None:
+        _batcher.shutdown(timeout=timeout)
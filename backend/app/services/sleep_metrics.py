@@ -0,0 +1,207 @@
+"""Sleep metrics behind /sleep/metrics and /sleep/metric.
+
+Each completed SleepEntry carries two derived columns, filled on write: its duration in seconds
+and its local bedtime as minutes after noon in the user's Profile.timezone. With those, every
+metric comes from a single aggregate statement over the user's (user_id, sleep_end) index:
+the latest night, 7/30/90-day average durations and counts (conditional aggregates over the
+90-day range), and the mean and mean square of bedtime over 30 days, from which the bedtime
+standard deviation (consistency) follows. Entries still missing the derived columns (written
+before they existed, or outside these helpers) are derived in memory for the read and stored by
+`backfill_job`, so reads never write.
+
+The summary is cached per worker and evicted by the sleep write helpers here; the TTL bounds how
+long a write handled by another worker, or a night sliding out of a window, can go unnoticed.
+"""
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.sleep_entry import SleepEntry
+from app.services import daily_rollup, metrics
+from app.utils.cache import MISSING, TTLCache
+
+log = logging.getLogger('sleep_metrics')
+
+WINDOWS = (7, 30, 90)
+BEDTIME_WINDOW_DAYS = 30
+
+_cache = TTLCache(
+    maxsize=getattr(settings, 'SLEEP_METRICS_CACHE_MAX_ENTRIES', 10000),
+    ttl_seconds=getattr(settings, 'SLEEP_METRICS_CACHE_TTL_SECONDS', 300),
+)
+
+
+def _aware(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def _derived(sleep_start: datetime, sleep_end: datetime, tz) -> Tuple[int, int]:
+    start = _aware(sleep_start)
+    duration = max(0, int((_aware(sleep_end) - start).total_seconds()))
+    local = start.astimezone(tz)
+    return duration, (local.hour * 60 + local.minute - 12 * 60) % (24 * 60)
+
+
+def derive(entry: SleepEntry, tz) -> None:
+    """Fill duration_seconds / bedtime_minutes for a completed entry."""
+    if entry.sleep_end is None:
+        entry.duration_seconds = entry.bedtime_minutes = None
+        return
+    entry.duration_seconds, entry.bedtime_minutes = _derived(entry.sleep_start, entry.sleep_end, tz)
+
+
+def _underived(db: Session, user_id: int, tz, since: datetime) -> list:
+    # rows written before the derived columns existed, or outside the helpers below; derived here
+    # for this read only (backfill_job stores them), so reads never write
+    rows = (
+        db.query(SleepEntry.sleep_start, SleepEntry.sleep_end)
+        .filter(SleepEntry.user_id == user_id, SleepEntry.sleep_end >= since,
+                SleepEntry.duration_seconds == None)  # noqa: E711
+    )
+    return [(_aware(end), *_derived(start, end, tz)) for start, end in rows]
+
+
+def backfill(db: Session, batch: int = 500) -> int:
+    """Store the derived columns of up to `batch` completed entries that lack them; returns how many."""
+    rows = (
+        db.query(SleepEntry)
+        .filter(SleepEntry.sleep_end != None, SleepEntry.duration_seconds == None)  # noqa: E711
+        .order_by(SleepEntry.user_id, SleepEntry.id)
+        .limit(batch)
+        .all()
+    )
+    zones: dict = {}
+    for r in rows:
+        if r.user_id not in zones:
+            zones[r.user_id] = daily_rollup.profile_timezone(db, r.user_id)
+        derive(r, zones[r.user_id])
+    db.commit()
+    for user_id in zones:
+        invalidate(user_id)
+    return len(rows)
+
+
+def backfill_job():
+    from app.main import SessionLocal
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            n = backfill(db)
+            total += n
+            if n == 0:
+                break
+        if total:
+            log.info('Filled derived sleep columns for %s entries', total)
+    except Exception:
+        log.exception('sleep backfill failed')
+    finally:
+        db.close()
+
+
+def _hours(seconds) -> Optional[float]:
+    return None if seconds is None else float(seconds) / 3600.0
+
+
+def _window(total_seconds, count, target_hours: float) -> dict:
+    if not count or total_seconds is None:
+        return {'hours': None, 'percent': None, 'count': 0}
+    hours = _hours(total_seconds / count)
+    return {
+        'hours': round(hours, 2),
+        'percent': int(min(100, round(hours / target_hours * 100))),
+        'count': int(count),
+    }
+
+
+def compute(db: Session, user_id: int, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    tz = daily_rollup.user_timezone(db, user_id)
+    target = float(getattr(settings, 'SLEEP_TARGET_HOURS', 8.0))
+    since = now - timedelta(days=max(WINDOWS))
+
+    done = and_(SleepEntry.user_id == user_id, SleepEntry.duration_seconds != None)  # noqa: E711
+    latest = db.query(SleepEntry.sleep_end, SleepEntry.duration_seconds).filter(done).order_by(SleepEntry.sleep_end.desc()).first()
+    cols = []
+    for days in WINDOWS:
+        within = SleepEntry.sleep_end >= now - timedelta(days=days)
+        cols.append(func.sum(case((within, SleepEntry.duration_seconds))).label(f'sum_{days}'))
+        cols.append(func.count(case((within, SleepEntry.id))).label(f'n_{days}'))
+    bed = SleepEntry.sleep_end >= now - timedelta(days=BEDTIME_WINDOW_DAYS)
+    cols += [
+        func.sum(case((bed, SleepEntry.bedtime_minutes))).label('bed_sum'),
+        func.sum(case((bed, SleepEntry.bedtime_minutes * SleepEntry.bedtime_minutes))).label('bed_sq'),
+        func.count(case((bed, SleepEntry.bedtime_minutes))).label('bed_n'),
+    ]
+    row = db.query(*cols).filter(done, SleepEntry.sleep_end >= since).one()
+    totals = {k: float(v or 0) for k, v in row._asdict().items()}
+
+    last = (_aware(latest[0]), latest[1]) if latest else None
+    for end, duration, bedtime in _underived(db, user_id, tz, since):
+        if last is None or end > last[0]:
+            last = (end, duration)
+        for days in WINDOWS:
+            if end >= now - timedelta(days=days):
+                totals[f'sum_{days}'] += duration
+                totals[f'n_{days}'] += 1
+        if end >= now - timedelta(days=BEDTIME_WINDOW_DAYS):
+            totals['bed_sum'] += bedtime
+            totals['bed_sq'] += bedtime * bedtime
+            totals['bed_n'] += 1
+
+    result = {
+        'target_hours': target,
+        'last': _window(last[1] if last else None, 1 if last else 0, target),
+    }
+    for days in WINDOWS:
+        result[f'{days}d'] = _window(totals[f'sum_{days}'], totals[f'n_{days}'], target)
+    stddev = None
+    n = totals['bed_n']
+    if n >= 2:
+        mean = totals['bed_sum'] / n
+        stddev = round(math.sqrt(max(0.0, totals['bed_sq'] / n - mean ** 2)), 1)
+    result['bedtime'] = {
+        'window_days': BEDTIME_WINDOW_DAYS,
+        'stddev_minutes': stddev,
+        'count': int(n),
+    }
+    return result
+
+
+def summary(db: Session, user_id: int) -> dict:
+    hit = _cache.get(user_id)
+    if hit is not MISSING:
+        metrics.incr('sleep_metrics.cache_hit')
+        return hit
+    metrics.incr('sleep_metrics.cache_miss')
+    result = compute(db, user_id)
+    _cache.set(user_id, result)
+    return result
+
+
+def invalidate(user_id: int):
+    _cache.pop(user_id)
+
+
+def add_entry(db: Session, user_id: int, sleep_start: datetime, sleep_end: Optional[datetime],
+              quality: Optional[str] = None) -> SleepEntry:
+    """Create a sleep entry with its derived columns, then commit."""
+    entry = SleepEntry(user_id=user_id, sleep_start=sleep_start, sleep_end=sleep_end, quality=quality)
+    tz = daily_rollup.user_timezone(db, user_id)
+    derive(entry, tz)
+    db.add(entry)
+    db.commit()
+    invalidate(user_id)
+    return entry
+
+
+def delete_entry(db: Session, entry: SleepEntry):
+    user_id = entry.user_id
+    db.delete(entry)
+    db.commit()
+    invalidate(user_id)
@@ -0,0 +1,182 @@
+"""Per-user changes feed behind GET /sync/changes.
+
+Every write to a user's moods, journals or symptoms takes the next numbers from the user's
+change sequence (`sync_state.seq`, bumped with a row-level UPDATE so concurrent writers for the
+same user commit in sequence order) and stores them in `sync_changes`, one row per entry: a later
+change to the same entry replaces the earlier row, and deletes leave a tombstone. A client keeps
+the last sequence it has seen and asks for `seq > since` over the (user_id, seq) index, so the
+work and bytes per sync follow the number of changed entries, not the size of the history.
+
+A user's feed is seeded from their existing rows the first time any of this is touched.
+Tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS are pruned by the retention job; a client
+whose token predates the pruned range is told to reset (drop local state and sync from 0).
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.journal_entry import JournalEntry
+from app.models.mood_entry import MoodEntry
+from app.models.symptom_entry import SymptomEntry
+from app.models.sync import SyncChange, SyncState
+from app.schemas.journal import JournalRead
+from app.schemas.mood import MoodRead
+from app.schemas.symptom import SymptomRead
+from app.services import metrics
+
+log = logging.getLogger('sync_changes')
+
+ENTITIES = {
+    'mood': (MoodEntry, MoodRead),
+    'journal': (JournalEntry, JournalRead),
+    'symptom': (SymptomEntry, SymptomRead),
+}
+
+_CHUNK = 500
+
+
+def _chunks(seq: list, size: int = _CHUNK):
+    for start in range(0, len(seq), size):
+        yield seq[start:start + size]
+
+
+def _seed(db: Session, user_id: int):
+    rows = []
+    for entity, (model, _) in ENTITIES.items():
+        for (entity_id,) in db.query(model.id).filter(model.user_id == user_id).order_by(model.id):
+            rows.append({'user_id': user_id, 'entity': entity, 'entity_id': entity_id,
+                         'seq': len(rows) + 1, 'op': 'upsert'})
+    db.add(SyncState(user_id=user_id, seq=len(rows), pruned_seq=0))
+    db.flush()
+    for chunk in _chunks(rows):
+        db.bulk_insert_mappings(SyncChange, chunk)
+    db.flush()
+    metrics.incr('sync.seeded')
+
+
+def _ensure(db: Session, user_id: int) -> bool:
+    """True if the user's feed already existed; otherwise seeds it from the current rows
+    (which include anything the caller has flushed) and returns False."""
+    if db.query(SyncState.user_id).filter(SyncState.user_id == user_id).first() is not None:
+        return True
+    try:
+        with db.begin_nested():
+            _seed(db, user_id)
+    except IntegrityError:
+        # seeded concurrently from rows that exclude our uncommitted change; record it normally
+        return True
+    return False
+
+
+def record(db: Session, user_id: int, entity: str, ids: Iterable[int], op: str = 'upsert'):
+    """Append changes for `ids` of one entity type. Call after flushing the change, before commit."""
+    ids = list(dict.fromkeys(ids))
+    if not ids or not _ensure(db, user_id):
+        return
+    db.execute(update(SyncState).where(SyncState.user_id == user_id).values(seq=SyncState.seq + len(ids)))
+    top = db.query(SyncState.seq).filter(SyncState.user_id == user_id).scalar()
+    first = top - len(ids) + 1
+    for chunk in _chunks(ids):
+        db.query(SyncChange).filter(
+            SyncChange.user_id == user_id, SyncChange.entity == entity, SyncChange.entity_id.in_(chunk)
+        ).delete(synchronize_session=False)
+    now = datetime.now(timezone.utc)
+    db.bulk_insert_mappings(SyncChange, [
+        {'user_id': user_id, 'entity': entity, 'entity_id': entity_id, 'seq': first + i, 'op': op, 'changed_at': now}
+        for i, entity_id in enumerate(ids)
+    ])
+
+
+def record_deleted_where(db: Session, entity: str, *criteria) -> int:
+    """Tombstone every row of `entity` matching `criteria` (bulk deletes). Call before deleting."""
+    model = ENTITIES[entity][0]
+    per_user: Dict[int, List[int]] = {}
+    for user_id, entity_id in db.query(model.user_id, model.id).filter(*criteria):
+        per_user.setdefault(user_id, []).append(entity_id)
+    for user_id, ids in per_user.items():
+        record(db, user_id, entity, ids, op='delete')
+    return sum(len(ids) for ids in per_user.values())
+
+
+def _serialize(db: Session, entity: str, ids: List[int]) -> Dict[int, dict]:
+    model, schema = ENTITIES[entity]
+    out: Dict[int, dict] = {}
+    for chunk in _chunks(ids):
+        for row in db.query(model).filter(model.id.in_(chunk)):
+            data = schema.model_validate(row).model_dump(mode='json')
+            if entity == 'journal':
+                # only the journals that changed are decrypted
+                from app.services.crypto import decrypt_from_storage
+                data['content'] = decrypt_from_storage(row.content, row.encryption_key, row.key_id, db)
+            out[row.id] = data
+    return out
+
+
+def changes(db: Session, user_id: int, since: int, limit: int) -> dict:
+    """Changes after `since`, oldest first, at most `limit` of them."""
+    if not _ensure(db, user_id):
+        db.commit()
+    pruned = db.query(SyncState.pruned_seq).filter(SyncState.user_id == user_id).scalar() or 0
+    if 0 < since < pruned:
+        metrics.incr('sync.reset')
+        return {'reset': True, 'changes': [], 'next': '0', 'has_more': False}
+    rows = (
+        db.query(SyncChange)
+        .filter(SyncChange.user_id == user_id, SyncChange.seq > since)
+        .order_by(SyncChange.seq.asc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    wanted: Dict[str, List[int]] = {}
+    for r in rows:
+        if r.op == 'upsert':
+            wanted.setdefault(r.entity, []).append(r.entity_id)
+    data = {entity: _serialize(db, entity, ids) for entity, ids in wanted.items()}
+    out = []
+    for r in rows:
+        item = {'seq': r.seq, 'entity': r.entity, 'id': r.entity_id, 'op': r.op, 'data': None}
+        if r.op == 'upsert':
+            item['data'] = data.get(r.entity, {}).get(r.entity_id)
+            if item['data'] is None:
+                # deleted after this change was read; its tombstone follows in a later sync
+                continue
+        out.append(item)
+    metrics.incr('sync.changes_served', len(out))
+    # the next token is the last sequence actually read, never the current head: a change that
+    # commits after the query above must still be picked up next time
+    return {'reset': False, 'changes': out, 'next': str(rows[-1].seq if rows else since), 'has_more': has_more}
+
+
+def prune_tombstones(db: Session, now: datetime = None) -> int:
+    """Drop tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS, remembering the pruned range."""
+    days = getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 90)
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=days)
+    old = (SyncChange.op == 'delete', SyncChange.changed_at < cutoff)
+    pruned = db.query(SyncChange.user_id, func.max(SyncChange.seq)).filter(*old).group_by(SyncChange.user_id).all()
+    for user_id, seq in pruned:
+        db.execute(
+            update(SyncState)
+            .where(SyncState.user_id == user_id, SyncState.pruned_seq < seq)
+            .values(pruned_seq=seq)
+        )
+    n = db.query(SyncChange).filter(*old).delete(synchronize_session=False)
+    return n or 0
+
+
+def delete_user(db: Session, user_id: int):
+    """Drop the user's changes but keep their sequence: the deletion takes the next number and
+    everything up to it counts as pruned, so every token issued before it gets a reset (the
+    deleted entries have no tombstones) and later writes continue above it."""
+    db.query(SyncChange).filter(SyncChange.user_id == user_id).delete(synchronize_session=False)
+    db.execute(
+        update(SyncState)
+        .where(SyncState.user_id == user_id)
+        .values(seq=SyncState.seq + 1, pruned_seq=SyncState.seq + 1)
+    )
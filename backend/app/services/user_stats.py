@@ -0,0 +1,254 @@
+"""Per-user running mood/symptom statistics behind /moods/analytics.
+
+`user_stats` keeps each user's mood count and score sum; `user_symptom_counts` keeps how often
+each symptom was logged. Writers update them with SQL-side increments in the same transaction as
+the row they add or delete, so the analytics endpoint reads two tiny rowsets instead of the
+user's whole history.
+
+A user's stats are built from their raw rows the first time they are touched (existing data needs
+no backfill step). `verify()` recomputes totals from the raw tables and adds any drift back, e.g.
+from rows changed outside these helpers; the retention scheduler runs it periodically.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.mood_entry import MoodEntry
+from app.models.symptom_entry import SymptomEntry
+from app.models.user_stats import UserStats, UserSymptomCount
+from app.services import etags, metrics
+
+log = logging.getLogger('user_stats')
+
+
+def _raw_moods(db: Session, user_ids: Iterable[int]) -> dict:
+    rows = (
+        db.query(MoodEntry.user_id, func.count(MoodEntry.id), func.coalesce(func.sum(MoodEntry.score), 0))
+        .filter(MoodEntry.user_id.in_(list(user_ids)))
+        .group_by(MoodEntry.user_id)
+    )
+    return {uid: (int(c), int(s)) for uid, c, s in rows}
+
+
+def _raw_symptoms(db: Session, user_ids: Iterable[int]) -> dict:
+    rows = (
+        db.query(SymptomEntry.user_id, SymptomEntry.symptom, func.count(SymptomEntry.id))
+        .filter(SymptomEntry.user_id.in_(list(user_ids)))
+        .group_by(SymptomEntry.user_id, SymptomEntry.symptom)
+    )
+    out: dict = {}
+    for uid, symptom, c in rows:
+        out.setdefault(uid, {})[symptom] = int(c)
+    return out
+
+
+def _write(db: Session, user_id: int, count: int, total: int, symptoms: dict):
+    stats = db.query(UserStats).get(user_id)
+    if stats is None:
+        db.add(UserStats(user_id=user_id, mood_count=count, mood_sum=total))
+    else:
+        stats.mood_count, stats.mood_sum = count, total
+    db.query(UserSymptomCount).filter(UserSymptomCount.user_id == user_id).delete(synchronize_session=False)
+    if symptoms:
+        db.bulk_insert_mappings(UserSymptomCount, [
+            {'user_id': user_id, 'symptom': s, 'count': c} for s, c in symptoms.items()
+        ])
+    db.flush()
+
+
+def _ensure(db: Session, user_id: int) -> bool:
+    """True if the user's stats already existed; otherwise builds them from raw rows (which
+    include anything the caller has flushed) and returns False."""
+    if db.query(UserStats.user_id).filter(UserStats.user_id == user_id).first() is not None:
+        return True
+    count, total = _raw_moods(db, [user_id]).get(user_id, (0, 0))
+    try:
+        with db.begin_nested():
+            _write(db, user_id, count, total, _raw_symptoms(db, [user_id]).get(user_id, {}))
+    except IntegrityError:
+        # a concurrent request initialized them first from the rows it could see, which do not
+        # include our uncommitted one; add ours through the normal increment path
+        return True
+    metrics.incr('user_stats.initialized')
+    return False
+
+
+def mood_added(db: Session, user_id: int, score: int):
+    """Account for a new mood entry. Call after flushing the entry, before commit."""
+    moods_added(db, user_id, [score])
+
+
+def moods_added(db: Session, user_id: int, scores: List[int]):
+    """Account for several new mood entries with one update. Call after inserting them, before commit."""
+    if not scores or not _ensure(db, user_id):
+        return
+    db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(mood_count=UserStats.mood_count + len(scores), mood_sum=UserStats.mood_sum + sum(scores),
+                updated_at=datetime.now(timezone.utc))
+    )
+
+
+def symptom_added(db: Session, user_id: int, symptom: str):
+    """Account for a new symptom entry. Call after flushing the entry, before commit."""
+    symptoms_added(db, user_id, {symptom: 1})
+
+
+def symptoms_added(db: Session, user_id: int, counts: Dict[str, int]):
+    """Account for new symptom entries, `counts` per symptom. Call after inserting them, before commit."""
+    if not counts or not _ensure(db, user_id):
+        return
+    for symptom, n in counts.items():
+        where = (UserSymptomCount.user_id == user_id, UserSymptomCount.symptom == symptom)
+        if db.execute(update(UserSymptomCount).where(*where).values(count=UserSymptomCount.count + n)).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(UserSymptomCount(user_id=user_id, symptom=symptom, count=n))
+        except IntegrityError:
+            db.execute(update(UserSymptomCount).where(*where).values(count=UserSymptomCount.count + n))
+
+
+def delete_moods(db: Session, *criteria) -> int:
+    """Delete the mood rows matching `criteria` and subtract them from their owners' totals."""
+    removed = (
+        db.query(MoodEntry.user_id, func.count(MoodEntry.id), func.coalesce(func.sum(MoodEntry.score), 0))
+        .filter(*criteria)
+        .group_by(MoodEntry.user_id)
+        .all()
+    )
+    n = db.query(MoodEntry).filter(*criteria).delete(synchronize_session=False)
+    for uid, c, s in removed:
+        etags.touch(db, uid, 'moods')
+        db.execute(
+            update(UserStats)
+            .where(UserStats.user_id == uid)
+            .values(mood_count=UserStats.mood_count - c, mood_sum=UserStats.mood_sum - s,
+                    updated_at=datetime.now(timezone.utc))
+        )
+    return n or 0
+
+
+def delete_symptoms(db: Session, *criteria) -> int:
+    """Delete the symptom rows matching `criteria` and subtract them from the per-symptom counts."""
+    removed = (
+        db.query(SymptomEntry.user_id, SymptomEntry.symptom, func.count(SymptomEntry.id))
+        .filter(*criteria)
+        .group_by(SymptomEntry.user_id, SymptomEntry.symptom)
+        .all()
+    )
+    n = db.query(SymptomEntry).filter(*criteria).delete(synchronize_session=False)
+    for uid, symptom, c in removed:
+        db.execute(
+            update(UserSymptomCount)
+            .where(UserSymptomCount.user_id == uid, UserSymptomCount.symptom == symptom)
+            .values(count=UserSymptomCount.count - c)
+        )
+    if removed:
+        db.query(UserSymptomCount).filter(UserSymptomCount.count <= 0).delete(synchronize_session=False)
+    return n or 0
+
+
+def summary(db: Session, user_id: int, top: int = 3) -> Tuple[Optional[float], int, List[str]]:
+    """(average mood, mood count, most common symptoms) for one user."""
+    if not _ensure(db, user_id):
+        db.commit()
+    stats = db.query(UserStats.mood_count, UserStats.mood_sum).filter(UserStats.user_id == user_id).one()
+    symptoms = [
+        s for (s,) in db.query(UserSymptomCount.symptom)
+        .filter(UserSymptomCount.user_id == user_id, UserSymptomCount.count > 0)
+        .order_by(UserSymptomCount.count.desc(), UserSymptomCount.symptom.asc())
+        .limit(top)
+    ]
+    count, total = stats
+    return (total / count if count else None), count, symptoms
+
+
+def _mood_drift(db: Session, user_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    # stored totals (negated) and raw totals in one statement, so both come from the same
+    # snapshot: a write committing between two separate reads would look like drift
+    stored = select(UserStats.user_id, -UserStats.mood_count, -UserStats.mood_sum).where(UserStats.user_id.in_(user_ids))
+    raw = (
+        select(MoodEntry.user_id, func.count(MoodEntry.id), func.coalesce(func.sum(MoodEntry.score), 0))
+        .where(MoodEntry.user_id.in_(user_ids))
+        .group_by(MoodEntry.user_id)
+    )
+    out: Dict[int, Tuple[int, int]] = {}
+    for uid, c, total in db.execute(union_all(stored, raw)):
+        dc, ds = out.get(uid, (0, 0))
+        out[uid] = (dc + int(c), ds + int(total))
+    return {uid: d for uid, d in out.items() if d != (0, 0)}
+
+
+def _symptom_drift(db: Session, user_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    stored = (
+        select(UserSymptomCount.user_id, UserSymptomCount.symptom, -UserSymptomCount.count)
+        .where(UserSymptomCount.user_id.in_(user_ids))
+    )
+    raw = (
+        select(SymptomEntry.user_id, SymptomEntry.symptom, func.count(SymptomEntry.id))
+        .where(SymptomEntry.user_id.in_(user_ids))
+        .group_by(SymptomEntry.user_id, SymptomEntry.symptom)
+    )
+    out: Dict[int, Dict[str, int]] = {}
+    for uid, symptom, c in db.execute(union_all(stored, raw)):
+        per_user = out.setdefault(uid, {})
+        per_user[symptom] = per_user.get(symptom, 0) + int(c)
+    drift = {uid: {sym: d for sym, d in per_user.items() if d} for uid, per_user in out.items()}
+    return {uid: d for uid, d in drift.items() if d}
+
+
+def verify(db: Session, batch_size: int = 500) -> int:
+    """Recompute every initialized user's stats from raw rows and repair mismatches.
+
+    Repairs are applied as increments (`count = count + drift`), like every other writer, so a
+    write that commits while a batch is being checked is neither lost nor counted twice.
+    Returns the number of users whose stored stats had drifted.
+    """
+    drifted = 0
+    after = None
+    while True:
+        q = db.query(UserStats.user_id).order_by(UserStats.user_id)
+        if after is not None:
+            q = q.filter(UserStats.user_id > after)
+        ids = [uid for (uid,) in q.limit(batch_size)]
+        if not ids:
+            break
+        after = ids[-1]
+        moods, symptoms = _mood_drift(db, ids), _symptom_drift(db, ids)
+        for uid in sorted(set(moods) | set(symptoms)):
+            log.warning('user_stats drift for user %s; repairing', uid)
+            dc, ds = moods.get(uid, (0, 0))
+            if dc or ds:
+                db.execute(
+                    update(UserStats)
+                    .where(UserStats.user_id == uid)
+                    .values(mood_count=UserStats.mood_count + dc, mood_sum=UserStats.mood_sum + ds,
+                            updated_at=datetime.now(timezone.utc))
+                )
+            symptoms_added(db, uid, symptoms.get(uid, {}))
+            drifted += 1
+        if symptoms:
+            db.query(UserSymptomCount).filter(
+                UserSymptomCount.user_id.in_(list(symptoms)), UserSymptomCount.count <= 0
+            ).delete(synchronize_session=False)
+        db.commit()
+    metrics.incr('user_stats.drift', drifted)
+    return drifted
+
+
+def verify_job():
+    from app.main import SessionLocal
+    db = SessionLocal()
+    try:
+        drifted = verify(db)
+        log.info('user_stats verification done; %s users repaired', drifted)
+    except Exception:
+        log.exception('user_stats verification failed')
+    finally:
+        db.close()
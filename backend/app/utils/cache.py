@@ -0,0 +1,95 @@
+"""Small thread-safe TTL + LRU cache used by per-worker lookup caches."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire `ttl_seconds` after they were set.
+
+    A ttl of 0 (or maxsize of 0) disables caching: `set` becomes a no-op and `get`
+    always misses, which lets callers keep one code path when a cache is turned off.
+
+    `on_evict(key, value)`, if given, is called (under the cache lock) for every entry that
+    leaves the cache: expired, pushed out by the size bound, replaced, popped or cleared.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 60.0,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._data: 'OrderedDict[Hashable, tuple[float, Any]]' = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.maxsize > 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        if not self.enabled:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires <= now:
+                del self._data[key]
+                self._evicted(key, value)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: float | None = None):
+        if not self.enabled:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            old = self._data.get(key)
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            if old is not None and old[1] is not value:
+                self._evicted(key, old[1])
+            while len(self._data) > self.maxsize:
+                evicted_key, (_, evicted) = self._data.popitem(last=False)
+                self._evicted(evicted_key, evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self._evicted(key, item[1])
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            items = list(self._data.items())
+            self._data.clear()
+            for key, (_, value) in items:
+                self._evicted(key, value)
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry now (they are otherwise only dropped when looked up)."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires, _) in self._data.items() if expires <= now]
+            for key in expired:
+                self._evicted(key, self._data.pop(key)[1])
+        return len(expired)
+
+    def _evicted(self, key: Hashable, value: Any):
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not MISSING
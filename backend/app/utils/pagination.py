@@ -0,0 +1,98 @@
+"""Keyset (cursor) pagination for per-user list endpoints.
+
+Lists are ordered newest first on (created_at, id). A page is fetched with
+`WHERE (ts, id) < (cursor_ts, cursor_id) ORDER BY ts DESC, id DESC LIMIT limit + 1`, which the
+composite (user_id, ts, id) indexes serve directly, so the cost of a page does not depend on how
+deep into the history it is. The extra row only tells whether another page exists. The timestamp
+columns used here are always set by their column defaults.
+
+The response body stays a plain JSON list. When more rows exist, the next page is advertised in
+an `X-Next-Cursor` header (an opaque token for `?cursor=`) and a `Link: <...>; rel="next"` header.
+`limit` defaults to PAGINATION_DEFAULT_LIMIT and is capped at PAGINATION_MAX_LIMIT.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Query, Request, Response
+from sqlalchemy import and_, or_
+
+from app.config import settings
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+class PageParams:
+    def __init__(self, cursor: Optional[str], limit: int, request: Optional[Request] = None,
+                 response: Optional[Response] = None):
+        self.cursor = cursor
+        self.after = decode_cursor(cursor) if cursor else None
+        self.limit = limit
+        self.request = request
+        self.response = response
+
+
+def page_params(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description='Opaque cursor from the X-Next-Cursor header of the previous page'),
+    limit: Optional[int] = Query(None, ge=1, description='Page size (capped at PAGINATION_MAX_LIMIT)'),
+) -> PageParams:
+    """FastAPI dependency for `?cursor=&limit=`."""
+    max_limit = getattr(settings, 'PAGINATION_MAX_LIMIT', 200)
+    limit = min(limit or getattr(settings, 'PAGINATION_DEFAULT_LIMIT', 50), max_limit)
+    return PageParams(cursor, limit, request, response)
+
+
+def keyset_criteria(ts_col, id_col, page: PageParams) -> list:
+    """WHERE criteria selecting rows strictly after the cursor in (ts DESC, id DESC) order."""
+    if page.after is None:
+        return []
+    ts, row_id = page.after
+    return [or_(ts_col < ts, and_(ts_col == ts, id_col < row_id))]
+
+
+def keyset_order(ts_col, id_col) -> tuple:
+    return ts_col.desc(), id_col.desc()
+
+
+def finish_page(rows: list, page: PageParams, ts_attr: str = 'created_at') -> List:
+    """Trim the look-ahead row and set the next-cursor headers; returns the page's rows."""
+    rows = list(rows)
+    if len(rows) <= page.limit:
+        return rows
+    rows = rows[:page.limit]
+    last = rows[-1]
+    token = encode_cursor(getattr(last, ts_attr), last.id)
+    if page.response is not None:
+        page.response.headers[NEXT_CURSOR_HEADER] = token
+        if page.request is not None:
+            url = page.request.url.include_query_params(cursor=token, limit=page.limit)
+            page.response.headers['Link'] = f'<{url}>; rel="next"'
+    return rows
+
+
+def paginate(query, ts_col, id_col, page: PageParams, ts_attr: str = 'created_at') -> List:
+    """Apply keyset pagination to an ORM query (newest first) and return one page of rows."""
+    rows = (
+        query.filter(*keyset_criteria(ts_col, id_col, page))
+        .order_by(*keyset_order(ts_col, id_col))
+        .limit(page.limit + 1)
+        .all()
+    )
+    return finish_page(rows, page, ts_attr)
@@ -0,0 +1,86 @@
+"""Compare analytics export formats: CSV vs Parquet vs NumPy .npz.
+
+Generates synthetic events into a temporary segmented log, exports them with each available
+format and prints file size, export time and the time to load the file back into columns
+(CSV rows are parsed including the props JSON, as analysts do today).
+
+Usage (from backend/):
+    python scripts/bench_analytics_export.py --events 500000
+"""
+import argparse
+import csv
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import analytics_columnar, analytics_export  # noqa: E402
+from app.services.analytics_log import SegmentedLog  # noqa: E402
+
+EVENTS = [
+    ('mood.create', lambda i: {'score': i % 10, 'source': random.choice(['app', 'widget'])}),
+    ('login', lambda i: {'method': random.choice(['password', 'otp'])}),
+    ('community.post', lambda i: {'group': f'g{i % 20}', 'post_id': i, 'anon': i % 3 == 0}),
+    ('community.comment', lambda i: {'post_id': i // 3, 'comment_id': i, 'anon': False}),
+]
+
+
+def _generate(alog: SegmentedLog, n: int):
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    chunk = []
+    for i in range(n):
+        name, props = random.choice(EVENTS)
+        ts = (base + timedelta(seconds=i)).isoformat()
+        chunk.append(json.dumps({'event_type': name, 'user_id': random.randint(1, 5000), 'props': props(i), 'created_at': ts}) + '\n')
+        if len(chunk) == 100_000 or i == n - 1:
+            alog.append(chunk, json.loads(chunk[0])['created_at'], ts)
+            chunk = []
+
+
+def _load_csv(path: str) -> int:
+    with open(path, newline='', encoding='utf-8') as fh:
+        reader = csv.reader(fh)
+        next(reader)
+        return sum(1 for r in reader if json.loads(r[3]) is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=200_000)
+    args = parser.parse_args()
+    formats = ['npz'] + (['parquet'] if analytics_columnar.available_format() == 'parquet' else [])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        alog = SegmentedLog(Path(tmp) / 'log', max_bytes=10**10, max_age_seconds=0)
+        _generate(alog, args.events)
+        analytics_export.get_log = lambda: alog
+        analytics_export.flush_analytics = lambda: None
+
+        results = []
+        started = time.perf_counter()
+        path = analytics_export.export_to_csv(str(Path(tmp) / 'events.csv'))
+        export_s = time.perf_counter() - started
+        started = time.perf_counter()
+        _load_csv(path)
+        results.append(('csv', Path(path).stat().st_size, export_s, time.perf_counter() - started))
+        for fmt in formats:
+            started = time.perf_counter()
+            path = analytics_export.export_columnar(str(Path(tmp) / 'events'), fmt=fmt)
+            export_s = time.perf_counter() - started
+            started = time.perf_counter()
+            analytics_columnar.load(path)
+            results.append((fmt, Path(path).stat().st_size, export_s, time.perf_counter() - started))
+
+    print(f'{args.events} events')
+    print(f'{"format":<8} {"size MB":>9} {"export s":>9} {"load ms":>9}')
+    for fmt, size, export_s, load_s in results:
+        print(f'{fmt:<8} {size / 1e6:>9.2f} {export_s:>9.2f} {load_s * 1000:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
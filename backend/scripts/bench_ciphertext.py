@@ -0,0 +1,84 @@
+"""Compare journal-content ciphers: Fernet vs the versioned AES-256-GCM format.
+
+Encrypts and decrypts random journal-sized texts with a 32-byte data key through
+envelope_crypto (as the journal endpoints do) and prints throughput and stored size per
+format. 'fernet (rebuilt)' builds the Fernet object on every call, as before cipher objects
+were cached.
+
+Usage (from backend/):
+    python scripts/bench_ciphertext.py --sizes 200,2000,20000 --seconds 1
+"""
+import argparse
+import base64
+import os
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services import envelope_crypto  # noqa: E402
+
+
+def _rebuilt(key: bytes):
+    def encrypt(text):
+        return Fernet(base64.urlsafe_b64encode(key)).encrypt(text.encode('utf-8')).decode('utf-8')
+
+    def decrypt(value):
+        return Fernet(base64.urlsafe_b64encode(key)).decrypt(value.encode('utf-8')).decode('utf-8')
+    return encrypt, decrypt
+
+
+def _cached(key: bytes, version: int):
+    def encrypt(text):
+        settings.CIPHERTEXT_VERSION = version
+        return envelope_crypto.encrypt_with_data_key(text, key)
+
+    def decrypt(value):
+        return envelope_crypto.decrypt_with_data_key(value, key)
+    return encrypt, decrypt
+
+
+def _rate(fn, args, seconds: float) -> float:
+    ops, started = 0, time.perf_counter()
+    while True:
+        for a in args:
+            fn(a)
+        ops += len(args)
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='200,2000,20000', help='plaintext sizes in characters')
+    parser.add_argument('--seconds', type=float, default=1.0, help='time per measurement')
+    args = parser.parse_args()
+    key = os.urandom(32)
+    ciphers = [
+        ('fernet (rebuilt)', _rebuilt(key)),
+        ('fernet', _cached(key, 0)),
+        ('aes-256-gcm', _cached(key, 1)),
+    ]
+
+    print(f'{"format":<17} {"size":>6} {"stored":>7} {"overhead":>9} {"enc ops/s":>10} {"dec ops/s":>10} {"enc MB/s":>9} {"dec MB/s":>9}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        texts = [''.join(random.choices(string.ascii_letters + ' ', k=size)) for _ in range(16)]
+        for name, (encrypt, decrypt) in ciphers:
+            values = [encrypt(t) for t in texts]
+            assert [decrypt(v) for v in values] == texts
+            stored = sum(len(v) for v in values) / len(values)
+            enc = _rate(encrypt, texts, args.seconds)
+            dec = _rate(decrypt, values, args.seconds)
+            print(f'{name:<17} {size:>6} {stored:>7.0f} {stored - size:>9.0f} {enc:>10.0f} {dec:>10.0f} '
+                  f'{enc * size / 1e6:>9.1f} {dec * size / 1e6:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measure Segment delivery throughput through SegmentBatcher against a local stand-in.
+
+Starts a keep-alive HTTP server that accepts /v1/batch like api.segment.io (the stand-in from
+tests/test_segment_batch.py, plus an optional per-request delay for network latency), tracks
+--events events through a SegmentBatcher per batch size and prints delivered events/sec, the
+number of requests and events per request. Batch size 1 approximates one request per event.
+
+Usage (from backend/):
+    python scripts/bench_segment_batch.py --events 20000 --batch-sizes 1,20,100 --latency-ms 20
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import metrics  # noqa: E402
+from app.services.segment import SegmentBatcher  # noqa: E402
+
+
+class _SegmentStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for api.segment.io that counts /v1/batch payloads."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        with srv.lock:
+            srv.requests += 1
+            srv.events += len(json.loads(body)['batch'])
+            srv.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(latency: float):
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _SegmentStandIn)
+    srv.lock = threading.Lock()
+    srv.latency = latency
+    srv.events, srv.requests, srv.connections = 0, 0, set()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f'http://127.0.0.1:{srv.server_address[1]}'
+
+
+def _run(n: int, batch_size: int, flush_interval: float, latency: float):
+    srv, url = _serve(latency)
+    b = SegmentBatcher('bench', api_url=url, batch_size=batch_size, flush_interval=flush_interval,
+                       max_queue=n, timeout=30.0)
+    metrics.reset()
+    started = time.perf_counter()
+    for i in range(n):
+        b.track('mood.create', i % 5000, {'score': i % 10, 'source': 'app'})
+    b.shutdown(timeout=600)
+    elapsed = time.perf_counter() - started
+    srv.shutdown()
+    srv.server_close()
+    return srv.events, srv.requests, len(srv.connections), elapsed, metrics.counter_value('segment.failed')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--batch-sizes', default='1,20,100', help='SegmentBatcher batch_size values')
+    parser.add_argument('--flush-interval', type=float, default=0.05, help='seconds')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='stand-in delay per request')
+    args = parser.parse_args()
+
+    print(f'{"batch":>6} {"events":>8} {"requests":>9} {"ev/request":>11} {"conns":>6} {"failed":>7} {"seconds":>8} {"events/s":>10}')
+    for size in (int(s) for s in args.batch_sizes.split(',')):
+        sent, requests, conns, elapsed, failed = _run(args.events, size, args.flush_interval, args.latency_ms / 1000)
+        per_request = sent / requests if requests else 0.0
+        print(f'{size:>6} {sent:>8} {requests:>9} {per_request:>11.1f} {conns:>6} {failed:>7} {elapsed:>8.2f} {sent / elapsed:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
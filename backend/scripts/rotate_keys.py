@@ -4,6 +4,9 @@ Usage (dry-run):
     python scripts/rotate_keys.py --kms-key-id <KMS_KEY_ID>
 
 To apply changes use --commit. Use --batch to control items processed per loop.
+
+With --data-keys, only the per-user data keys (user_data_keys) are re-wrapped under the new
+KMS key; journal rows that reference them are left as they are.
 """
 import argparse
 import logging
@@ -31,6 +34,7 @@ def main():
     parser.add_argument('--loops', type=int, default=0, help='Number of loops to run (0 = run until no more changed)')
     parser.add_argument('--db-url', help='Optional DATABASE_URL to use for this run (overrides env)')
     parser.add_argument('--yes', action='store_true', help="Required to actually apply changes with --commit (safety flag)")
+    parser.add_argument('--data-keys', action='store_true', help='Re-wrap the per-user data keys instead of re-encrypting journal rows')
 
     args = parser.parse_args()
 
@@ -51,6 +55,20 @@ def main():
         log.error('Refusing to run in commit mode without --yes confirmation. Re-run with --yes to apply changes.')
         sys.exit(3)
 
+    if args.data_keys:
+        from app.main import SessionLocal
+        from app.services.data_keys import rewrap_all
+        db = SessionLocal()
+        try:
+            changed = rewrap_all(db, args.kms_key_id, batch=args.batch, commit=args.commit)
+        finally:
+            db.close()
+        if args.commit:
+            log.info('Re-wrapped %s data keys', changed)
+        else:
+            log.info('Dry-run complete. Data keys that would be re-wrapped: %s', changed)
+        return
+
     while True:
         loop += 1
         log.info('Running rotation loop %s (batch=%s)', loop, args.batch)
@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 # Ensure tests use a file-backed SQLite DB so tables persist across connections
 # Force this to avoid hitting a local Postgres instance during test runs
 os.environ['DATABASE_URL'] = 'sqlite:///./test_db.sqlite3'
@@ -24,3 +26,61 @@ def pytest_configure(config):
     except Exception:
         pass
     Base.metadata.create_all(bind=engine)
+
+
+class LocalKMS:
+    """In-process stand-in for a boto3 KMS client: wraps data keys with AES-GCM under a random
+    master key (bound to the KeyId, which the blob records) and counts the calls made to it.
+    The master key is shared by all instances, like one KMS across the whole test run."""
+
+    _master_key = None
+
+    def __init__(self):
+        import os
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        if LocalKMS._master_key is None:
+            LocalKMS._master_key = AESGCM.generate_key(bit_length=256)
+        self._master = AESGCM(LocalKMS._master_key)
+        self._urandom = os.urandom
+        self.calls = {'generate_data_key': 0, 'decrypt': 0, 're_encrypt': 0}
+
+    def _wrap(self, key_id: str, plaintext: bytes) -> bytes:
+        kid = key_id.encode()
+        nonce = self._urandom(12)
+        return bytes([len(kid)]) + kid + nonce + self._master.encrypt(nonce, plaintext, kid)
+
+    def _unwrap(self, blob: bytes):
+        kid = blob[1:1 + blob[0]]
+        rest = blob[1 + blob[0]:]
+        return kid.decode(), self._master.decrypt(rest[:12], rest[12:], kid)
+
+    def generate_data_key(self, KeyId, KeySpec='AES_256'):
+        self.calls['generate_data_key'] += 1
+        plaintext = self._urandom(32)
+        return {'KeyId': KeyId, 'Plaintext': plaintext, 'CiphertextBlob': self._wrap(KeyId, plaintext)}
+
+    def decrypt(self, CiphertextBlob):
+        self.calls['decrypt'] += 1
+        key_id, plaintext = self._unwrap(CiphertextBlob)
+        return {'KeyId': key_id, 'Plaintext': plaintext}
+
+    def re_encrypt(self, CiphertextBlob, DestinationKeyId):
+        self.calls['re_encrypt'] += 1
+        _, plaintext = self._unwrap(CiphertextBlob)
+        return {'KeyId': DestinationKeyId, 'CiphertextBlob': self._wrap(DestinationKeyId, plaintext)}
+
+
+@pytest.fixture
+def local_kms(monkeypatch):
+    """Route envelope encryption through a LocalKMS (with KMS_KEY_ID set) and start from empty
+    data-key caches."""
+    from app.config import settings
+    from app.services import data_keys, envelope_crypto
+    kms = LocalKMS()
+    monkeypatch.setattr(envelope_crypto, '_get_kms_client', lambda: kms)
+    monkeypatch.setattr(settings, 'KMS_KEY_ID', 'local-test-key', raising=False)
+    envelope_crypto.clear_data_keys()
+    data_keys.clear()
+    yield kms
+    envelope_crypto.clear_data_keys()
+    data_keys.clear()
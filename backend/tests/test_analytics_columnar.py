@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.services import analytics_columnar
+
+np = pytest.importorskip('numpy')
+
+
+def _lines(n):
+    out = []
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            ev, props = 'mood.create', {'score': i % 10, 'source': 'app'}
+        elif kind == 1:
+            ev, props = 'login', {'method': 'password'}
+        elif kind == 2:
+            ev, props = 'community.post', {'group': 'g1', 'post_id': i, 'anon': bool(i % 3)}
+        else:
+            ev, props = 'custom.thing', {'whatever': i}
+        out.append(json.dumps({
+            'event_type': ev, 'user_id': None if i == 5 else i % 500, 'props': props,
+            'created_at': f'2025-01-01T00:{(i // 60) % 60:02d}:{i % 60:02d}+00:00',
+        }) + '\n')
+    return out
+
+
+@pytest.mark.parametrize('fmt', ['npz', 'parquet'])
+def test_round_trip_with_typed_columns(tmp_path, fmt):
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    path = analytics_columnar.write(_lines(8), tmp_path / 'events.out', fmt=fmt)
+    assert path.suffix == '.' + fmt
+    cols = analytics_columnar.load(path)
+
+    assert list(cols['event_type'][:4]) == ['mood.create', 'login', 'community.post', 'custom.thing']
+    assert cols['created_at'].dtype == np.int64
+    assert cols['created_at'][1] - cols['created_at'][0] == 1_000_000
+    assert cols['props.score'][4] == 4
+    assert bool(cols['props.anon'][2]) is True
+    assert json.loads(cols['props_extra'][3]) == {'whatever': 3}
+    if fmt == 'npz':
+        assert cols['user_id.valid'].sum() == 7 and cols['user_id'][5] == -1
+        assert cols['props.score'].dtype == np.int64 and not cols['props.score.valid'][1]
+    else:
+        assert np.isnan(cols['user_id'][5])
+
+
+def test_same_rows_as_csv_in_a_fraction_of_the_size(tmp_path, monkeypatch):
+    import csv
+
+    from app.services import analytics_export
+    from app.services.analytics_log import SegmentedLog
+
+    alog = SegmentedLog(tmp_path / 'log', max_bytes=10**9, max_age_seconds=0)
+    lines = _lines(50_000)
+    alog.append(lines, '2025-01-01T00:00:00+00:00', '2025-01-01T00:59:59+00:00')
+    monkeypatch.setattr(analytics_export, 'get_log', lambda: alog)
+    monkeypatch.setattr(analytics_export, 'flush_analytics', lambda: None)
+    monkeypatch.setattr(analytics_export, '_analytics_file', tmp_path / 'legacy.jsonl')
+
+    csv_path = analytics_export.export_to_csv(str(tmp_path / 'events.csv'))
+    col_path = analytics_export.export_columnar(str(tmp_path / 'events.csv'))
+    assert col_path.endswith(('.parquet', '.npz'))
+
+    with open(csv_path, newline='', encoding='utf-8') as fh:
+        rows = [(r[0], r[1], r[2], json.loads(r[3])) for r in list(csv.reader(fh))[1:]]
+    cols = analytics_columnar.load(col_path)
+
+    assert len(rows) == len(cols['event_type']) == 50_000
+    csv_size, col_size = Path(csv_path).stat().st_size, Path(col_path).stat().st_size
+    assert col_size * 3 < csv_size
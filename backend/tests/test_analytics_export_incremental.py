@@ -0,0 +1,75 @@
+import csv
+import gzip
+import json
+
+from app.services import analytics_export
+from app.services.analytics_log import SegmentedLog
+
+TS = '2025-01-01T00:00:00+00:00'
+
+
+def _append(alog, n, chunk=1000):
+    line = json.dumps({'event_type': 'login', 'user_id': 1, 'props': {}, 'created_at': TS}) + '\n'
+    while n > 0:
+        k = min(chunk, n)
+        alog.append([line] * k, TS, TS)
+        n -= k
+
+
+def _setup(tmp_path, monkeypatch):
+    alog = SegmentedLog(tmp_path / 'log', max_bytes=10**9, max_age_seconds=0)
+    monkeypatch.setattr(analytics_export, 'get_log', lambda: alog)
+    monkeypatch.setattr(analytics_export, 'flush_analytics', lambda: None)
+    monkeypatch.setattr(analytics_export, '_analytics_file', tmp_path / 'legacy.jsonl')
+    opened = []
+    real_open = alog._open_segment
+    monkeypatch.setattr(alog, '_open_segment', lambda seg: opened.append(seg['lines']) or real_open(seg))
+    return alog, opened, tmp_path / 'export.checkpoint.json'
+
+
+def _rows(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        return list(csv.reader(fh))[1:]
+
+
+def test_per_run_work_stays_flat_as_history_grows(tmp_path, monkeypatch):
+    alog, opened, ckpt = _setup(tmp_path, monkeypatch)
+    per_run = []
+    for _ in range(3):
+        # a large backlog that earlier runs already shipped...
+        _append(alog, 5000)
+        alog.seal_active()
+        analytics_export.save_checkpoint(alog.total_lines, ckpt)
+        # ...after which a run only touches what arrived since
+        _append(alog, 10)
+        opened.clear()
+        res = analytics_export.export_incremental(str(tmp_path / 'out'), ckpt)
+        analytics_export.save_checkpoint(res['to_offset'], ckpt)
+        # events exported, segments opened, lines in them
+        per_run.append((res['events'], len(opened), sum(opened)))
+
+    assert alog.total_lines == 15_030
+    assert per_run == [(10, 1, 10)] * 3
+    assert analytics_export.load_checkpoint(ckpt) == alog.total_lines
+    assert analytics_export.export_incremental(str(tmp_path / 'out'), ckpt) is None
+
+
+def test_checkpoint_only_moves_when_saved(tmp_path, monkeypatch):
+    alog, _, ckpt = _setup(tmp_path, monkeypatch)
+    _append(alog, 10)
+    first = analytics_export.export_incremental(str(tmp_path / 'out'), ckpt)
+    assert (first['from_offset'], first['to_offset'], first['events']) == (0, 10, 10)
+    assert first['path'].endswith('_0-10.csv.gz')
+    assert len(_rows(first['path'])) == 10
+
+    # e.g. the upload failed: the next run covers the same events plus the new ones
+    _append(alog, 5)
+    retry = analytics_export.export_incremental(str(tmp_path / 'out'), ckpt)
+    assert (retry['from_offset'], retry['to_offset']) == (0, 15)
+
+    analytics_export.save_checkpoint(retry['to_offset'], ckpt)
+    assert json.loads(ckpt.read_text())['offset'] == 15
+    _append(alog, 3)
+    nxt = analytics_export.export_incremental(str(tmp_path / 'out'), ckpt)
+    assert (nxt['from_offset'], nxt['to_offset'], nxt['events']) == (15, 18, 3)
+    assert [r[0] for r in _rows(nxt['path'])] == ['login'] * 3
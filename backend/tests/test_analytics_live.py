@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import analytics_live
+
+
+def test_sliding_window_counts_per_second_and_expires_old_buckets():
+    c = analytics_live.SlidingWindowCounter(window_seconds=5)
+    for _ in range(3):
+        c.incr('login', now=100.2)
+    c.incr('mood.create', now=100.9)
+    c.incr('login', now=101.5)
+    snap = c.snapshot(now=102.0)
+    assert snap['ts'] == 101
+    assert snap['counts'] == {'login': 1}
+    assert snap['window'] == {'login': 4, 'mood.create': 1}
+    # second 100 falls out of a 5s window ending at 105; its ring slot is reused by 105
+    c.incr('signup', now=105.1)
+    assert c.snapshot(now=106.0)['window'] == {'login': 1, 'signup': 1}
+    assert c.snapshot(now=106.0)['counts'] == {'signup': 1}
+
+
+def test_one_snapshot_is_shared_by_all_subscribers():
+    counter = analytics_live.SlidingWindowCounter(window_seconds=10)
+    b = analytics_live.LiveBroadcaster(counter, interval=0.05)
+    calls = []
+    real = counter.snapshot
+    counter.snapshot = lambda: calls.append(1) or real()
+
+    async def run():
+        queues = [b.subscribe() for _ in range(50)]
+        counter.incr('login')
+        payloads = [await asyncio.wait_for(q.get(), 1) for q in queues]
+        for q in queues:
+            b.unsubscribe(q)
+        await asyncio.sleep(0.1)
+        return payloads
+
+    payloads = asyncio.run(run())
+    assert len(set(payloads)) == 1
+    assert len(calls) <= 2
+    assert 'window' in json.loads(payloads[0])
+    assert b.subscribers == 0 and b._task is None
+
+
+def test_stream_requires_admin():
+    client = TestClient(app)
+    assert client.get('/admin/analytics/stream').status_code in (401, 403)
+
+
+def test_stream_emits_sse_counts_events(monkeypatch):
+    from app.controllers.admin import stream_admin_analytics
+
+    counter = analytics_live.SlidingWindowCounter(window_seconds=10)
+    monkeypatch.setattr(analytics_live, '_counter', counter)
+    monkeypatch.setattr(analytics_live, '_broadcaster', analytics_live.LiveBroadcaster(counter, interval=0.05))
+
+    class _Request:
+        async def is_disconnected(self):
+            return False
+
+    async def run():
+        resp = await stream_admin_analytics(_Request(), None)
+        assert resp.media_type == 'text/event-stream'
+        it = resp.body_iterator
+        chunks = [await it.__anext__(), await asyncio.wait_for(it.__anext__(), 1)]
+        await it.aclose()
+        return chunks
+
+    retry, event = asyncio.run(run())
+    assert retry.startswith('retry:')
+    assert event.startswith('event: counts\ndata: ') and event.endswith('\n\n')
+    assert json.loads(event.split('data: ', 1)[1])['window_seconds'] == 10
+    assert analytics_live.get_broadcaster().subscribers == 0
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.services.analytics_log import SegmentedLog
+
+BASE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _append_hours(alog, hours, per_hour=10):
+    for h in hours:
+        ts = [(BASE + timedelta(hours=h, minutes=m)).isoformat() for m in range(per_hour)]
+        lines = [json.dumps({'event_type': 'login', 'user_id': h, 'props': {}, 'created_at': t}) + '\n' for t in ts]
+        alog.append(lines, ts[0], ts[-1])
+
+
+def test_rotates_by_size_and_compresses_sealed_segments(tmp_path):
+    alog = SegmentedLog(tmp_path, max_bytes=1500, max_age_seconds=0)
+    _append_hours(alog, range(6))
+    segs = alog.segments()
+    assert len(segs) > 1
+    assert all(s['sealed'] and s['name'].endswith('.gz') for s in segs[:-1])
+    assert not segs[-1]['sealed']
+    # contiguous global line offsets
+    for prev, nxt in zip(segs, segs[1:]):
+        assert nxt['start_line'] == prev['start_line'] + prev['lines']
+    assert alog.total_lines == 60
+    assert sorted(p.name for p in tmp_path.glob('seg-*')) == sorted(s['name'] for s in segs)
+    assert len(list(alog.read_lines())) == 60
+
+
+def test_window_reads_only_overlapping_segments(tmp_path, monkeypatch):
+    alog = SegmentedLog(tmp_path, max_bytes=10**9, max_age_seconds=0)
+    for h in range(5):
+        _append_hours(alog, [h])
+        alog.seal_active()
+    opened = []
+    real_open = alog._open_segment
+    monkeypatch.setattr(alog, '_open_segment', lambda seg: opened.append(seg['seq']) or real_open(seg))
+
+    start, end = BASE + timedelta(hours=2), BASE + timedelta(hours=3, minutes=4)
+    lines = list(alog.read_lines(start, end))
+    assert len(opened) == 2
+    assert len(lines) == 15
+    assert all(start <= datetime.fromisoformat(json.loads(l)['created_at']) <= end for l in lines)
+
+
+def test_iter_from_offset_and_adopting_a_legacy_file(tmp_path):
+    legacy = tmp_path / 'analytics.jsonl'
+    legacy.write_text('{"event_type":"signup","user_id":1,"props":{},"created_at":"2020-01-01T00:00:00+00:00"}\n')
+    alog = SegmentedLog(tmp_path / 'log', max_bytes=10**9, max_age_seconds=0)
+    alog.adopt(legacy)
+    assert not legacy.exists()
+    _append_hours(alog, [0, 1])
+
+    rows = list(alog.iter_from(15))
+    assert [off for off, _ in rows] == list(range(15, 21))
+    assert json.loads(list(alog.iter_from(0))[0][1])['event_type'] == 'signup'
+    assert alog.select(end=BASE - timedelta(days=1))[0]['seq'] == 1
+
+
+def test_rotates_by_age(tmp_path, monkeypatch):
+    alog = SegmentedLog(tmp_path, max_bytes=10**9, max_age_seconds=60)
+    _append_hours(alog, [0])
+    import app.services.analytics_log as mod
+    now = mod.time.time()
+    monkeypatch.setattr(mod.time, 'time', lambda: now + 120)
+    _append_hours(alog, [1])
+    segs = alog.segments()
+    assert [s['sealed'] for s in segs] == [True, False]
+
+
+def test_earlier_batch_lowers_first_ts(tmp_path):
+    alog = SegmentedLog(tmp_path, max_bytes=10**9, max_age_seconds=0)
+    _append_hours(alog, [3])
+    _append_hours(alog, [1])
+    (seg,) = alog.segments()
+    assert seg['first_ts'] == BASE.replace(hour=1).isoformat()
+    assert seg['last_ts'] == BASE.replace(hour=3, minute=9).isoformat()
+
+
+def test_appends_rewrite_only_the_small_manifest(tmp_path):
+    alog = SegmentedLog(tmp_path, max_bytes=10**9, max_age_seconds=0)
+    sizes = []
+    for h in range(20):
+        _append_hours(alog, [h])
+        alog.seal_active()
+        _append_hours(alog, [h])
+        sizes.append((tmp_path / 'manifest.json').stat().st_size)
+    # sealed segments live in sealed.jsonl, so the manifest does not grow with them
+    assert max(sizes) - min(sizes) < 50
+    assert [s['sealed'] for s in alog.segments()] == [True] * 20 + [False]
+    assert alog.total_lines == 400 and len(list(alog.read_lines())) == 400
+
+
+def test_single_file_manifest_is_migrated(tmp_path):
+    alog = SegmentedLog(tmp_path, max_bytes=10**9, max_age_seconds=0)
+    _append_hours(alog, [0])
+    alog.seal_active()
+    _append_hours(alog, [1])
+    segs = alog.segments()
+    # the format before sealed.jsonl: every segment in manifest.json
+    (tmp_path / 'sealed.jsonl').unlink()
+    (tmp_path / 'manifest.json').write_text(json.dumps({'next_seq': 3, 'total_lines': 20, 'segments': segs}))
+    assert alog.segments() == segs
+
+    _append_hours(alog, [2])
+    assert [s['lines'] for s in alog.segments()] == [10, 20]
+    assert 'segments' not in json.loads((tmp_path / 'manifest.json').read_text())
+    assert len(list(alog.read_lines())) == 30
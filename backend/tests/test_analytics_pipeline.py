@@ -0,0 +1,72 @@
+import os
+import queue
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import SessionLocal
+from app.models.analytics import AnalyticsEvent
+from app.services import analytics, metrics
+from app.services.analytics_log import get_log
+
+
+def _count(event_type):
+    db = SessionLocal()
+    try:
+        return db.query(AnalyticsEvent).filter(AnalyticsEvent.event_type == event_type).count()
+    finally:
+        db.close()
+
+
+def test_events_are_buffered_then_written_in_one_batch(monkeypatch):
+    # keep the background flusher out of the way so the batch boundaries are deterministic
+    monkeypatch.setattr(analytics, '_ensure_flusher', lambda: None)
+    analytics.flush()
+    metrics.reset()
+
+    for i in range(5):
+        assert analytics.record_event('mood.create', user_id=900 + i, props={'score': i}) is not None
+    before = _count('mood.create')
+    # nothing written on the request path
+    assert metrics.counter_value('analytics.flushed') == 0
+    analytics.flush()
+    assert _count('mood.create') == before + 5
+    assert metrics.counter_value('analytics.enqueued') == 5
+    assert metrics.counter_value('analytics.flushed') == 5
+    assert metrics.snapshot()['timers']['analytics.flush']['count'] == 1
+
+    lines = list(get_log().read_lines())
+    assert sum('"user_id": 904' in line for line in lines) >= 1
+
+
+def test_full_queue_drops_and_counts(monkeypatch):
+    monkeypatch.setattr(analytics, '_ensure_flusher', lambda: None)
+    monkeypatch.setattr(analytics, '_queue', queue.Queue(maxsize=2))
+    metrics.reset()
+
+    results = [analytics.record_event('login', user_id=1, props={'method': 'password'}) for _ in range(3)]
+    assert results[2] is None
+    assert metrics.counter_value('analytics.dropped') == 1
+    analytics.flush()
+    assert metrics.counter_value('analytics.flushed') == 2
+
+
+def test_shutdown_flushes_pending_events(monkeypatch):
+    monkeypatch.setattr(analytics, '_ensure_flusher', lambda: None)
+    before = _count('community.post')
+    analytics.record_event('community.post', user_id=7, props={'group': 'g', 'post_id': 1, 'anon': False})
+    analytics.shutdown()
+    assert _count('community.post') == before + 1
+
+
+def test_invalid_events_are_dropped_at_flush(monkeypatch):
+    monkeypatch.setattr(analytics, '_ensure_flusher', lambda: None)
+    analytics.flush()
+    metrics.reset()
+    before = _count('crisis.detected')
+    analytics.record_event('crisis.detected', user_id=3, props={'match': 'no severity'})
+    ev = analytics.record_event('crisis.detected', user_id=3, props={'severity': 'low', 'match': 'mail me x@y.com'})
+    analytics.flush()
+    assert metrics.counter_value('analytics.invalid') == 1
+    assert _count('crisis.detected') == before + 1
+    # scrubbed in place by the flusher
+    assert ev['props']['match'] == '<REDACTED_EMAIL>'
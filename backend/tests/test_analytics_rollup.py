@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+from app.main import SessionLocal
+from app.models.analytics import AnalyticsEvent, AnalyticsHourlyRollup, AnalyticsRollupState
+from app.services import analytics_rollup
+
+TYPES = ('rollup.a', 'rollup.b')
+
+
+def _fresh_db():
+    db = SessionLocal()
+    db.query(AnalyticsRollupState).delete()
+    db.query(AnalyticsHourlyRollup).delete()
+    db.query(AnalyticsEvent).filter(AnalyticsEvent.event_type.in_(TYPES)).delete(synchronize_session=False)
+    db.commit()
+    return db
+
+
+def _insert(db, when_list):
+    rows = [{'event_type': TYPES[i % 2], 'user_id': i, 'props': {}, 'created_at': when} for i, when in enumerate(when_list)]
+    db.execute(AnalyticsEvent.__table__.insert().values(rows))
+    db.commit()
+
+
+def _mine(summary):
+    return {k: v for k, v in summary['by_type'].items() if k in TYPES}
+
+
+def test_summary_matches_raw_counts_and_reads_rollups_for_closed_hours():
+    db = _fresh_db()
+    try:
+        now = datetime.now(timezone.utc)
+        when = [now - timedelta(hours=h, minutes=7 * i) for h in range(1, 100) for i in range(h % 4)]
+        when += [now - timedelta(days=10)]  # outside the window
+        current = analytics_rollup._hour_floor(now)
+        _insert(db, when + [current, current])
+
+        while analytics_rollup.compact(db, now=now):
+            pass
+        wm = analytics_rollup.watermark(db)
+        assert analytics_rollup._hour_floor(now) - timedelta(hours=1) <= wm <= analytics_rollup._hour_floor(now)
+
+        start = analytics_rollup._hour_floor(now - timedelta(days=3))
+        expected = {t: 0 for t in TYPES}
+        for i, w in enumerate(when + [current, current]):
+            if w >= start:
+                expected[TYPES[i % 2]] += 1
+        got = analytics_rollup.summary(db, days=3, now=now)
+        assert _mine(got) == expected
+        assert sum(d['count'] for d in got['daily']) >= sum(expected.values())
+
+        # closed hours come from the rollups: dropping their raw rows changes nothing
+        db.query(AnalyticsEvent).filter(
+            AnalyticsEvent.event_type.in_(TYPES), AnalyticsEvent.created_at < wm
+        ).delete(synchronize_session=False)
+        db.commit()
+        assert _mine(analytics_rollup.summary(db, days=3, now=now)) == expected
+
+        # the partial hour is counted live
+        _insert(db, [now])
+        again = _mine(analytics_rollup.summary(db, days=3, now=now))
+        assert sum(again.values()) == sum(expected.values()) + 1
+    finally:
+        db.close()
+
+
+def test_compaction_is_bounded_per_run_and_resumes():
+    db = _fresh_db()
+    try:
+        now = datetime.now(timezone.utc)
+        _insert(db, [now - timedelta(hours=300), now - timedelta(hours=2)])
+        from app.config import settings
+        limit = getattr(settings, 'ANALYTICS_ROLLUP_MAX_HOURS_PER_RUN', 168)
+        assert analytics_rollup.compact(db, now=now) == limit
+        assert analytics_rollup.compact(db, now=now) > 0
+        total = db.query(AnalyticsHourlyRollup).filter(AnalyticsHourlyRollup.event_type.in_(TYPES)).count()
+        assert total == 2
+        assert _mine(analytics_rollup.summary(db, days=30, now=now)) == {'rollup.a': 1, 'rollup.b': 1}
+    finally:
+        db.close()
+
+
+def test_late_rows_are_added_to_hours_already_rolled_up():
+    db = _fresh_db()
+    try:
+        now = datetime.now(timezone.utc)
+        _insert(db, [now - timedelta(hours=5), now - timedelta(hours=3)])
+        while analytics_rollup.compact(db, now=now):
+            pass
+        assert _mine(analytics_rollup.summary(db, days=1, now=now)) == {'rollup.a': 1, 'rollup.b': 1}
+
+        # e.g. a Segment retry or a held-back buffer flush, dated well behind the watermark
+        _insert(db, [now - timedelta(hours=5), now - timedelta(hours=4), now - timedelta(hours=5)])
+        assert _mine(analytics_rollup.summary(db, days=1, now=now)) == {'rollup.a': 1, 'rollup.b': 1}
+        assert analytics_rollup.compact(db, now=now) == 0
+        assert _mine(analytics_rollup.summary(db, days=1, now=now)) == {'rollup.a': 3, 'rollup.b': 2}
+        hours = db.query(AnalyticsHourlyRollup.hour).filter(AnalyticsHourlyRollup.event_type.in_(TYPES)).distinct().count()
+        assert hours == 3
+
+        # counted once: nothing new means nothing added
+        analytics_rollup.compact(db, now=now)
+        assert _mine(analytics_rollup.summary(db, days=1, now=now)) == {'rollup.a': 3, 'rollup.b': 2}
+    finally:
+        db.close()
+
+
+
+def test_summary_without_compaction_counts_the_window_in_a_few_statements():
+    from sqlalchemy import event
+    db = _fresh_db()
+    try:
+        now = datetime.now(timezone.utc)
+        when = [now - timedelta(hours=h, minutes=5) for h in (0, 1, 30, 200, 700)]
+        _insert(db, when + [now - timedelta(days=40)])
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        engine = db.get_bind()
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            got = analytics_rollup.summary(db, days=30, now=now)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        assert analytics_rollup.watermark(db) is None
+        assert len(statements) <= 3
+        assert _mine(got) == {'rollup.a': 3, 'rollup.b': 2}
+        days = {d['day'] for d in got['daily']}
+        assert {w.date().isoformat() for w in when} <= days
+    finally:
+        db.close()
@@ -14,3 +14,23 @@ def test_scrub_email_and_phone():
     # contact is not allowed for signup so it's dropped
     assert 'contact' not in cleaned
 
+
+
+def test_compiled_validators_match_the_per_event_path():
+    from app.services.analytics_schema import validate_batch
+
+    events = [
+        ('mood.create', {'score': 3, 'source': 'call me on +1 (555) 010-2030'}),
+        ('mood.create', {'source': 'app'}),
+        ('community.post', {'group': 'g', 'post_id': 9, 'anon': True, 'junk': 1}),
+        ('crisis.detected', {'severity': 'high', 'match': 'x' * 300}),
+        ('signup', {'method': 'reach me at a.b@example.org'}),
+        ('brand.new', {'note': '123-45'}),
+    ]
+    batch = validate_batch(events)
+    assert batch == [validate_and_scrub(t, p) for t, p in events]
+    assert batch[0][1]['source'] == '<REDACTED_PHONE>'
+    assert batch[1] == (False, {'source': 'app'}, 'missing required prop: score')
+    assert batch[3][1]['match'] == 'x' * 200 + '...'
+    assert batch[4][1]['method'] == '<REDACTED_EMAIL>'
+    assert batch[5] == (True, {'note': '123-45'}, None)
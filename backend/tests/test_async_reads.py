@@ -0,0 +1,51 @@
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app
+from app.async_db import async_database_url
+from app.controllers import async_reads
+
+client = TestClient(app)
+
+# the async handlers mounted on their own app so the sync ones stay reachable for comparison
+async_app = FastAPI()
+async_app.include_router(async_reads.router, prefix='/api')
+async_client = TestClient(async_app)
+
+
+def test_async_database_url_swaps_driver():
+    assert async_database_url('sqlite:///./mh.db') == 'sqlite+aiosqlite:///./mh.db'
+    assert async_database_url('postgresql://u:p@db/soul') == 'postgresql+asyncpg://u:p@db/soul'
+    assert async_database_url('postgresql+psycopg2://u:p@db/soul') == 'postgresql+asyncpg://u:p@db/soul'
+
+
+def test_async_handlers_match_sync_handlers():
+    email, pw = 'async_reads@example.com', 'pw'
+    assert client.post('/api/auth/signup', json={'email': email, 'password': pw}).status_code == 200
+    token = client.post('/api/auth/token', data={'username': email, 'password': pw}).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    for score in (3, 7):
+        assert client.post('/api/moods', json={'score': score, 'note': 'n'}, headers=headers).status_code == 200
+    assert client.post('/api/journals', json={'title': 't', 'content': 'secret text'}, headers=headers).status_code == 200
+    assert client.post('/api/streaks/record', headers=headers).status_code == 200
+    # create the profile up front so both handlers see the same row
+    client.get('/api/profile', headers=headers)
+
+    for path in ('/moods', '/journals', '/points', '/streaks', '/profile', '/consent/current'):
+        sync_r = client.get(f'/api{path}', headers=headers)
+        async_r = async_client.get(f'/api{path}', headers=headers)
+        assert async_r.status_code == sync_r.status_code == 200, path
+        assert async_r.json() == sync_r.json(), path
+
+    journals = async_client.get('/api/journals', headers=headers).json()
+    assert journals[0]['content'] == 'secret text'
+    assert async_client.get('/api/consent/current').json()['user_state'] is None
+
+
+def test_async_handlers_reject_bad_token():
+    r = async_client.get('/api/moods', headers={'Authorization': 'Bearer nope'})
+    assert r.status_code == 401
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.main import SessionLocal, app
+from app.models.journal_entry import JournalEntry
+from app.services import user_stats
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def test_mood_batch_is_idempotent_with_per_item_results():
+    headers = _login('batch-moods@example.com')
+    earlier = (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()
+    items = [{'client_id': f'm-{i}', 'score': 1 + i % 10, 'created_at': earlier} for i in range(300)]
+    items += [
+        {'client_id': 'm-0', 'score': 5},            # repeat inside the batch
+        {'client_id': 'bad', 'score': 'high'},       # invalid item
+        {'score': 4},                                # no idempotency key
+        {'client_id': 'future', 'score': 4, 'created_at': (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()},
+    ]
+    r = client.post('/api/moods/batch', json={'items': items}, headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert (body['created'], body['duplicates'], body['errors']) == (300, 1, 3)
+    results = body['results']
+    assert [x['index'] for x in results] == list(range(len(items)))
+    assert results[300]['status'] == 'duplicate' and results[300]['id'] == results[0]['id']
+    assert results[301]['error'].startswith('score') and results[302]['error'].startswith('client_id')
+    assert results[303]['error'] == 'created_at is in the future'
+    assert len({x['id'] for x in results[:300]}) == 300
+
+    # replaying the whole queue creates nothing new
+    again = client.post('/api/moods/batch', json={'items': items[:300]}, headers=headers).json()
+    assert (again['created'], again['duplicates']) == (0, 300)
+    assert [x['id'] for x in again['results']] == [x['id'] for x in results[:300]]
+
+    analytics = client.get('/api/moods/analytics', headers=headers).json()
+    assert analytics['entries_count'] == 300
+    daily = client.get('/api/moods/analytics/daily', headers=headers).json()['daily']
+    assert sum(d['count'] for d in daily) == 300
+
+
+def test_journal_and_symptom_batches():
+    headers = _login('batch-journals@example.com')
+    items = [{'client_id': f'j-{i}', 'title': f't{i}', 'content': f'entry {i}', 'entry_date': '2025-02-01', 'progress': 10 * i}
+             for i in range(1, 6)]
+    body = client.post('/api/journals/batch', json={'items': items}, headers=headers).json()
+    assert body['created'] == 5
+    listed = client.get('/api/journals', headers=headers).json()
+    assert sorted(j['content'] for j in listed) == sorted(i['content'] for i in items)
+    db = SessionLocal()
+    try:
+        row = db.query(JournalEntry).filter(JournalEntry.id == body['results'][0]['id']).one()
+        assert row.client_id == 'j-1'
+    finally:
+        db.close()
+    summary = client.get('/api/journals/summary?start=2025-02-01&end=2025-02-02', headers=headers).json()['daily']
+    assert summary == [{'day': '2025-02-01', 'avg_progress': 30.0, 'count': 5}]
+
+    sym = [{'client_id': f's-{i}', 'symptom': 'fatigue' if i % 3 else 'anxiety', 'severity': 3} for i in range(9)]
+    body = client.post('/api/symptoms/batch', json={'items': sym}, headers=headers).json()
+    assert body['created'] == 9
+    uid = listed[0]['user_id']
+    db = SessionLocal()
+    try:
+        assert user_stats.summary(db, uid)[2] == ['fatigue', 'anxiety']
+    finally:
+        db.close()
+
+
+def test_batch_size_is_capped(monkeypatch):
+    from app.config import settings
+    headers = _login('batch-cap@example.com')
+    monkeypatch.setattr(settings, 'BATCH_MAX_ITEMS', 2, raising=False)
+    r = client.post('/api/symptoms/batch', json={'items': [{'client_id': str(i), 'symptom': 'x'} for i in range(3)]}, headers=headers)
+    assert r.status_code == 413
+
+
+def test_single_and_batch_journals_default_to_the_same_local_day():
+    import zoneinfo
+    from datetime import date
+    headers = _login('batch-entry-date@example.com')
+    # UTC+14 and UTC-11 span 25 hours, so one of them is always on a different day than the server
+    tz = next(z for z in ('Pacific/Kiritimati', 'Pacific/Pago_Pago')
+              if datetime.now(zoneinfo.ZoneInfo(z)).date() != date.today())
+    assert client.patch('/api/profile', json={'timezone': tz}, headers=headers).status_code == 200
+    client.post('/api/journals', json={'title': 'one', 'content': 'single'}, headers=headers)
+    client.post('/api/journals/batch', json={'items': [{'client_id': 'b1', 'title': 'two', 'content': 'batched'}]}, headers=headers)
+
+    local = datetime.now(zoneinfo.ZoneInfo(tz)).date().isoformat()
+    r = client.get(f'/api/journals?date={local}', headers=headers)
+    assert sorted(j['title'] for j in r.json()) == ['one', 'two']
+
+
+def test_batch_created_at_with_an_offset_is_stored_as_utc():
+    headers = _login('batch-offset@example.com')
+    r = client.post('/api/moods/batch', json={'items': [{'client_id': 'tz', 'score': 5, 'created_at': '2026-01-10T02:00:00+05:30'}]}, headers=headers)
+    assert r.json()['created'] == 1
+    (mood,) = client.get('/api/moods', headers=headers).json()
+    stamp = datetime.fromisoformat(mood['created_at'])
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    assert stamp == datetime(2026, 1, 9, 20, 30, tzinfo=timezone.utc)
+    # the mood lands on the UTC day it was stored under, in the incremental rollup too
+    daily = client.get('/api/moods/analytics/daily?start=2026-01-08T00:00:00&end=2026-01-11T00:00:00', headers=headers).json()['daily']
+    assert [d['day'] for d in daily] == ['2026-01-09']
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from cryptography.fernet import Fernet
+from fastapi.testclient import TestClient
+
+from app.config import Settings, settings
+from app.main import SessionLocal, app
+from app.models.journal_entry import JournalEntry
+from app.services import ciphertext as sealed
+from app.services.crypto import decrypt_text, encrypt_text
+from app.services.envelope_crypto import decrypt_with_data_key, encrypt_for_kms, encrypt_with_data_key
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def sealing(monkeypatch):
+    monkeypatch.setattr(settings, 'CIPHERTEXT_VERSION', 1)
+
+
+@pytest.fixture
+def local_key(monkeypatch):
+    key = Fernet.generate_key().decode()
+    monkeypatch.setattr(settings, 'DATA_ENCRYPTION_KEY', key)
+    monkeypatch.setattr(settings, 'KMS_KEY_ID', None)
+    return key
+
+
+def test_new_values_are_sealed_with_aes_gcm_and_smaller(local_key):
+    text = 'slept badly, long walk helped'
+    value = encrypt_text(text)
+    assert sealed.version(value) == sealed.AES_GCM
+    assert decrypt_text(value) == text
+    legacy = Fernet(local_key.encode()).encrypt(text.encode()).decode()
+    assert len(value) < len(legacy)
+    # random nonce: equal plaintexts do not give equal values
+    assert encrypt_text(text) != value
+
+
+def test_legacy_and_foreign_values_are_still_read(local_key, local_kms):
+    text = 'an older entry'
+    assert decrypt_text(Fernet(local_key.encode()).encrypt(text.encode()).decode()) == text
+
+    ct, ek = encrypt_for_kms(text, 'local-test-key')
+    assert sealed.version(ct) == sealed.AES_GCM
+    assert decrypt_text(json.dumps({'ct': ct, 'ek': ek})) == text
+
+    for plain in ('A quiet day', 'AQAB and more', '{"not": "an envelope"}', ''):
+        assert decrypt_text(plain) == plain
+
+
+def test_tampered_values_are_rejected(local_key):
+    value = encrypt_text('do not change me')
+    flipped = value[:-2] + ('A' if value[-2] != 'A' else 'B') + value[-1]
+    assert decrypt_text(flipped) == flipped
+    key = b'k' * 32
+    assert decrypt_with_data_key(encrypt_with_data_key('x', key), b'j' * 32) != 'x'
+
+
+def test_legacy_format_is_written_by_default(local_key, monkeypatch):
+    assert Settings().CIPHERTEXT_VERSION == 0
+    monkeypatch.setattr(settings, 'CIPHERTEXT_VERSION', 0)
+    value = encrypt_text('rolling deploy')
+    assert value.startswith('gAAAAA') and sealed.version(value) is None
+    monkeypatch.setattr(settings, 'CIPHERTEXT_VERSION', 1)
+    assert decrypt_text(value) == 'rolling deploy'
+
+
+def test_cipher_objects_are_cached_per_key():
+    key = b'c' * 32
+    assert sealed._aead(key) is sealed._aead(key)
+    assert sealed._aead(key) is not sealed._aead(b'd' * 32)
+
+
+def test_journals_mix_formats_transparently(local_kms, monkeypatch):
+    client.post('/api/auth/signup', json={'email': 'cipher-mix@example.com', 'password': 'testpass'})
+    token = client.post('/api/auth/token', data={'username': 'cipher-mix@example.com', 'password': 'testpass'}).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    monkeypatch.setattr(settings, 'CIPHERTEXT_VERSION', 0)
+    old = client.post('/api/journals', json={'title': 't', 'content': 'written as fernet'}, headers=headers).json()
+    monkeypatch.setattr(settings, 'CIPHERTEXT_VERSION', 1)
+    new = client.post('/api/journals', json={'title': 't', 'content': 'written sealed'}, headers=headers).json()
+
+    db = SessionLocal()
+    try:
+        stored = {j.id: j.content for j in db.query(JournalEntry).filter(JournalEntry.id.in_([old['id'], new['id']]))}
+    finally:
+        db.close()
+    assert stored[old['id']].startswith('gAAAAA')
+    assert sealed.version(stored[new['id']]) == sealed.AES_GCM
+    listed = sorted(j['content'] for j in client.get('/api/journals', headers=headers).json())
+    assert listed == ['written as fernet', 'written sealed']
@@ -0,0 +1,152 @@
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.main import SessionLocal, app
+from app.models.daily_rollup import UserDailyRollup
+from app.models.mood_entry import MoodEntry
+from app.services import daily_rollup
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def test_endpoints_read_rollups_maintained_on_write():
+    headers = _login('rollup-daily@example.com')
+    for s in (3, 7):
+        assert client.post('/api/moods', json={'score': s}, headers=headers).status_code == 200
+    r = client.post('/api/journals', json={'title': 't', 'content': 'c', 'entry_date': '2025-01-05', 'progress': 40}, headers=headers)
+    assert r.status_code == 200
+    jid = r.json()['id']
+    client.post('/api/journals', json={'title': 't2', 'content': 'c', 'entry_date': '2025-01-05', 'progress': 80}, headers=headers)
+
+    daily = client.get('/api/moods/analytics/daily', headers=headers).json()['daily']
+    assert [(d['average'], d['count']) for d in daily] == [(5.0, 2)]
+
+    summary = client.get('/api/journals/summary?start=2025-01-01&end=2025-01-31', headers=headers).json()['daily']
+    assert summary == [{'day': '2025-01-05', 'avg_progress': 60.0, 'count': 2}]
+
+    # update moves the progress, delete removes it
+    client.put(f'/api/journals/{jid}', json={'title': 't', 'content': 'c', 'entry_date': '2025-01-06', 'progress': 10}, headers=headers)
+    summary = client.get('/api/journals/summary?start=2025-01-01&end=2025-01-31', headers=headers).json()['daily']
+    assert [(d['day'], d['avg_progress']) for d in summary] == [('2025-01-05', 80.0), ('2025-01-06', 10.0)]
+    assert client.delete(f'/api/journals/{jid}', headers=headers).status_code == 200
+    summary = client.get('/api/journals/summary?start=2025-01-01&end=2025-01-31', headers=headers).json()['daily']
+    assert [d['day'] for d in summary] == ['2025-01-05']
+
+
+def test_days_follow_profile_timezone_and_rebuild_on_change():
+    headers = _login('rollup-tz@example.com')
+    me = client.get('/api/profile', headers=headers).json()
+    uid = me['user_id']
+    db = SessionLocal()
+    try:
+        # 23:30 UTC on Jan 1 is already Jan 2 in Tokyo
+        late = datetime(2025, 1, 1, 23, 30, tzinfo=timezone.utc)
+        db.add(MoodEntry(user_id=uid, score=4, created_at=late))
+        db.commit()
+    finally:
+        db.close()
+    q = '?start=2024-12-30T00:00:00&end=2025-01-03T00:00:00'
+    assert [d['day'] for d in client.get('/api/moods/analytics/daily' + q, headers=headers).json()['daily']] == ['2025-01-01']
+
+    assert client.patch('/api/profile', json={'timezone': 'Asia/Tokyo'}, headers=headers).status_code == 200
+    assert [d['day'] for d in client.get('/api/moods/analytics/daily' + q, headers=headers).json()['daily']] == ['2025-01-02']
+
+    db = SessionLocal()
+    try:
+        row = db.query(UserDailyRollup).filter(UserDailyRollup.user_id == uid, UserDailyRollup.day == date(2025, 1, 2)).one()
+        assert (row.mood_sum, row.mood_count) == (4, 1)
+        # a new mood entry lands in the same local day
+        m = MoodEntry(user_id=uid, score=6, created_at=late + timedelta(hours=1))
+        db.add(m)
+        db.flush()
+        daily_rollup.mood_added(db, uid, m.created_at, m.score)
+        db.commit()
+        db.refresh(row)
+        assert (row.mood_sum, row.mood_count) == (10, 2)
+    finally:
+        db.close()
+
+
+def test_reads_never_write_and_stale_users_are_rebuilt_by_the_job():
+    from app.models.daily_rollup import UserRollupState
+    headers = _login('rollup-readonly@example.com')
+    uid = client.get('/api/profile', headers=headers).json()['user_id']
+    db = SessionLocal()
+    try:
+        db.add(MoodEntry(user_id=uid, score=6, created_at=datetime(2025, 3, 1, 12, tzinfo=timezone.utc)))
+        db.commit()
+    finally:
+        db.close()
+
+    def state():
+        db = SessionLocal()
+        try:
+            return db.query(UserRollupState.timezone).filter(UserRollupState.user_id == uid).scalar()
+        finally:
+            db.close()
+
+    # nothing built yet: served from the raw rows, and still nothing stored afterwards
+    q = '?start=2025-02-28T00:00:00&end=2025-03-02T00:00:00'
+    daily = client.get('/api/moods/analytics/daily' + q, headers=headers).json()['daily']
+    assert [(d['day'], d['count']) for d in daily] == [('2025-03-01', 1)]
+    assert state() is None
+
+    db = SessionLocal()
+    try:
+        while daily_rollup.rebuild_stale(db):
+            pass
+    finally:
+        db.close()
+    assert state() == 'UTC'
+    assert client.get('/api/moods/analytics/daily' + q, headers=headers).json()['daily'] == daily
+
+
+def test_retention_subtracts_the_purged_rows_from_their_days(monkeypatch):
+    from app.config import settings
+    from app.models.journal_entry import JournalEntry
+    from app.services.retention import purge_old_data
+    headers = _login('rollup-retention@example.com')
+    uid = client.get('/api/profile', headers=headers).json()['user_id']
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=30)
+    db = SessionLocal()
+    try:
+        db.add_all([
+            # either side of the cutoff, possibly on the same day
+            MoodEntry(user_id=uid, score=2, created_at=cutoff - timedelta(minutes=5)),
+            MoodEntry(user_id=uid, score=8, created_at=cutoff + timedelta(minutes=5)),
+            MoodEntry(user_id=uid, score=5, created_at=now - timedelta(days=90)),
+            # an old row filed under a recent day: bucketed by its entry_date
+            JournalEntry(user_id=uid, title='t', content='c', progress=30, entry_date=now.date(),
+                         created_at=now - timedelta(days=60)),
+            JournalEntry(user_id=uid, title='t', content='c', progress=90, entry_date=now.date()),
+        ])
+        db.commit()
+        daily_rollup.refresh(db, uid)
+        db.commit()
+    finally:
+        db.close()
+
+    monkeypatch.setattr(settings, 'DATA_RETENTION_DAYS', 30, raising=False)
+    purge_old_data()
+
+    db = SessionLocal()
+    try:
+        stored = {
+            r.day: tuple(getattr(r, f) for f in daily_rollup._FIELDS)
+            for r in db.query(UserDailyRollup).filter(UserDailyRollup.user_id == uid)
+        }
+        rebuilt = {d: tuple(v[f] for f in daily_rollup._FIELDS)
+                   for d, v in daily_rollup._recompute(db, uid, timezone.utc).items()}
+    finally:
+        db.close()
+    assert stored == rebuilt
+    assert stored[now.date()][2:] == (90, 1)
@@ -0,0 +1,84 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import envelope_crypto, metrics
+from app.services.envelope_crypto import decrypt_from_kms, encrypt_for_kms
+from app.utils.cache import TTLCache
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def test_each_wrapped_key_is_unwrapped_once(local_kms):
+    sealed = [encrypt_for_kms(f'entry {i}', 'local-test-key') for i in range(5)]
+    assert local_kms.calls['generate_data_key'] == 5
+    # keys generated here are primed in the cache
+    assert [decrypt_from_kms(ct, ek) for ct, ek in sealed] == [f'entry {i}' for i in range(5)]
+    assert local_kms.calls['decrypt'] == 0
+
+    envelope_crypto.clear_data_keys()
+    metrics.reset()
+    for _ in range(3):
+        assert [decrypt_from_kms(ct, ek) for ct, ek in sealed] == [f'entry {i}' for i in range(5)]
+    assert local_kms.calls['decrypt'] == 5
+    counters = metrics.snapshot()['counters']
+    assert counters['kms.data_key_cache_miss'] == 5
+    assert counters['kms.data_key_cache_hit'] == 10
+
+
+def test_listing_journals_reuses_unwrapped_keys(local_kms):
+    headers = _login('dek-cache@example.com')
+    for i in range(4):
+        r = client.post('/api/journals', json={'title': f't{i}', 'content': f'private {i}'}, headers=headers)
+        assert r.status_code == 200 and r.json()['content'] == f'private {i}'
+    envelope_crypto.clear_data_keys()
+    before = local_kms.calls['decrypt']
+
+    first = client.get('/api/journals', headers=headers).json()
+    assert sorted(j['content'] for j in first) == [f'private {i}' for i in range(4)]
+    # all four rows use the user's one data key
+    assert local_kms.calls['decrypt'] - before == 1
+    second = client.get('/api/journals', headers=headers).json()
+    assert second == first
+    assert local_kms.calls['decrypt'] - before == 1
+
+
+def test_evicted_keys_are_zeroed(local_kms, monkeypatch):
+    small = TTLCache(maxsize=1, ttl_seconds=300, on_evict=envelope_crypto._zero)
+    monkeypatch.setattr(envelope_crypto, '_data_keys', small)
+    ct1, ek1 = encrypt_for_kms('one', 'local-test-key')
+    (_, held), = small._data.values()
+    assert any(held)
+    encrypt_for_kms('two', 'local-test-key')
+    # pushed out by the size bound
+    assert held == bytearray(32)
+    # and transparently unwrapped again when needed
+    assert decrypt_from_kms(ct1, ek1) == 'one'
+    assert local_kms.calls['decrypt'] == 1
+
+    (_, held), = small._data.values()
+    small.set(next(iter(small._data)), held, ttl_seconds=0.001)
+    time.sleep(0.01)
+    # expired keys are zeroed by the periodic sweep even if never looked up again
+    small.purge_expired()
+    assert held == bytearray(32) and len(small) == 0
+
+
+def test_kms_client_is_built_once(monkeypatch):
+    built = []
+    monkeypatch.setattr(envelope_crypto, '_build_kms_client', lambda: built.append(1) or object())
+    envelope_crypto.reset_kms_client()
+    try:
+        first = envelope_crypto._get_kms_client()
+        assert envelope_crypto._get_kms_client() is first
+        assert len(built) == 1
+    finally:
+        envelope_crypto.reset_kms_client()
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import SessionLocal, app
+from app.models.data_key import UserDataKey
+from app.models.journal_entry import JournalEntry
+from app.services import data_keys, envelope_crypto
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def _rows(user_id):
+    db = SessionLocal()
+    try:
+        return db.query(JournalEntry).filter(JournalEntry.user_id == user_id).order_by(JournalEntry.id).all()
+    finally:
+        db.close()
+
+
+def _keys(user_id):
+    db = SessionLocal()
+    try:
+        return db.query(UserDataKey).filter(UserDataKey.user_id == user_id).order_by(UserDataKey.epoch).all()
+    finally:
+        db.close()
+
+
+def _contents(headers):
+    return sorted(j['content'] for j in client.get('/api/journals', headers=headers).json())
+
+
+def test_writes_use_one_data_key_per_user_without_kms_calls(local_kms):
+    headers = _login('dek-writes@example.com')
+    made = [client.post('/api/journals', json={'title': 't', 'content': f'note {i}'}, headers=headers).json() for i in range(3)]
+    client.put(f"/api/journals/{made[0]['id']}", json={'title': 't', 'content': 'note 0 edited'}, headers=headers)
+    r = client.post('/api/journals/batch', json={'items': [{'client_id': f'c{i}', 'content': f'offline {i}'} for i in range(3)]}, headers=headers)
+    assert r.json()['created'] == 3
+    assert local_kms.calls == {'generate_data_key': 1, 'decrypt': 0, 're_encrypt': 0}
+
+    user_id = made[0]['user_id']
+    (key,) = _keys(user_id)
+    rows = _rows(user_id)
+    assert {r.key_id for r in rows} == {key.id}
+    assert all(r.encryption_key is None and 'note' not in r.content for r in rows)
+    assert _contents(headers) == ['note 0 edited', 'note 1', 'note 2', 'offline 0', 'offline 1', 'offline 2']
+
+    other = _login('dek-writes-other@example.com')
+    client.post('/api/journals', json={'title': 't', 'content': 'theirs'}, headers=other)
+    assert local_kms.calls['generate_data_key'] == 2
+    assert _contents(other) == ['theirs']
+
+
+def test_rows_with_per_row_wrapped_keys_stay_readable(local_kms):
+    headers = _login('dek-legacy@example.com')
+    new = client.post('/api/journals', json={'title': 't', 'content': 'new style'}, headers=headers).json()
+    ct, ek = envelope_crypto.encrypt_for_kms('old style', 'local-test-key')
+    db = SessionLocal()
+    try:
+        db.add(JournalEntry(user_id=new['user_id'], title='old', content=ct, encryption_key=ek))
+        db.commit()
+    finally:
+        db.close()
+    envelope_crypto.clear_data_keys()
+    assert _contents(headers) == ['new style', 'old style']
+
+
+def test_old_keys_are_retired_for_writes_but_stay_readable(local_kms, monkeypatch):
+    headers = _login('dek-epochs@example.com')
+    user_id = client.post('/api/journals', json={'title': 't', 'content': 'first epoch'}, headers=headers).json()['user_id']
+    monkeypatch.setattr(settings, 'DATA_KEY_ROTATION_DAYS', 30)
+    db = SessionLocal()
+    try:
+        db.query(UserDataKey).filter(UserDataKey.user_id == user_id).update(
+            {'created_at': datetime.now(timezone.utc) - timedelta(days=31)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    data_keys.clear()
+
+    client.post('/api/journals', json={'title': 't', 'content': 'second epoch'}, headers=headers)
+    keys = _keys(user_id)
+    assert [k.epoch for k in keys] == [1, 2]
+    assert [r.key_id for r in _rows(user_id)] == [k.id for k in keys]
+    envelope_crypto.clear_data_keys()
+    assert _contents(headers) == ['first epoch', 'second epoch']
+
+
+def test_rewrap_touches_only_the_key_table(local_kms):
+    headers = _login('dek-rewrap@example.com')
+    user_id = client.post('/api/journals', json={'title': 't', 'content': 'kept'}, headers=headers).json()['user_id']
+    before = [(r.content, r.key_id) for r in _rows(user_id)]
+    (old_key,) = _keys(user_id)
+
+    db = SessionLocal()
+    try:
+        pending = data_keys.rewrap_all(db, 'next-key', commit=False)
+        assert pending >= 1 and local_kms.calls['re_encrypt'] == 0
+        assert data_keys.rewrap_all(db, 'next-key') == pending
+        assert data_keys.rewrap_all(db, 'next-key') == 0
+    finally:
+        db.close()
+    assert local_kms.calls['re_encrypt'] == pending
+
+    (new_key,) = _keys(user_id)
+    assert new_key.kms_key_id == 'next-key' and new_key.wrapped_key != old_key.wrapped_key
+    assert [(r.content, r.key_id) for r in _rows(user_id)] == before
+    envelope_crypto.clear_data_keys()
+    assert _contents(headers) == ['kept']
+
+
+def test_writes_after_data_deletion_use_a_new_key(local_kms):
+    from app.controllers.privacy import _do_delete_user_data
+    headers = _login('dek-deleted@example.com')
+    user_id = client.post('/api/journals', json={'title': 't', 'content': 'before'}, headers=headers).json()['user_id']
+    (old_key,) = _keys(user_id)
+    stale = data_keys._current.get(user_id)
+
+    _do_delete_user_data(user_id)
+    assert _keys(user_id) == [] and data_keys._current.get(user_id, None) is None
+
+    # another worker still caching the deleted key must not write with it
+    data_keys._current.set(user_id, stale)
+    client.post('/api/journals', json={'title': 't', 'content': 'after'}, headers=headers)
+    (new_key,) = _keys(user_id)
+    assert new_key.wrapped_key != old_key.wrapped_key
+    assert [r.key_id for r in _rows(user_id)] == [new_key.id]
+    data_keys.clear()
+    envelope_crypto.clear_data_keys()
+    assert _contents(headers) == ['after']
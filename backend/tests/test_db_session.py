@@ -0,0 +1,55 @@
+import os
+from fastapi.testclient import TestClient
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app, SessionLocal, _engine_options
+from app.models.user import User
+from app.services import metrics, security
+
+client = TestClient(app)
+
+
+def signup_and_token(email='dbsession@example.com', password='pw'):
+    r = client.post('/api/auth/signup', json={'email': email, 'password': password})
+    assert r.status_code == 200
+    t = client.post('/api/auth/token', data={'username': email, 'password': password})
+    assert t.status_code == 200
+    return t.json()['access_token']
+
+
+def test_auth_and_handler_share_one_session():
+    token = signup_and_token()
+    headers = {'Authorization': f'Bearer {token}'}
+    metrics.reset()
+    r = client.get('/api/points', headers=headers)
+    assert r.status_code == 200
+    # get_current_user and the handler both depend on get_db -> one session per request
+    assert metrics.snapshot()['timers']['db.request_session_hold']['count'] == 1
+
+
+def test_engine_options_pool_settings():
+    opts = _engine_options('postgresql+psycopg2://u:p@localhost/db')
+    assert opts['pool_pre_ping'] is True
+    assert {'pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'} <= set(opts)
+    sqlite_opts = _engine_options('sqlite:///./x.db')
+    assert 'pool_size' not in sqlite_opts
+    assert sqlite_opts['connect_args'] == {'check_same_thread': False}
+
+
+def test_admin_metrics_endpoint():
+    db = SessionLocal()
+    try:
+        u = User(email='metrics_admin@example.com', hashed_password=security.hash_password('pw'), role='admin')
+        db.add(u)
+        db.commit()
+        db.refresh(u)
+        admin_id = u.id
+    finally:
+        db.close()
+    token = security.create_access_token({'sub': str(admin_id), 'role': 'admin'})
+    r = client.get('/admin/metrics', headers={'Authorization': f'Bearer {token}'})
+    assert r.status_code == 200
+    data = r.json()
+    assert 'db_pool' in data
+    assert 'db.pool.checkouts' in data['counters']
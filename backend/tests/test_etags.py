@@ -0,0 +1,159 @@
+from contextlib import contextmanager
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import SessionLocal, app, engine
+from app.models.gamification import PointsLedger
+from app.models.mood_entry import MoodEntry
+from app.services import etags, metrics
+from app.services.user_stats import delete_moods
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def _user_id(headers):
+    return client.get('/api/profile', headers=headers).json()['user_id']
+
+
+@contextmanager
+def _statements():
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def _get(path, headers, tag=None, **params):
+    h = dict(headers)
+    if tag:
+        h['If-None-Match'] = tag
+    return client.get(path, headers=h, params=params)
+
+
+def test_unchanged_resource_is_answered_304_without_queries():
+    headers = _login('etag-points@example.com')
+    client.post('/api/achievements', json={'key': 'first', 'points': 5}, headers=headers)
+    first = _get('/api/points', headers)
+    assert first.status_code == 200 and first.json() == {'points': 5}
+    tag = first.headers['etag']
+    assert first.headers['cache-control'] == 'private, no-cache'
+
+    metrics.reset()
+    with _statements() as seen:
+        again = _get('/api/points', headers, tag)
+    assert again.status_code == 304
+    assert again.content == b''
+    assert again.headers['etag'] == tag
+    assert not [s for s in seen if 'points_ledger' in s or 'resource_versions' in s]
+    snap = metrics.snapshot()
+    assert snap['counters']['etag.points.hit'] == 1
+    assert snap['gauges']['etag.points.hit_rate'] == 1.0
+
+    # a tag for another resource or user never matches
+    assert _get('/api/streaks', headers, tag).status_code != 304
+    other = _login('etag-points-other@example.com')
+    assert _get('/api/points', other, tag).status_code == 200
+
+
+def test_writes_change_the_tags_of_dependent_resources():
+    headers = _login('etag-writes@example.com')
+    client.post('/api/streaks/record', headers=headers)
+    tags = {p: _get(p, headers).headers['etag'] for p in ('/api/points', '/api/streaks', '/api/engagement/summary', '/api/profile')}
+
+    client.post('/api/achievements', json={'key': 'k', 'points': 3}, headers=headers)
+    after = {p: _get(p, headers, tags[p]) for p in tags}
+    assert after['/api/points'].status_code == 200 and after['/api/points'].json() == {'points': 3}
+    assert after['/api/engagement/summary'].status_code == 200
+    assert after['/api/profile'].status_code == 200
+    # streaks are not built from achievements
+    assert after['/api/streaks'].status_code == 304
+
+    profile_tag = after['/api/profile'].headers['etag']
+    client.patch('/api/profile', json={'display_name': 'Sam'}, headers=headers)
+    r = _get('/api/profile', headers, profile_tag)
+    assert r.status_code == 200 and r.json()['display_name'] == 'Sam'
+    assert _get('/api/profile', headers, r.headers['etag']).status_code == 304
+    assert _get('/api/points', headers, after['/api/points'].headers['etag']).status_code == 304
+
+
+def test_mood_pages_have_their_own_tags_and_follow_every_kind_of_write():
+    headers = _login('etag-moods@example.com')
+    uid = _user_id(headers)
+    for s in (3, 5, 7):
+        client.post('/api/moods', json={'score': s}, headers=headers)
+    page = _get('/api/moods', headers, limit=2)
+    assert page.status_code == 200 and len(page.json()) == 2
+    full = _get('/api/moods', headers)
+    assert full.headers['etag'] != page.headers['etag']
+    assert _get('/api/moods', headers, page.headers['etag'], limit=2).status_code == 304
+    assert _get('/api/moods', headers, page.headers['etag']).status_code == 200
+
+    def changed(write):
+        tag = _get('/api/moods', headers).headers['etag']
+        write()
+        r = _get('/api/moods', headers, tag)
+        assert r.status_code == 200
+        return r.json()
+
+    assert len(changed(lambda: client.post('/api/moods', json={'score': 2}, headers=headers))) == 4
+    assert len(changed(lambda: client.post(
+        '/api/moods/batch', json={'items': [{'client_id': 'x1', 'score': 4}]}, headers=headers))) == 5
+
+    def bulk_delete():
+        db = SessionLocal()
+        try:
+            delete_moods(db, MoodEntry.user_id == uid, MoodEntry.score <= 3)
+            db.commit()
+        finally:
+            db.close()
+
+    assert len(changed(bulk_delete)) == 3
+
+
+def test_rolled_back_writes_do_not_bump():
+    headers = _login('etag-rollback@example.com')
+    uid = _user_id(headers)
+    tag = _get('/api/points', headers).headers['etag']
+    db = SessionLocal()
+    try:
+        db.add(PointsLedger(user_id=uid, change=10, reason='test'))
+        db.flush()
+        db.rollback()
+        db.commit()
+    finally:
+        db.close()
+    etags.clear()
+    assert _get('/api/points', headers, tag).status_code == 304
+
+
+def test_other_workers_writes_are_seen_once_the_cached_version_expires():
+    headers = _login('etag-workers@example.com')
+    uid = _user_id(headers)
+    tag = _get('/api/points', headers).headers['etag']
+    # a write committed by another worker does not evict this worker's cached version...
+    db = SessionLocal()
+    try:
+        db.add(PointsLedger(user_id=uid, change=4, reason='elsewhere'))
+        db.commit()
+    finally:
+        db.close()
+    etags._versions.set((uid, 'points'), 0)
+    assert _get('/api/points', headers, tag).status_code == 304
+    # ...until the entry expires
+    etags.clear()
+    r = _get('/api/points', headers, tag)
+    assert r.status_code == 200 and r.json() == {'points': 4}
@@ -0,0 +1,57 @@
+import os
+import time
+from fastapi.testclient import TestClient
+from jose import jwt
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app
+from app.config import settings
+from app.services import metrics, security
+
+client = TestClient(app)
+
+
+def test_decode_is_cached_until_exp():
+    security.clear_token_cache()
+    metrics.reset()
+    token = security.create_access_token({'sub': '1'})
+    first = security.decode_access_token(token)
+    assert security.decode_access_token(token) == first
+    assert metrics.counter_value('jwt_cache.miss') == 1
+    assert metrics.counter_value('jwt_cache.hit') == 1
+
+    # callers get their own copy of the cached payload
+    first['sub'] = 'tampered'
+    assert security.decode_access_token(token)['sub'] == '1'
+
+
+def test_invalid_and_expired_tokens_are_not_cached():
+    security.clear_token_cache()
+    metrics.reset()
+    assert security.decode_access_token('not-a-token') == {}
+    assert security.decode_access_token('not-a-token') == {}
+    assert metrics.counter_value('jwt_cache.hit') == 0
+
+    # expires almost immediately: cached entry must not outlive the token
+    short = jwt.encode({'sub': '1', 'exp': int(time.time()) + 2}, settings.SECRET_KEY, algorithm='HS256')
+    assert security.decode_access_token(short).get('sub') == '1'
+    time.sleep(3.1)
+    assert security.decode_access_token(short) == {}
+
+
+def test_middleware_and_dependencies_share_one_decode():
+    email, pw = 'jwt_cache@example.com', 'pw'
+    assert client.post('/api/auth/signup', json={'email': email, 'password': pw}).status_code == 200
+    token = client.post('/api/auth/token', data={'username': email, 'password': pw}).json()['access_token']
+    security.clear_token_cache()
+    metrics.reset()
+
+    assert client.get('/api/points', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    # the middleware decodes once and get_current_user reuses request.state
+    assert metrics.counter_value('jwt_cache.miss') == 1
+    assert metrics.counter_value('jwt_cache.hit') == 0
+
+    assert client.get('/api/points', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    assert metrics.counter_value('jwt_cache.miss') == 1
+    assert metrics.counter_value('jwt_cache.hit') == 1
@@ -0,0 +1,51 @@
+import os
+import threading
+from fastapi.testclient import TestClient
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app
+from app.config import settings
+from app.services import kdf_pool, metrics, security
+
+client = TestClient(app)
+
+
+def test_hash_and_verify_run_on_pool_with_metrics():
+    metrics.reset()
+    hashed = security.hash_password('pw')
+    assert security.verify_password('pw', hashed)
+    assert not security.verify_password('nope', hashed)
+    timers = metrics.snapshot()['timers']
+    assert timers['kdf.hash']['count'] == 1
+    assert timers['kdf.verify']['count'] == 2
+    assert 'kdf.verify.queue_wait' in timers
+
+
+def test_saturated_pool_rejects_fast_with_503():
+    email, pw = 'kdf_busy@example.com', 'pw'
+    assert client.post('/api/auth/signup', json={'email': email, 'password': pw}).status_code == 200
+
+    kdf_pool.configure(workers=1, queue_depth=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def _block():
+        started.set()
+        release.wait(5)
+
+    holder = threading.Thread(target=kdf_pool.run, args=('hash', _block))
+    holder.start()
+    try:
+        assert started.wait(5)
+        metrics.reset()
+        r = client.post('/api/auth/token', data={'username': email, 'password': pw})
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '1'
+        assert metrics.counter_value('kdf.verify.rejected') == 1
+    finally:
+        release.set()
+        holder.join()
+        kdf_pool.configure(settings.KDF_POOL_WORKERS, settings.KDF_QUEUE_DEPTH)
+
+    assert client.post('/api/auth/token', data={'username': email, 'password': pw}).status_code == 200
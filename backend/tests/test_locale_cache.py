@@ -0,0 +1,82 @@
+import os
+import time
+from fastapi.testclient import TestClient
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app
+from app.services import i18n, metrics
+from app.utils.cache import TTLCache, MISSING
+
+client = TestClient(app)
+
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache(maxsize=2, ttl_seconds=60)
+    cache.set('a', 1)
+    cache.set('b', None)
+    assert cache.get('b') is None  # cached None is distinct from a miss
+    assert cache.get('a') == 1  # touch a so b is least recently used
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert 'a' in cache and 'c' in cache
+
+    short = TTLCache(maxsize=10, ttl_seconds=0.01)
+    short.set('a', 1)
+    time.sleep(0.02)
+    assert short.get('a') is MISSING
+
+    disabled = TTLCache(maxsize=10, ttl_seconds=0)
+    disabled.set('a', 1)
+    assert disabled.get('a') is MISSING
+
+
+def test_accept_language_parse_and_locale_list_are_memoized():
+    header = 'te-IN,hi;q=0.8,en;q=0.6'
+    available = i18n.available_locales()
+    assert 'en' in available
+    before = i18n._parse_accept_language.cache_info().hits
+    first = i18n.parse_accept_language(header, available=available)
+    assert i18n.parse_accept_language(header, available=i18n.available_locales()) == first
+    assert i18n._parse_accept_language.cache_info().hits > before
+    assert i18n._locale_names.cache_info().currsize == 1
+
+
+def test_middleware_serves_profile_language_from_cache(monkeypatch):
+    email, pw = 'locale_cache@example.com', 'pw'
+    assert client.post('/api/auth/signup', json={'email': email, 'password': pw}).status_code == 200
+    token = client.post('/api/auth/token', data={'username': email, 'password': pw}).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    uid = client.get('/api/auth/me', headers=headers).json()['id']
+
+    assert client.patch('/api/profile', json={'language': 'hi'}, headers=headers).status_code == 200
+    # the profile write refreshed the cache in-process
+    assert i18n.cached_user_locale(uid) == 'hi'
+
+    def _no_db(user_id):
+        raise AssertionError('locale cache miss went to the DB')
+
+    monkeypatch.setattr(i18n, 'load_user_locale', _no_db)
+    metrics.reset()
+    assert client.get('/', headers=headers).status_code == 200
+    assert client.get('/', headers=headers).status_code == 200
+    assert metrics.counter_value('locale_cache.hit') == 2
+    assert metrics.counter_value('locale_cache.miss') == 0
+
+    assert client.post('/api/me/language', params={'language': 'te'}, headers=headers).status_code == 200
+    assert i18n.cached_user_locale(uid) == 'te'
+
+
+def test_middleware_loads_profile_language_once_on_miss():
+    email, pw = 'locale_miss@example.com', 'pw'
+    assert client.post('/api/auth/signup', json={'email': email, 'password': pw}).status_code == 200
+    token = client.post('/api/auth/token', data={'username': email, 'password': pw}).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    uid = client.get('/api/auth/me', headers=headers).json()['id']
+    i18n.forget_user_locale(uid)
+    metrics.reset()
+
+    client.get('/', headers=headers)
+    client.get('/', headers=headers)
+    assert metrics.counter_value('locale_cache.miss') == 1
+    assert metrics.counter_value('locale_cache.hit') == 1
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import SessionLocal, app
+from app.models.mood_entry import MoodEntry
+from app.services import mood_trends
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def _naive_ewma(x, span):
+    a = 2.0 / (span + 1.0)
+    out = []
+    for t in range(len(x)):
+        w = [(1 - a) ** (t - j) for j in range(t + 1)]
+        out.append(sum(wi * xi for wi, xi in zip(w, x[:t + 1])) / sum(w))
+    return np.array(out)
+
+
+def test_vectorized_metrics_match_naive_definitions():
+    rng = np.random.default_rng(7)
+    n = 120
+    counts = rng.integers(0, 3, n).astype(float)
+    sums = counts * rng.integers(1, 11, n)
+    means = mood_trends.rolling_means(sums, counts, (7, 30))
+    for j, w in enumerate((7, 30)):
+        for t in (0, 6, 29, 75, n - 1):
+            c = counts[max(0, t - w + 1):t + 1].sum()
+            expected = sums[max(0, t - w + 1):t + 1].sum() / c if c else np.nan
+            np.testing.assert_allclose(means[j, t], expected, equal_nan=True)
+
+    x = rng.uniform(1, 10, 1500)
+    np.testing.assert_allclose(mood_trends.ewma(x, 7)[:200], _naive_ewma(x[:200], 7))
+    # long series cross block boundaries without overflowing
+    assert np.isfinite(mood_trends.ewma(x, 30)).all()
+
+    daily = np.array([5, 6, np.nan, 2, 4, 4, 8], dtype=float)
+    vol = mood_trends.rolling_volatility(daily, (7,))
+    np.testing.assert_allclose(vol[0, -1], np.std([1, 2, 0, 4]))
+
+    starts, lengths = mood_trends.low_streaks(np.array([1, 1, 0, 1, 1, 1, 0, 1], dtype=bool))
+    assert starts.tolist() == [0, 3, 7] and lengths.tolist() == [2, 3, 1]
+
+
+def test_trends_endpoint_and_cache_invalidation():
+    headers = _login('trends@example.com')
+    uid = client.get('/api/profile', headers=headers).json()['user_id']
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        for d, score in enumerate([2, 3, 8, 7, 3, 2, 1]):
+            db.add(MoodEntry(user_id=uid, score=score, created_at=now - timedelta(days=6 - d)))
+        db.commit()
+    finally:
+        db.close()
+
+    r = client.get('/api/moods/trends?days=30', headers=headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert len(data['series']) == 7
+    assert data['latest']['mean_7d'] == round(26 / 7, 3)
+    assert data['low_days'] == {'threshold': 4, 'count': 5, 'current_streak': 3, 'longest_streak': 3}
+    assert data['latest']['volatility_7d'] > 0
+
+    # served from the cache until the next mood write
+    assert client.get('/api/moods/trends?days=30', headers=headers).json() == data
+    assert client.post('/api/moods', json={'score': 9}, headers=headers).status_code == 200
+    after = client.get('/api/moods/trends?days=30', headers=headers).json()
+    assert after['low_days']['current_streak'] == 0
+    assert after['series'][-1]['count'] == 2
+
+    assert client.get('/api/moods/trends?days=3', headers=headers).status_code == 422
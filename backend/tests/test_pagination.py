@@ -0,0 +1,87 @@
+import os
+from datetime import datetime, timezone
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app, SessionLocal
+from app.controllers import async_reads
+from app.models.mood_entry import MoodEntry
+from app.utils.pagination import decode_cursor, encode_cursor
+
+client = TestClient(app)
+async_app = FastAPI()
+async_app.include_router(async_reads.router, prefix='/api')
+async_client = TestClient(async_app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'pw'})
+    token = client.post('/api/auth/token', data={'username': email, 'password': 'pw'}).json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _walk(c, path, headers, limit):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        r = c.get(path, params=params, headers=headers)
+        assert r.status_code == 200
+        pages += 1
+        seen.extend(r.json())
+        cursor = r.headers.get('X-Next-Cursor')
+        if not cursor:
+            return seen, pages
+        assert 'rel="next"' in r.headers['Link']
+
+
+def test_moods_walk_every_row_once_in_order_including_timestamp_ties():
+    headers = _login('pager@example.com')
+    uid = client.get('/api/auth/me', headers=headers).json()['id']
+    tie = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+    db = SessionLocal()
+    try:
+        for i in range(7):
+            db.add(MoodEntry(user_id=uid, score=i, created_at=tie if i < 4 else datetime(2025, 3, 2, i, tzinfo=timezone.utc)))
+        db.commit()
+    finally:
+        db.close()
+
+    for c in (client, async_client):
+        rows, pages = _walk(c, '/api/moods', headers, limit=3)
+        assert pages == 3
+        assert [r['score'] for r in rows] == [6, 5, 4, 3, 2, 1, 0]
+        assert len({r['id'] for r in rows}) == 7
+
+
+def test_limit_is_capped_and_bad_cursor_rejected(monkeypatch):
+    from app.config import settings
+    headers = _login('pager2@example.com')
+    for s in range(4):
+        client.post('/api/symptoms', json={'symptom': f's{s}', 'severity': s}, headers=headers)
+    monkeypatch.setattr(settings, 'PAGINATION_MAX_LIMIT', 2, raising=False)
+    r = client.get('/api/symptoms', params={'limit': 100}, headers=headers)
+    assert len(r.json()) == 2 and 'X-Next-Cursor' in r.headers
+    assert client.get('/api/symptoms', params={'cursor': 'garbage'}, headers=headers).status_code == 400
+    assert client.get('/api/symptoms', params={'limit': 0}, headers=headers).status_code == 422
+
+
+def test_other_lists_paginate():
+    headers = _login('pager3@example.com')
+    for i in range(3):
+        client.post('/api/timers', json={'label': f't{i}', 'target_at': '2030-01-01T00:00:00Z'}, headers=headers)
+        client.post('/api/stopwatches', json={'label': f'w{i}'}, headers=headers)
+        client.post('/api/achievements', json={'key': f'k{i}', 'points': 1}, headers=headers)
+        client.post('/api/chat/message', json={'text': f'hello {i}'}, headers=headers)
+    for path in ('/api/timers', '/api/stopwatches', '/api/achievements', '/api/chat/conversations'):
+        rows, pages = _walk(client, path, headers, limit=2)
+        assert len(rows) == 3 and pages == 2, path
+    convs, _ = _walk(client, '/api/chat/conversations', headers, limit=2)
+    assert all(c['messages'] for c in convs)
+
+
+def test_cursor_round_trip():
+    ts = datetime(2025, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
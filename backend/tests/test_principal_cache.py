@@ -0,0 +1,60 @@
+import os
+import time
+from fastapi.testclient import TestClient
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_db.sqlite3')
+
+from app.main import app
+from app.services import metrics
+from app.services.principal_cache import PrincipalCache, Principal, principal_cache
+
+client = TestClient(app)
+
+
+def _principal(uid, role='user'):
+    return Principal(uid, f'{uid}@example.com', role, True, False, None)
+
+
+def test_cache_lru_eviction_and_ttl():
+    cache = PrincipalCache(maxsize=2, ttl_seconds=60)
+    cache.put(1, 100, _principal(1))
+    cache.put(2, 100, _principal(2))
+    assert cache.get(1, 100).id == 1  # touch 1 so 2 is least recently used
+    cache.put(3, 100, _principal(3))
+    assert cache.get(2, 100) is None
+    assert cache.get(1, 100) is not None and cache.get(3, 100) is not None
+
+    short = PrincipalCache(maxsize=10, ttl_seconds=0.01)
+    short.put(1, 100, _principal(1))
+    time.sleep(0.02)
+    assert short.get(1, 100) is None
+
+
+def test_invalidate_user_drops_all_tokens_for_user():
+    cache = PrincipalCache(maxsize=10, ttl_seconds=60)
+    cache.put(1, 100, _principal(1))
+    cache.put(1, 200, _principal(1))
+    cache.put(2, 100, _principal(2))
+    cache.invalidate_user(1)
+    assert cache.get(1, 100) is None and cache.get(1, 200) is None
+    assert cache.get(2, 100) is not None
+
+
+def test_repeat_requests_hit_cache_and_verify_invalidates():
+    email, pw = 'principal@example.com', 'pw'
+    assert client.post('/api/auth/signup', json={'email': email, 'password': pw}).status_code == 200
+    token = client.post('/api/auth/token', data={'username': email, 'password': pw}).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    principal_cache.clear()
+    metrics.reset()
+
+    assert client.get('/api/points', headers=headers).status_code == 200
+    assert client.get('/api/points', headers=headers).status_code == 200
+    assert metrics.counter_value('principal_cache.miss') == 1
+    assert metrics.counter_value('principal_cache.hit') == 1
+
+    me = client.get('/api/auth/me', headers=headers).json()
+    assert me['is_verified'] is False
+    vt = client.post('/api/auth/verify', params={'email': email}).json()['verification_token']
+    assert client.post('/api/auth/verify/confirm', params={'token': vt}).status_code == 200
+    assert client.get('/api/auth/me', headers=headers).json()['is_verified'] is True
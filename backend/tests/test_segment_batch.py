@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services import metrics
+from app.services.segment import SegmentBatcher
+
+
+class _SegmentStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for api.segment.io that records /v1/batch payloads."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        srv = self.server
+        with srv.lock:
+            srv.requests += 1
+            fail = srv.fail_next > 0
+            if fail:
+                srv.fail_next -= 1
+            else:
+                srv.events.extend(json.loads(body)['batch'])
+            srv.connections.add(self.client_address)
+        self.send_response(500 if fail else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _SegmentStandIn)
+    srv.lock = threading.Lock()
+    srv.events, srv.requests, srv.fail_next, srv.connections = [], 0, 0, set()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f'http://127.0.0.1:{srv.server_address[1]}'
+
+
+def test_batches_over_one_keepalive_connection():
+    srv, url = _serve()
+    b = SegmentBatcher('wk', api_url=url, batch_size=100, flush_interval=0.05)
+    metrics.reset()
+    n = 5000
+    for i in range(n):
+        b.track('mood.create', i, {'score': i % 10})
+    b.shutdown()
+    srv.shutdown()
+
+    assert len(srv.events) == n
+    assert len({e['messageId'] for e in srv.events}) == n
+    assert srv.requests <= n // 100 + 5
+    assert len(srv.connections) == 1
+    assert metrics.counter_value('segment.sent') == n
+
+
+def test_failed_batch_retries_with_backoff_without_blocking_others():
+    srv, url = _serve()
+    srv.fail_next = 1
+    b = SegmentBatcher('wk', api_url=url, batch_size=10, flush_interval=0.01, backoff_base=0.2)
+    metrics.reset()
+    for i in range(10):
+        b.track('first', i, {})
+    deadline = time.time() + 2
+    while metrics.counter_value('segment.retries') == 0 and time.time() < deadline:
+        time.sleep(0.005)
+    # the failed batch is parked; a fresh batch still goes out straight away
+    for i in range(10):
+        b.track('second', i, {})
+    deadline = time.time() + 3
+    while len(srv.events) < 20 and time.time() < deadline:
+        time.sleep(0.01)
+    b.shutdown()
+    srv.shutdown()
+
+    assert metrics.counter_value('segment.retries') == 1
+    assert sorted({e['event'] for e in srv.events}) == ['first', 'second']
+    assert len(srv.events) == 20
+
+
+def test_unconfigured_batcher_is_a_noop():
+    b = SegmentBatcher(None)
+    assert b.track('test.event', 1, {'foo': 'bar'})
+    assert not b._pending and b._thread is None
+
+
+def test_shutdown_keeps_retry_backoff_and_drops_what_is_not_due(monkeypatch):
+    from app.services import segment
+    monkeypatch.setattr(segment.random, 'uniform', lambda lo, hi: hi)  # no jitter: 0.1s per retry
+    srv, url = _serve()
+    srv.fail_next = 1000
+    b = SegmentBatcher('wk', api_url=url, batch_size=10, flush_interval=0.01,
+                       backoff_base=0.1, backoff_max=0.1, max_retries=1000)
+    metrics.reset()
+    for i in range(10):
+        b.track('doomed', i, {})
+    deadline = time.time() + 2
+    while metrics.counter_value('segment.retries') == 0 and time.time() < deadline:
+        time.sleep(0.005)
+    b.shutdown(timeout=0.3)
+    srv.shutdown()
+
+    # retries went out at their backoff pace, not as a burst at exit
+    assert srv.requests <= 6
+    assert metrics.counter_value('segment.failed') == 10
+    assert not b._retries and srv.events == []
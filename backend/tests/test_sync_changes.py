@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.main import SessionLocal, app
+from app.models.mood_entry import MoodEntry
+from app.models.sync import SyncChange
+from app.services import sync_changes
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def _sync(headers, since=None, limit=None):
+    params = {}
+    if since is not None:
+        params['since'] = since
+    if limit is not None:
+        params['limit'] = limit
+    r = client.get('/api/sync/changes', params=params, headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_feed_seeds_history_then_returns_only_churn():
+    headers = _login('sync-feed@example.com')
+    for s in (3, 6):
+        client.post('/api/moods', json={'score': s}, headers=headers)
+    j = client.post('/api/journals', json={'title': 't', 'content': 'secret words', 'progress': 5}, headers=headers).json()
+
+    # full sync in pages
+    first = _sync(headers, limit=2)
+    assert first['has_more'] and len(first['changes']) == 2
+    rest = _sync(headers, since=first['next'])
+    full = first['changes'] + rest['changes']
+    assert [c['entity'] for c in full] == ['mood', 'mood', 'journal']
+    assert full[2]['data']['content'] == 'secret words'
+    token = rest['next']
+    assert _sync(headers, since=token)['changes'] == []
+
+    # only what changed since the token comes back; repeated edits collapse to one change
+    client.put(f"/api/journals/{j['id']}", json={'title': 't2', 'content': 'edited', 'progress': 6}, headers=headers)
+    client.put(f"/api/journals/{j['id']}", json={'title': 't3', 'content': 'edited again', 'progress': 7}, headers=headers)
+    client.post('/api/symptoms', json={'symptom': 'fatigue'}, headers=headers)
+    delta = _sync(headers, since=token)
+    assert [(c['entity'], c['op']) for c in delta['changes']] == [('journal', 'upsert'), ('symptom', 'upsert')]
+    assert delta['changes'][0]['data']['title'] == 't3'
+
+    client.delete(f"/api/journals/{j['id']}", headers=headers)
+    tomb = _sync(headers, since=delta['next'])['changes']
+    assert tomb == [{'seq': tomb[0]['seq'], 'entity': 'journal', 'id': j['id'], 'op': 'delete', 'data': None}]
+
+    # batch inserts land in the feed too
+    client.post('/api/moods/batch', json={'items': [{'client_id': 'a', 'score': 2}, {'client_id': 'b', 'score': 4}]}, headers=headers)
+    batch = _sync(headers, since=str(tomb[0]['seq']))['changes']
+    assert [c['data']['score'] for c in batch] == [2, 4]
+
+    assert client.get('/api/sync/changes?since=abc', headers=headers).status_code == 400
+
+
+def test_retention_tombstones_and_pruning_force_reset(monkeypatch):
+    from app.config import settings
+    from app.services.retention import purge_old_data
+    headers = _login('sync-retention@example.com')
+    uid = client.get('/api/profile', headers=headers).json()['user_id']
+    db = SessionLocal()
+    try:
+        old = MoodEntry(user_id=uid, score=2, created_at=datetime.now(timezone.utc) - timedelta(days=400))
+        db.add(old)
+        db.commit()
+        old_id = old.id
+    finally:
+        db.close()
+    token = _sync(headers)['next']
+
+    monkeypatch.setattr(settings, 'DATA_RETENTION_DAYS', 30, raising=False)
+    purge_old_data()
+    changes = _sync(headers, since=token)['changes']
+    assert [(c['id'], c['op']) for c in changes] == [(old_id, 'delete')]
+
+    # once the tombstone ages out, a client that never saw it has to start over
+    db = SessionLocal()
+    try:
+        assert sync_changes.prune_tombstones(db, now=datetime.now(timezone.utc) + timedelta(days=365)) >= 1
+        db.commit()
+        assert db.query(SyncChange).filter(SyncChange.user_id == uid, SyncChange.op == 'delete').count() == 0
+    finally:
+        db.close()
+    assert _sync(headers, since=token)['reset'] is True
+    assert _sync(headers, since=changes[0]['seq'])['reset'] is False
+
+
+def test_data_deletion_keeps_the_sequence_and_resets_old_tokens():
+    from app.controllers.privacy import _do_delete_user_data
+    from app.models.sync import SyncState
+    headers = _login('sync-deleted@example.com')
+    uid = client.get('/api/profile', headers=headers).json()['user_id']
+    for s in (3, 5, 7):
+        client.post('/api/moods', json={'score': s}, headers=headers)
+    token = _sync(headers)['next']
+
+    _do_delete_user_data(uid)
+    db = SessionLocal()
+    try:
+        state = db.query(SyncState).filter(SyncState.user_id == uid).one()
+        assert state.seq == state.pruned_seq > int(token)
+    finally:
+        db.close()
+    assert _sync(headers, since=token)['reset'] is True
+    assert _sync(headers, since=0)['changes'] == []
+
+    client.post('/api/moods', json={'score': 4}, headers=headers)
+    after = _sync(headers, since=0)['changes']
+    assert [c['data']['score'] for c in after] == [4] and after[0]['seq'] > int(token) + 1
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import SessionLocal, app
+from app.models.mood_entry import MoodEntry
+from app.models.symptom_entry import SymptomEntry
+from app.models.user_stats import UserStats, UserSymptomCount
+from app.services import user_stats
+from app.services.retention import purge_old_data
+
+client = TestClient(app)
+
+
+def _login(email):
+    client.post('/api/auth/signup', json={'email': email, 'password': 'testpass'})
+    r = client.post('/api/auth/token', data={'username': email, 'password': 'testpass'})
+    assert r.status_code == 200
+    return {'Authorization': f"Bearer {r.json()['access_token']}"}
+
+
+def _analytics(headers):
+    r = client.get('/api/moods/analytics', headers=headers)
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_endpoint_tracks_writes_without_rescanning():
+    headers = _login('stats-endpoint@example.com')
+    assert _analytics(headers)['entries_count'] == 0
+    for s in (2, 4, 9):
+        assert client.post('/api/moods', json={'score': s}, headers=headers).status_code == 200
+    for sym in ('fatigue', 'anxiety', 'fatigue'):
+        assert client.post('/api/symptoms', json={'symptom': sym, 'severity': 3}, headers=headers).status_code == 200
+    data = _analytics(headers)
+    assert data['entries_count'] == 3
+    assert data['average_mood'] == 5
+    assert data['most_common_symptoms'][:2] == ['fatigue', 'anxiety']
+
+
+def test_stats_are_built_lazily_from_existing_rows():
+    db = SessionLocal()
+    try:
+        uid = 910001
+        db.query(UserStats).filter(UserStats.user_id == uid).delete()
+        db.add_all([MoodEntry(user_id=uid, score=s) for s in (1, 2, 6)])
+        db.add(SymptomEntry(user_id=uid, symptom='headache', severity=2))
+        db.commit()
+        # first write after the upgrade: the totals include the new row exactly once
+        m = MoodEntry(user_id=uid, score=3)
+        db.add(m)
+        db.flush()
+        user_stats.mood_added(db, uid, m.score)
+        db.commit()
+        assert user_stats.summary(db, uid) == (3.0, 4, ['headache'])
+    finally:
+        db.close()
+
+
+def test_deletes_and_retention_decrement_and_verify_repairs_drift(monkeypatch):
+    db = SessionLocal()
+    try:
+        uid = 910002
+        old = datetime.now(timezone.utc) - timedelta(days=400)
+        db.add_all([MoodEntry(user_id=uid, score=8, created_at=old), MoodEntry(user_id=uid, score=4)])
+        db.commit()
+        assert user_stats.summary(db, uid)[:2] == (6.0, 2)
+
+        monkeypatch.setattr(settings, 'DATA_RETENTION_DAYS', 30, raising=False)
+        purge_old_data()
+        db.expire_all()
+        assert user_stats.summary(db, uid)[:2] == (4.0, 1)
+
+        s = SymptomEntry(user_id=uid, symptom='nausea', severity=1)
+        db.add(s)
+        db.flush()
+        user_stats.symptom_added(db, uid, s.symptom)
+        db.commit()
+        user_stats.delete_symptoms(db, SymptomEntry.user_id == uid)
+        db.commit()
+        assert user_stats.summary(db, uid)[2] == []
+
+        # a raw insert that bypasses the helpers is caught and repaired by verification
+        db.add(MoodEntry(user_id=uid, score=10))
+        db.add(UserSymptomCount(user_id=uid, symptom='ghost', count=2))
+        db.commit()
+        assert user_stats.verify(db) >= 1
+        assert user_stats.summary(db, uid) == (7.0, 2, [])
+        assert user_stats.verify(db) == 0
+    finally:
+        db.close()
+
+
+def test_verify_keeps_writes_that_land_while_it_runs(monkeypatch):
+    uid = 910003
+    db = SessionLocal()
+    try:
+        db.add_all([MoodEntry(user_id=uid, score=5), MoodEntry(user_id=uid, score=7)])
+        db.commit()
+        assert user_stats.summary(db, uid)[:2] == (6.0, 2)
+        db.add(MoodEntry(user_id=uid, score=3))  # drift: bypasses the helpers
+        db.commit()
+
+        real = user_stats._symptom_drift
+
+        def with_concurrent_write(session, ids):
+            other = SessionLocal()
+            try:
+                m = MoodEntry(user_id=uid, score=9)
+                other.add(m)
+                other.flush()
+                user_stats.mood_added(other, uid, m.score)
+                other.commit()
+            finally:
+                other.close()
+            return real(session, ids)
+
+        monkeypatch.setattr(user_stats, '_symptom_drift', with_concurrent_write)
+        assert user_stats.verify(db) >= 1
+        monkeypatch.setattr(user_stats, '_symptom_drift', real)
+        db.expire_all()
+        assert user_stats.summary(db, uid)[:2] == (6.0, 4)
+        assert user_stats.verify(db) == 0
+    finally:
+        db.close()
+
+
+def test_privacy_deletion_removes_symptoms_and_their_counts():
+    from app.controllers.privacy import _do_delete_user_data
+    headers = _login('stats-privacy@example.com')
+    uid = client.get('/api/profile', headers=headers).json()['user_id']
+    client.post('/api/symptoms', json={'symptom': 'fatigue', 'severity': 3}, headers=headers)
+    assert _analytics(headers)['most_common_symptoms'] == ['fatigue']
+    _do_delete_user_data(uid)
+    db = SessionLocal()
+    try:
+        assert db.query(SymptomEntry).filter(SymptomEntry.user_id == uid).count() == 0
+    finally:
+        db.close()
+    assert _analytics(headers)['most_common_symptoms'] == []